@@ -0,0 +1,413 @@
+"""Query-plan audit for every query shape issued by backend/routes/*.
+
+Seeds a scratch database on the configured MONGO_URL with a synthetic but
+realistically skewed dataset, creates exactly the indexes declared in
+create_indexes.INDEXES, runs explain("executionStats") on each shape below
+and exits non-zero if any plan has a COLLSCAN, a blocking SORT stage, or
+examines more documents per result than --max-ratio allows.
+
+    python audit_queries.py                 # default dataset
+    python audit_queries.py --students 20000 --payments 500000 --json
+
+When you add or change a query in routes/, add its shape to QUERY_SHAPES.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import uuid
+from datetime import timedelta
+
+from database import client
+from create_indexes import INDEXES, create_indexes
+from counters import _wastage_pipeline, _date_range, TOTAL_ID
+from pagination import keyset_filter, keyset_sort, encode_cursor
+from routes.meals import upcoming_meals_pipeline, HEADCOUNT_PROJECTION
+from routes.complaints import complaints_query
+from models import utc_now
+from rollups import month_of
+from reconciliation import ledger_query, LEDGER_SORT
+from settlement import inflows_pipeline, overlapping_query, payments_query
+
+AUDIT_DB_NAME = f"{os.environ['DB_NAME']}_query_audit"
+BATCH_SIZE = 5000
+
+
+# ---------------------------------------------------------------------------
+# Query shapes. Each builds an explain-able command from the seeded sample.
+
+def find_shape(name, route, collection, filter, sort=None, limit=None, projection=None, **options):
+    def command(sample):
+        cmd = {"find": collection, "filter": filter(sample)}
+        if projection:
+            cmd["projection"] = projection
+        if sort:
+            cmd["sort"] = dict(sort)
+        if limit:
+            cmd["limit"] = limit
+        return cmd
+    return {"name": name, "route": route, "command": command, **options}
+
+
+def find_and_modify_shape(name, route, collection, query, update, upsert=False, **options):
+    def command(sample):
+        return {"findAndModify": collection, "query": query(sample), "update": update(sample), "upsert": upsert}
+    return {"name": name, "route": route, "command": command, **options}
+
+
+def update_shape(name, route, collection, query, update, **options):
+    def command(sample):
+        return {"update": collection, "updates": [{"q": query(sample), "u": update(sample)}]}
+    return {"name": name, "route": route, "command": command, **options}
+
+
+def aggregate_shape(name, route, collection, pipeline, **options):
+    def command(sample):
+        return {"aggregate": collection, "pipeline": pipeline(sample), "cursor": {}}
+    return {"name": name, "route": route, "command": command, **options}
+
+
+QUERY_SHAPES = [
+    # auth / dependencies
+    find_shape("user by email", "auth.login, dependencies (tokens without uid)", "users",
+               lambda s: {"email": s["student_email"]}, limit=1),
+    find_shape("user by id", "dependencies.user_from_claims, wallet.get_wallet, meals.select_meals_bulk", "users",
+               lambda s: {"id": s["student_id"]}, limit=1),
+    find_and_modify_shape("conditional debit", "transfers._debit, meals._attend", "users",
+                          lambda s: {"id": s["student_id"], "wallet_balance": {"$gte": 50}},
+                          lambda s: {"$inc": {"wallet_balance": -50}}),
+    find_and_modify_shape("credit recipient", "transfers._credit", "users",
+                          lambda s: {"id": s["vendor_id"]},
+                          lambda s: {"$inc": {"wallet_balance": 50}}),
+
+    # meals
+    find_shape("active meals", "meals.get_meals", "meals",
+               lambda s: {"is_active": True}, limit=100),
+    find_shape("meals version", "meal_cache.meals_version", "cache_versions",
+               lambda s: {"_id": "meals"}, limit=1),
+    find_shape("meal by id", "meal_cache.get_meal", "meals",
+               lambda s: {"id": s["meal_id"]}, limit=1),
+    find_shape("meals by id list", "meal_cache.get_meals", "meals",
+               lambda s: {"id": {"$in": s["week_meal_ids"]}}),
+    find_shape("meal headcount", "meals.get_headcount", "meals",
+               lambda s: {"id": s["meal_id"]}, projection=HEADCOUNT_PROJECTION, limit=1),
+    find_shape("headcounts for a range", "meals.get_headcounts", "meals",
+               lambda s: {"date": {"$gte": s["range_from"], "$lte": s["range_to"]}},
+               projection=HEADCOUNT_PROJECTION, sort=[("date", 1), ("type", 1)]),
+    update_shape("headcount bump", "counters.record_selection_transitions", "meals",
+                 lambda s: {"id": s["meal_id"]},
+                 lambda s: {"$inc": {"attending_count": -1, "skipped_count": 1}}),
+    find_and_modify_shape("selection upsert", "meals.select_meal", "meal_selections",
+                          lambda s: {"user_id": s["student_id"], "meal_id": s["meal_id"]},
+                          lambda s: {"$set": {"status": "skipped"}}, upsert=True),
+    find_shape("selection by user and meal", "meals._attend", "meal_selections",
+               lambda s: {"user_id": s["student_id"], "meal_id": s["meal_id"]}, limit=1),
+    update_shape("selection re-join", "meals._attend", "meal_selections",
+                 lambda s: {"user_id": s["student_id"], "meal_id": s["meal_id"], "status": "skipped"},
+                 lambda s: {"$set": {"status": "attending", "timestamp": s["now"]}}),
+    find_shape("selections for a week", "meals.select_meals_bulk", "meal_selections",
+               lambda s: {"user_id": s["student_id"], "meal_id": {"$in": s["week_meal_ids"]}}),
+    aggregate_shape("upcoming meals with my selection", "meals.get_upcoming_meals", "meals",
+                    lambda s: upcoming_meals_pipeline(s["student_id"], s["range_from"], s["range_to"])),
+    find_shape("my selections", "meals.get_my_selections", "meal_selections",
+               lambda s: {"user_id": s["student_id"]}, limit=100),
+
+    # wallet
+    find_shape("sent history, first page", "wallet.get_wallet", "transactions",
+               lambda s: {"sender_id": s["student_id"]},
+               sort=keyset_sort("timestamp"), limit=51),
+    find_shape("received history, first page", "wallet.get_wallet", "transactions",
+               lambda s: {"receiver_id": s["vendor_id"]},
+               sort=keyset_sort("timestamp"), limit=51),
+    find_shape("received history, deep page", "wallet.get_wallet", "transactions",
+               lambda s: {"receiver_id": s["vendor_id"], **keyset_filter("timestamp", s["vendor_deep_cursor"])},
+               sort=keyset_sort("timestamp"), limit=51),
+
+    # complaints: every filter combination the listing accepts
+    *[
+        find_shape(f"complaints {'+'.join(label) or 'unfiltered'}", "complaints.get_complaints", "complaints",
+                   lambda s, filters=filters: complaints_query(**{key: s[value] for key, value in filters.items()}),
+                   sort=keyset_sort("created_at"), limit=101)
+        for label, filters in [
+            ((), {}),
+            (("status",), {"status": "complaint_status"}),
+            (("category",), {"category": "complaint_category"}),
+            (("status", "category"), {"status": "complaint_status", "category": "complaint_category"}),
+            (("user",), {"user_id": "complainer_id"}),
+            (("user", "status"), {"user_id": "complainer_id", "status": "complaint_status"}),
+            (("user", "category"), {"user_id": "complainer_id", "category": "complaint_category"}),
+            (("user", "status", "category"),
+             {"user_id": "complainer_id", "status": "complaint_status", "category": "complaint_category"}),
+            (("status", "date range", "cursor"),
+             {"status": "complaint_status", "from_date": "complaint_from", "to_date": "complaint_to",
+              "cursor": "complaint_cursor"}),
+        ]
+    ],
+    # $text cannot share an index with the sort; matches are sorted in memory
+    find_shape("complaints text search", "complaints.get_complaints", "complaints",
+               lambda s: complaints_query(q="hygiene"), sort=keyset_sort("created_at"), limit=101,
+               allow={"SORT"}, max_ratio=None),
+
+    # analytics
+    find_shape("wastage total", "analytics.get_wastage_stats", "wastage_counters",
+               lambda s: {"_id": TOTAL_ID}, limit=1),
+    find_shape("wastage by day range", "analytics.get_wastage_stats", "wastage_counters",
+               lambda s: _date_range(s["range_from"], s["range_to"], field="_id")),
+    aggregate_shape("wastage $facet fallback (range)", "counters.compute_wastage", "meals",
+                    lambda s: _wastage_pipeline(_date_range(s["range_from"], s["range_to"]), None),
+                    max_ratio=None),
+    find_shape("monthly rollups", "analytics.get_monthly_stats", "monthly_rollups",
+               lambda s: {"month": {"$in": s["months"]}}),
+
+    # reconciliation
+    find_shape("ledger stream from position", "reconciliation.advance_checkpoints", "transactions",
+               lambda s: ledger_query({"last_timestamp": s["ledger_position"][0], "last_id": s["ledger_position"][1]},
+                                      s["now"]),
+               sort=LEDGER_SORT),
+    find_shape("users in id order", "reconciliation.check_drift", "users",
+               lambda s: {}, sort=[("id", 1)]),
+
+    # settlement
+    aggregate_shape("vendor inflows for a period", "settlement.settle_vendors", "transactions",
+                    lambda s: inflows_pipeline(s["complaint_from"], s["complaint_to"])),
+    find_shape("statement payments", "settlements.get_statement", "transactions",
+               lambda s: payments_query(s["complaint_from"], s["complaint_to"], s["vendor_id"]),
+               sort=[("timestamp", 1), ("id", 1)]),
+    find_shape("settlements of a vendor", "settlements.list_settlements", "settlements",
+               lambda s: {"vendor_id": s["vendor_id"]}, sort=[("period", -1)], limit=50),
+    find_shape("overlapping settlement", "settlement.check_period", "settlements",
+               lambda s: overlapping_query(s["complaint_from"], s["complaint_to"]), limit=1),
+]
+
+
+# ---------------------------------------------------------------------------
+# Synthetic dataset
+
+async def _insert(collection, docs):
+    for start in range(0, len(docs), BATCH_SIZE):
+        await collection.insert_many(docs[start:start + BATCH_SIZE], ordered=False)
+
+
+async def seed(database, args):
+    rng = random.Random(args.seed)
+    now = utc_now()
+
+    students = [
+        {"id": str(uuid.uuid4()), "email": f"student{i}@audit.test", "full_name": f"Student {i}",
+         "role": "student", "hashed_password": "x", "wallet_balance": float(rng.randint(0, 500)),
+         "created_at": now - timedelta(days=rng.randint(0, 365))}
+        for i in range(args.students)
+    ]
+    vendors = [
+        {"id": str(uuid.uuid4()), "email": f"vendor{i}@audit.test", "full_name": f"Vendor {i}",
+         "role": "vendor", "hashed_password": "x", "wallet_balance": 0.0,
+         "created_at": now - timedelta(days=365)}
+        for i in range(args.vendors)
+    ]
+    await _insert(database.users, students + vendors)
+
+    first_day = (now - timedelta(days=args.meal_days - 7)).date()
+    meals = [
+        {"id": str(uuid.uuid4()), "date": (first_day + timedelta(days=day)).isoformat(), "type": meal_type,
+         "menu_items": ["Rice", "Dal"], "price": price, "is_active": day >= args.meal_days - 14,
+         "created_at": now - timedelta(days=args.meal_days - day)}
+        for day in range(args.meal_days)
+        for meal_type, price in (("breakfast", 40.0), ("lunch", 80.0), ("dinner", 60.0))
+    ]
+    await _insert(database.meals, meals)
+
+    selections = []
+    for student in students:
+        for meal in rng.sample(meals, min(args.selections_per_student, len(meals))):
+            selections.append({
+                "id": str(uuid.uuid4()), "user_id": student["id"], "meal_id": meal["id"],
+                "status": "skipped" if rng.random() < 0.2 else "attending",
+                "timestamp": now - timedelta(minutes=rng.randint(0, 60 * 24 * args.meal_days)),
+            })
+    await _insert(database.meal_selections, selections)
+
+    # Payments are heavily skewed towards the first vendor (the main canteen)
+    weights = [10] + [1] * (len(vendors) - 1)
+    transactions = []
+    for _ in range(args.payments):
+        student = rng.choice(students)
+        vendor = rng.choices(vendors, weights=weights)[0]
+        transactions.append({
+            "id": str(uuid.uuid4()), "sender_id": student["id"], "receiver_id": vendor["id"],
+            "amount": float(rng.randint(10, 200)), "type": "vendor_payment",
+            "description": f"Payment to {vendor['full_name']}",
+            "timestamp": now - timedelta(seconds=rng.randint(0, 3600 * 24 * 180)),
+        })
+    await _insert(database.transactions, transactions)
+
+    complaints = [
+        {"id": str(uuid.uuid4()), "user_id": rng.choice(students)["id"],
+         "category": rng.choice(["hygiene", "quality", "other"]),
+         "description": rng.choice(["Synthetic hygiene complaint", "Food was cold", "Long queue at lunch"]),
+         "image_url": None, "status": rng.choice(["pending", "resolved"]),
+         "created_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))}
+        for _ in range(args.complaints)
+    ]
+    await _insert(database.complaints, complaints)
+
+    await database.wastage_counters.insert_many(
+        [{"_id": meal["date"], "meals": 3, "selections": 0, "skipped": 0} for meal in meals[::3]]
+        + [{"_id": TOTAL_ID, "initialized": True}]
+    )
+    months = sorted({month_of(tx["timestamp"]) for tx in transactions})
+    await database.monthly_rollups.insert_many(
+        [{"month": month, "metric": metric, "value": 0}
+         for month in months for metric in ("complaints", "skips", "transactions")]
+    )
+
+    await database.cache_versions.insert_one({"_id": "meals", "version": 1})
+
+    await create_indexes(database)
+
+    vendor_payments = sorted(
+        (tx for tx in transactions if tx["receiver_id"] == vendors[0]["id"]),
+        key=lambda tx: (tx["timestamp"], tx["id"]), reverse=True
+    )
+    deep = vendor_payments[len(vendor_payments) // 2]
+    student_with_complaint = complaints[0]["user_id"]
+    newest_complaints = sorted(complaints, key=lambda c: (c["created_at"], c["id"]), reverse=True)
+    middle_complaint = newest_complaints[len(newest_complaints) // 2]
+    week = [meal for meal in meals if meal["is_active"]][:21]
+    return {
+        "student_id": students[0]["id"],
+        "student_email": students[0]["email"],
+        "vendor_id": vendors[0]["id"],
+        "vendor_deep_cursor": encode_cursor(deep["timestamp"], deep["id"]),
+        "meal_id": week[0]["id"],
+        "week_meal_ids": [meal["id"] for meal in week],
+        "complainer_id": student_with_complaint,
+        "complaint_status": "pending",
+        "complaint_category": "hygiene",
+        "complaint_from": (now - timedelta(days=300)).date(),
+        "complaint_to": now.date(),
+        "complaint_cursor": encode_cursor(middle_complaint["created_at"], middle_complaint["id"]),
+        "range_from": week[0]["date"],
+        "range_to": week[-1]["date"],
+        "months": months[-6:],
+        "now": now,
+        "ledger_position": (deep["timestamp"], deep["id"]),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Plan inspection
+
+def _inspect(node, report):
+    if isinstance(node, list):
+        for item in node:
+            _inspect(item, report)
+        return
+    if not isinstance(node, dict):
+        return
+
+    stage = node.get("stage")
+    if isinstance(stage, str):
+        report["stages"].add(stage)
+    if isinstance(node.get("indexName"), str):
+        report["indexes"].add(node["indexName"])
+    # $lookup reports its own scans from 5.0 on
+    if node.get("collectionScans"):
+        report["stages"].add("COLLSCAN")
+    for name in node.get("indexesUsed", []) or []:
+        report["indexes"].add(name)
+    stats = node.get("executionStats")
+    if isinstance(stats, dict) and "totalDocsExamined" in stats:
+        report["docs_examined"] += stats.get("totalDocsExamined", 0)
+        report["returned"] += stats.get("nReturned", 0)
+
+    for key, value in node.items():
+        if key in ("rejectedPlans", "allPlansExecution"):
+            continue
+        _inspect(value, report)
+
+
+async def audit_shape(database, shape, sample, max_ratio):
+    explain = await database.command(
+        {"explain": shape["command"](sample), "verbosity": "executionStats"}
+    )
+    report = {"stages": set(), "indexes": set(), "docs_examined": 0, "returned": 0}
+    _inspect(explain, report)
+
+    problems = []
+    allowed = shape.get("allow", set())
+    if "COLLSCAN" in report["stages"] and "COLLSCAN" not in allowed:
+        problems.append("COLLSCAN")
+    if "SORT" in report["stages"] and "SORT" not in allowed:
+        problems.append("in-memory SORT")
+
+    shape_ratio = shape.get("max_ratio", max_ratio)
+    ratio = report["docs_examined"] / max(report["returned"], 1)
+    if shape_ratio is not None and ratio > shape_ratio:
+        problems.append(f"examined/returned {ratio:.1f} > {shape_ratio}")
+
+    return {
+        "name": shape["name"],
+        "route": shape["route"],
+        "ok": not problems,
+        "problems": problems,
+        "stages": sorted(report["stages"]),
+        "indexes": sorted(report["indexes"]),
+        "docs_examined": report["docs_examined"],
+        "returned": report["returned"],
+    }
+
+
+async def run_audit(args):
+    database = client[AUDIT_DB_NAME]
+    await client.drop_database(AUDIT_DB_NAME)
+    try:
+        sample = await seed(database, args)
+        results = [await audit_shape(database, shape, sample, args.max_ratio) for shape in QUERY_SHAPES]
+    finally:
+        if not args.keep:
+            await client.drop_database(AUDIT_DB_NAME)
+
+    declared = {model.document["name"] for models in INDEXES.values() for model in models}
+    used = set().union(*(result["indexes"] for result in results))
+    return results, sorted(declared - used - {"_id_"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--vendors", type=int, default=10)
+    parser.add_argument("--meal-days", type=int, default=60)
+    parser.add_argument("--selections-per-student", type=int, default=30)
+    parser.add_argument("--payments", type=int, default=50000)
+    parser.add_argument("--complaints", type=int, default=5000)
+    parser.add_argument("--max-ratio", type=float, default=2.0,
+                        help="maximum documents examined per document returned")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help=f"keep the {AUDIT_DB_NAME} database afterwards")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    results, unused = asyncio.run(run_audit(args))
+    failed = [result for result in results if not result["ok"]]
+
+    if args.json:
+        print(json.dumps({"results": results, "unused_indexes": unused, "failed": len(failed)}, indent=2))
+    else:
+        for result in results:
+            status = "PASS" if result["ok"] else "FAIL"
+            print(f"{status}  {result['name']:<36} {result['route']}")
+            print(f"      stages={','.join(result['stages'])} indexes={','.join(result['indexes']) or '-'} "
+                  f"examined={result['docs_examined']} returned={result['returned']}")
+            for problem in result["problems"]:
+                print(f"      !! {problem}")
+        if unused:
+            print(f"Declared indexes not used by any audited shape: {', '.join(unused)}")
+        print(f"{len(results) - len(failed)}/{len(results)} query shapes passed.")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
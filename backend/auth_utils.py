@@ -1,13 +1,17 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from typing import Optional
+import asyncio
 import os
 
 # Configuration
 SECRET_KEY = os.environ['SECRET_KEY']
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", PASSWORD_HASH_WORKERS * 8))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -17,6 +21,39 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+class PasswordHasherBusy(Exception):
+    """Raised when the bcrypt queue is full; callers should answer 503."""
+
+# bcrypt releases the GIL, so a thread pool gives real parallelism without
+# blocking the event loop. Requests beyond the queue depth are rejected.
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_pending = 0
+
+async def _run_hasher(fn, *args):
+    global _hash_pending
+    if _hash_pending >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        raise PasswordHasherBusy()
+
+    _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hash_pending -= 1
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_hasher(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await _run_hasher(get_password_hash, password)
+
+def password_hasher_stats() -> dict:
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_queue": PASSWORD_HASH_MAX_QUEUE,
+        "pending": _hash_pending,
+    }
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -26,3 +63,10 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+def create_user_token(user: dict, expires_delta: Optional[timedelta] = None):
+    # sub stays the email so tokens remain readable by older workers during a rollout
+    return create_access_token(
+        data={"sub": user["email"], "uid": user["id"], "role": user["role"], "ver": user.get("token_version", 0)},
+        expires_delta=expires_delta
+    )
@@ -0,0 +1,10 @@
+import asyncio
+from rollups import backfill_rollups
+
+async def backfill():
+    print("Backfilling monthly rollups from history...")
+    result = await backfill_rollups()
+    print(f"Monthly rollups rebuilt: {result}")
+
+if __name__ == "__main__":
+    asyncio.run(backfill())
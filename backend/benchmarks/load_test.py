@@ -0,0 +1,311 @@
+"""Async load test: seed a dedicated database, then replay realistic traffic mixes.
+
+server.app runs in-process behind httpx's ASGI transport (no sockets, no
+uvicorn), talking to MONGO_URL, or with --mongomock to an in-memory stand-in
+swapped in for database.client (pip install -r requirements-dev.txt; it
+lacks $lookup pipelines and change streams, so /meals/upcoming reports
+errors there). The database is DB_NAME + "_loadtest" and is dropped before
+seeding.
+
+    python benchmarks/load_test.py --mongomock --mix mixed --duration 20
+    python benchmarks/load_test.py --mix lunch --concurrency 64 --output lunch.json
+
+Mixes:
+  dashboard  students opening the home/wallet pages, the odd admin dashboard
+  planning   students toggling a week of meals (bulk + single selections)
+  lunch      a payment burst: every virtual user paying vendors
+  mixed      all of the above plus complaints
+
+Prints per-endpoint RPS and p50/p95/p99 as JSON so runs can be compared
+across commits.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MIXES = {
+    "dashboard": {"student_dashboard": 8, "admin_dashboard": 1},
+    "planning": {"week_planning": 1},
+    "lunch": {"lunch_payment": 1},
+    "mixed": {"student_dashboard": 5, "week_planning": 2, "lunch_payment": 3, "admin_dashboard": 1, "complaint": 0.2},
+}
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 2)
+
+
+class Recorder:
+    def __init__(self):
+        self.samples_ms = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    async def request(self, client, label, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = response.status_code
+        except Exception:
+            response, status = None, "exception"
+        self.samples_ms[label].append((time.perf_counter() - started) * 1000)
+        self.statuses[label][status] += 1
+        return response
+
+    def report(self, elapsed):
+        endpoints = {}
+        for label, samples in sorted(self.samples_ms.items()):
+            statuses = self.statuses[label]
+            endpoints[label] = {
+                "count": len(samples),
+                "rps": round(len(samples) / elapsed, 1),
+                "p50_ms": percentile(samples, 50),
+                "p95_ms": percentile(samples, 95),
+                "p99_ms": percentile(samples, 99),
+                "max_ms": round(max(samples), 2),
+                "errors": sum(count for status, count in statuses.items() if status == "exception" or status >= 500),
+                "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+            }
+        total = sum(len(samples) for samples in self.samples_ms.values())
+        return {"requests": total, "rps": round(total / elapsed, 1), "endpoints": endpoints}
+
+
+# ---------------------------------------------------------------------------
+# Seeding
+
+async def seed(db, args, rng):
+    from auth_utils import get_password_hash
+    from create_indexes import create_indexes
+    from counters import rebuild_headcounts
+    from meal_cache import bump_meals_version
+    from models import utc_now
+
+    await db.client.drop_database(db.name)
+    # stdout carries only the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        await create_indexes(db)
+    now = utc_now()
+    password = get_password_hash("loadtest")  # one bcrypt round for everyone
+
+    students = [
+        {"id": str(uuid.uuid4()), "email": f"student{i}@loadtest.credeat.com", "full_name": f"Student {i}", "role": "student",
+         "hashed_password": password, "wallet_balance": float(args.student_balance), "created_at": now}
+        for i in range(args.students)
+    ]
+    vendors = [
+        {"id": str(uuid.uuid4()), "email": f"vendor{i}@loadtest.credeat.com", "full_name": f"Vendor {i}", "role": "vendor",
+         "hashed_password": password, "wallet_balance": 0.0, "created_at": now}
+        for i in range(args.vendors)
+    ]
+    admin = {"id": str(uuid.uuid4()), "email": "admin@loadtest.credeat.com", "full_name": "Load Admin", "role": "admin",
+             "hashed_password": password, "wallet_balance": 0.0, "created_at": now}
+    await db.users.insert_many(students + vendors + [admin])
+
+    first_day = (now - timedelta(days=7)).date()
+    meals = [
+        {"id": str(uuid.uuid4()), "date": (first_day + timedelta(days=day)).isoformat(), "type": meal_type,
+         "menu_items": ["Rice", "Dal", "Salad"], "price": price, "is_active": True, "created_at": now,
+         "attending_count": 0, "skipped_count": 0}
+        for day in range(7 + args.days)
+        for meal_type, price in (("breakfast", 40.0), ("lunch", 80.0), ("dinner", 60.0))
+    ]
+    await db.meals.insert_many(meals)
+
+    # Last week's history: selections and a few payments per student
+    past_meals = meals[:21]
+    selections, transactions = [], []
+    for student in students:
+        for meal in rng.sample(past_meals, 10):
+            selections.append({"id": str(uuid.uuid4()), "user_id": student["id"], "meal_id": meal["id"],
+                               "status": "skipped" if rng.random() < 0.2 else "attending",
+                               "timestamp": now - timedelta(minutes=rng.randint(60, 7 * 24 * 60))})
+        for _ in range(args.history):
+            transactions.append({"id": str(uuid.uuid4()), "sender_id": student["id"],
+                                 "receiver_id": rng.choice(vendors)["id"], "amount": float(rng.randint(10, 60)),
+                                 "type": "vendor_payment", "description": "Payment",
+                                 "timestamp": now - timedelta(minutes=rng.randint(60, 7 * 24 * 60))})
+    if selections:
+        await db.meal_selections.insert_many(selections)
+    if transactions:
+        await db.transactions.insert_many(transactions)
+    await rebuild_headcounts()
+    await bump_meals_version()
+
+    upcoming = [meal for meal in meals if meal["date"] >= now.date().isoformat()]
+    return {"students": students, "vendors": vendors, "admin": admin, "upcoming": upcoming}
+
+
+# ---------------------------------------------------------------------------
+# Scenarios: one user action each, as the frontend would issue it
+
+async def student_dashboard(client, rec, ctx, rng):
+    headers = rng.choice(ctx["student_headers"])
+    await rec.request(client, "GET /api/auth/me", "GET", "/api/auth/me", headers=headers)
+    await rec.request(client, "GET /api/meals/", "GET", "/api/meals/", headers=headers)
+    await rec.request(client, "GET /api/meals/upcoming", "GET", "/api/meals/upcoming", headers=headers)
+    await rec.request(client, "GET /api/meals/my-selections", "GET", "/api/meals/my-selections", headers=headers)
+    await rec.request(client, "GET /api/wallet/", "GET", "/api/wallet/", params={"limit": 20}, headers=headers)
+
+
+async def admin_dashboard(client, rec, ctx, rng):
+    headers = ctx["admin_headers"]
+    await rec.request(client, "GET /api/analytics/wastage", "GET", "/api/analytics/wastage", headers=headers)
+    await rec.request(client, "GET /api/analytics/monthly", "GET", "/api/analytics/monthly", headers=headers)
+    await rec.request(client, "GET /api/complaints/", "GET", "/api/complaints/", params={"limit": 50}, headers=headers)
+    await rec.request(client, "GET /api/meals/headcount", "GET", "/api/meals/headcount", headers=headers)
+
+
+async def week_planning(client, rec, ctx, rng):
+    headers = rng.choice(ctx["student_headers"])
+    week = rng.sample(ctx["upcoming"], min(7, len(ctx["upcoming"])))
+    items = [{"meal_id": meal["id"], "status": rng.choice(("attending", "skipped"))} for meal in week]
+    await rec.request(client, "POST /api/meals/selections/bulk", "POST", "/api/meals/selections/bulk",
+                      json=items, headers=headers)
+    for meal in week[:2]:
+        status = rng.choice(("attending", "skipped"))
+        await rec.request(client, "POST /api/meals/{id}/select", "POST", f"/api/meals/{meal['id']}/select",
+                          params={"status": status}, headers=headers)
+
+
+async def lunch_payment(client, rec, ctx, rng):
+    headers = {**rng.choice(ctx["student_headers"]), "Idempotency-Key": str(uuid.uuid4())}
+    payment = {"vendor_id": rng.choice(ctx["vendor_ids"]), "amount": float(rng.randint(20, 90))}
+    await rec.request(client, "POST /api/wallet/pay", "POST", "/api/wallet/pay", json=payment, headers=headers)
+    await rec.request(client, "GET /api/wallet/", "GET", "/api/wallet/", params={"limit": 20}, headers=headers)
+
+
+async def complaint(client, rec, ctx, rng):
+    headers = rng.choice(ctx["student_headers"])
+    form = {"category": rng.choice(("hygiene", "quality", "other")), "description": "Load test complaint"}
+    await rec.request(client, "POST /api/complaints/", "POST", "/api/complaints/", data=form, headers=headers)
+
+
+SCENARIOS = {
+    "student_dashboard": student_dashboard,
+    "admin_dashboard": admin_dashboard,
+    "week_planning": week_planning,
+    "lunch_payment": lunch_payment,
+    "complaint": complaint,
+}
+
+
+async def run_phase(client, ctx, mix, concurrency, duration, seed):
+    recorder = Recorder()
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user(index):
+        rng = random.Random(seed * 1000 + index)
+        while time.perf_counter() < deadline:
+            scenario = SCENARIOS[rng.choices(names, weights)[0]]
+            await scenario(client, recorder, ctx, rng)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(index) for index in range(concurrency)))
+    return recorder.report(time.perf_counter() - started)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def use_mongomock():
+    """Point database.client/db at mongomock before any other module imports them."""
+    from mongomock_motor import AsyncMongoMockClient
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")  # never connected
+    import database
+    database.client = AsyncMongoMockClient(tz_aware=True)
+    database.db = database.client[os.environ["DB_NAME"]]
+
+
+async def main(args):
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(BACKEND_DIR, ".env"))
+    os.environ["DB_NAME"] = args.db_name or f"{os.environ.get('DB_NAME', 'credeat')}_loadtest"
+
+    import httpx
+    if args.mongomock:
+        use_mongomock()
+    import server
+    from auth_utils import create_user_token
+    from database import db
+
+    rng = random.Random(args.seed)
+    print(f"Seeding {os.environ['DB_NAME']}...", file=sys.stderr)
+    seeded = await seed(db, args, rng)
+    ctx = {
+        "student_headers": [
+            {"Authorization": f"Bearer {create_user_token(student)}"}
+            for student in seeded["students"]
+        ],
+        "admin_headers": {"Authorization": f"Bearer {create_user_token(seeded['admin'])}"},
+        "vendor_ids": [vendor["id"] for vendor in seeded["vendors"]],
+        "upcoming": seeded["upcoming"],
+    }
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+            if args.warmup:
+                print(f"Warming up for {args.warmup}s...", file=sys.stderr)
+                await run_phase(client, ctx, MIXES[args.mix], args.concurrency, args.warmup, args.seed + 1)
+            print(f"Running '{args.mix}' for {args.duration}s with {args.concurrency} virtual users...", file=sys.stderr)
+            result = await run_phase(client, ctx, MIXES[args.mix], args.concurrency, args.duration, args.seed)
+
+    report = {
+        "commit": git_commit(),
+        "mix": args.mix,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "database": "mongomock" if args.mongomock else "mongod",
+        "python": platform.python_version(),
+        "dataset": {"students": args.students, "vendors": args.vendors, "days": args.days, "history": args.history},
+        **result,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if not args.keep:
+        await db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-process async load test for the CredEat API")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=32, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before the run")
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--vendors", type=int, default=5)
+    parser.add_argument("--days", type=int, default=14, help="days of upcoming meals")
+    parser.add_argument("--history", type=int, default=20, help="past payments per student")
+    parser.add_argument("--student-balance", type=float, default=1_000_000)
+    parser.add_argument("--db-name", help="defaults to DB_NAME + '_loadtest'; dropped before seeding")
+    parser.add_argument("--keep", action="store_true", help="keep the database after the run")
+    parser.add_argument("--mongomock", action="store_true", help="run against an in-memory stand-in instead of MONGO_URL")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,107 @@
+"""Measure GET /api/meals/ latency while a burst of logins is running.
+
+Run against a local server started with uvicorn, e.g.
+
+    uvicorn server:app --port 8001
+    python benchmarks/login_burst.py --base-url http://localhost:8001 --logins 200
+
+Before bcrypt was moved off the event loop the meals p99 tracked the cost of
+a whole queue of bcrypt rounds; it should now stay close to the idle p99.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples_ms):
+    return {
+        "count": len(samples_ms),
+        "p50_ms": percentile(samples_ms, 50),
+        "p95_ms": percentile(samples_ms, 95),
+        "p99_ms": percentile(samples_ms, 99),
+        "max_ms": max(samples_ms) if samples_ms else None,
+        "mean_ms": statistics.fmean(samples_ms) if samples_ms else None,
+    }
+
+
+def probe_meals(base_url, stop, samples_ms, interval):
+    session = requests.Session()
+    while not stop.is_set():
+        started = time.perf_counter()
+        session.get(f"{base_url}/api/meals/")
+        samples_ms.append((time.perf_counter() - started) * 1000)
+        time.sleep(interval)
+
+
+def login_once(base_url, email, password):
+    started = time.perf_counter()
+    response = requests.post(
+        f"{base_url}/api/auth/login",
+        data={"username": email, "password": password},
+    )
+    return response.status_code, (time.perf_counter() - started) * 1000
+
+
+def run_phase(args, with_logins):
+    stop = threading.Event()
+    samples_ms = []
+    probe = threading.Thread(target=probe_meals, args=(args.base_url, stop, samples_ms, args.probe_interval))
+    probe.start()
+
+    statuses = {}
+    login_ms = []
+    if with_logins:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [
+                pool.submit(login_once, args.base_url, args.email, args.password)
+                for _ in range(args.logins)
+            ]
+            for future in futures:
+                status, elapsed = future.result()
+                statuses[status] = statuses.get(status, 0) + 1
+                login_ms.append(elapsed)
+    else:
+        time.sleep(args.idle_seconds)
+
+    stop.set()
+    probe.join()
+    result = {"meals": summarize(samples_ms)}
+    if with_logins:
+        result["logins"] = summarize(login_ms)
+        result["login_status_codes"] = statuses
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--email", default="admin@credeat.com")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--idle-seconds", type=float, default=5.0)
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    report = {
+        "idle": run_phase(args, with_logins=False),
+        "login_burst": run_phase(args, with_logins=True),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
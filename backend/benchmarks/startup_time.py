@@ -0,0 +1,79 @@
+"""Time from launching uvicorn to the first 200 from /api/health/ready.
+
+Each run starts a fresh server process from backend/ with the current
+environment (MONGO_URL, DB_NAME, ...), polls readiness, then stops it:
+
+    python benchmarks/startup_time.py --runs 5
+    python benchmarks/startup_time.py --workers 8 --env SEED_ON_STARTUP=0
+
+Reports per-run seconds plus min/median/max as JSON. Compare SEED_ON_STARTUP
+on and off, and worker counts, to see what each boot costs.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def ready(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def measure(args, env):
+    command = [sys.executable, "-m", "uvicorn", "server:app", "--port", str(args.port),
+               "--workers", str(args.workers), "--log-level", "warning"]
+    url = f"http://127.0.0.1:{args.port}/api/health/ready"
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < args.timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with code {process.returncode}")
+            if ready(url):
+                return time.perf_counter() - started
+            time.sleep(args.poll_interval)
+        raise RuntimeError(f"not ready after {args.timeout}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure server time-to-ready")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--poll-interval", type=float, default=0.02)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra environment for the server")
+    parser.add_argument("--verbose", action="store_true", help="show server stderr")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.update(item.split("=", 1) for item in args.env)
+
+    seconds = [measure(args, env) for _ in range(args.runs)]
+    print(json.dumps({
+        "workers": args.workers,
+        "env": args.env,
+        "runs_s": [round(value, 3) for value in seconds],
+        "min_s": round(min(seconds), 3),
+        "median_s": round(statistics.median(seconds), 3),
+        "max_s": round(max(seconds), 3),
+    }, indent=2))
@@ -0,0 +1,203 @@
+from pymongo import UpdateOne
+from database import db
+from datetime import datetime, timezone
+import asyncio
+
+# One document per meal date ("YYYY-MM-DD") plus a running total under
+# TOTAL_ID, so the wastage dashboard is a single small read.
+TOTAL_ID = "all"
+WASTAGE_KG_PER_MEAL = 0.3
+
+
+def selection_deltas(previous_status, new_status) -> dict:
+    deltas = {"selections": 0, "skipped": 0}
+    if previous_status is None:
+        deltas["selections"] += 1
+    if previous_status == "skipped":
+        deltas["skipped"] -= 1
+    if new_status == "skipped":
+        deltas["skipped"] += 1
+    return deltas
+
+
+async def _bump(deltas_by_date: dict):
+    total = {}
+    operations = []
+    for date, deltas in deltas_by_date.items():
+        deltas = {field: value for field, value in deltas.items() if value}
+        if not deltas:
+            continue
+        operations.append(UpdateOne({"_id": date}, {"$inc": deltas}, upsert=True))
+        for field, value in deltas.items():
+            total[field] = total.get(field, 0) + value
+    if not operations:
+        return
+    operations.append(UpdateOne({"_id": TOTAL_ID}, {"$inc": total}, upsert=True))
+    await db.wastage_counters.bulk_write(operations, ordered=False)
+
+
+# Per-meal headcounts live on the meal documents themselves
+HEADCOUNT_FIELDS = {"attending": "attending_count", "skipped": "skipped_count"}
+
+
+def headcount_deltas(previous_status, new_status) -> dict:
+    deltas = {field: 0 for field in HEADCOUNT_FIELDS.values()}
+    if previous_status in HEADCOUNT_FIELDS:
+        deltas[HEADCOUNT_FIELDS[previous_status]] -= 1
+    if new_status in HEADCOUNT_FIELDS:
+        deltas[HEADCOUNT_FIELDS[new_status]] += 1
+    return deltas
+
+
+async def _bump_headcounts(deltas_by_meal: dict):
+    operations = []
+    for meal_id, deltas in deltas_by_meal.items():
+        deltas = {field: value for field, value in deltas.items() if value}
+        if deltas:
+            operations.append(UpdateOne({"id": meal_id}, {"$inc": deltas}))
+    if operations:
+        await db.meals.bulk_write(operations, ordered=False)
+
+
+async def record_selection_transitions(transitions):
+    """Apply (meal, previous_status, new_status) transitions to the daily
+    counters and the meals' headcounts, one round trip each."""
+    deltas_by_date = {}
+    deltas_by_meal = {}
+    for meal, previous_status, new_status in transitions:
+        day = deltas_by_date.setdefault(meal["date"], {"selections": 0, "skipped": 0})
+        for field, value in selection_deltas(previous_status, new_status).items():
+            day[field] += value
+        headcount = deltas_by_meal.setdefault(meal["id"], {field: 0 for field in HEADCOUNT_FIELDS.values()})
+        for field, value in headcount_deltas(previous_status, new_status).items():
+            headcount[field] += value
+    await asyncio.gather(_bump(deltas_by_date), _bump_headcounts(deltas_by_meal))
+
+
+async def record_meal_created(meal: dict):
+    await _bump({meal["date"]: {"meals": 1}})
+
+
+def _stats(meals: int, selections: int, skipped: int) -> dict:
+    return {
+        "total_meals": meals,
+        "total_meals_served": selections,
+        "meals_skipped": skipped,
+        "wastage_saved_kg": skipped * WASTAGE_KG_PER_MEAL,
+        "participation_rate": ((selections - skipped) / selections) * 100 if selections > 0 else 0
+    }
+
+
+async def read_wastage_counters(from_date=None, to_date=None):
+    """O(1) (or O(days) for a range) read; None until the counters are built."""
+    total = await db.wastage_counters.find_one({"_id": TOTAL_ID})
+    if not total or not total.get("initialized"):
+        return None
+
+    if from_date is None and to_date is None:
+        return _stats(total.get("meals", 0), total.get("selections", 0), total.get("skipped", 0))
+
+    sums = {"meals": 0, "selections": 0, "skipped": 0}
+    async for day in db.wastage_counters.find(_date_range(from_date, to_date, field="_id")):
+        if day["_id"] == TOTAL_ID:
+            continue
+        for field in sums:
+            sums[field] += day.get(field, 0)
+    return _stats(sums["meals"], sums["selections"], sums["skipped"])
+
+
+def _date_range(from_date, to_date, field="date"):
+    bounds = {}
+    if from_date:
+        bounds["$gte"] = from_date
+    if to_date:
+        bounds["$lte"] = to_date
+    return {field: bounds} if bounds else {}
+
+
+def _wastage_pipeline(match: dict, group_by):
+    return [
+        {"$match": match},
+        {"$facet": {
+            "meals": [{"$group": {"_id": group_by, "count": {"$sum": 1}}}],
+            "selections": [
+                {"$lookup": {"from": "meal_selections", "localField": "id", "foreignField": "meal_id", "as": "selection"}},
+                {"$unwind": "$selection"},
+                {"$group": {
+                    "_id": group_by,
+                    "selections": {"$sum": 1},
+                    "skipped": {"$sum": {"$cond": [{"$eq": ["$selection.status", "skipped"]}, 1, 0]}}
+                }}
+            ]
+        }}
+    ]
+
+
+async def compute_wastage(from_date=None, to_date=None) -> dict:
+    """Fallback: one $facet aggregation over meals in the range and their selections."""
+    result = await db.meals.aggregate(_wastage_pipeline(_date_range(from_date, to_date), None)).to_list(1)
+    facet = result[0] if result else {"meals": [], "selections": []}
+    meals = facet["meals"][0]["count"] if facet["meals"] else 0
+    selections = facet["selections"][0] if facet["selections"] else {"selections": 0, "skipped": 0}
+    return _stats(meals, selections["selections"], selections["skipped"])
+
+
+async def rebuild_wastage_counters():
+    """Recompute every per-date counter from history and mark the counters usable."""
+    result = await db.meals.aggregate(_wastage_pipeline({}, "$date")).to_list(1)
+    facet = result[0] if result else {"meals": [], "selections": []}
+
+    days = {}
+    for row in facet["meals"]:
+        days.setdefault(row["_id"], {"meals": 0, "selections": 0, "skipped": 0})["meals"] = row["count"]
+    for row in facet["selections"]:
+        day = days.setdefault(row["_id"], {"meals": 0, "selections": 0, "skipped": 0})
+        day["selections"] = row["selections"]
+        day["skipped"] = row["skipped"]
+
+    total = {field: sum(day[field] for day in days.values()) for field in ("meals", "selections", "skipped")}
+    await db.wastage_counters.delete_many({"_id": {"$nin": [TOTAL_ID, *days]}})
+    operations = [UpdateOne({"_id": date}, {"$set": day}, upsert=True) for date, day in days.items()]
+    operations.append(UpdateOne(
+        {"_id": TOTAL_ID},
+        {"$set": {**total, "initialized": True, "rebuilt_at": datetime.now(timezone.utc)}},
+        upsert=True
+    ))
+    await db.wastage_counters.bulk_write(operations, ordered=False)
+    return {"days": len(days), **total}
+
+
+async def rebuild_headcounts(batch_size: int = 1000):
+    """Recompute every meal's attending/skipped counts with one $group over selections."""
+    rebuilt_at = datetime.now(timezone.utc)
+    pipeline = [{"$group": {
+        "_id": "$meal_id",
+        "attending_count": {"$sum": {"$cond": [{"$eq": ["$status", "attending"]}, 1, 0]}},
+        "skipped_count": {"$sum": {"$cond": [{"$eq": ["$status", "skipped"]}, 1, 0]}}
+    }}]
+
+    meals = 0
+    operations = []
+    async for row in db.meal_selections.aggregate(pipeline):
+        operations.append(UpdateOne(
+            {"id": row["_id"]},
+            {"$set": {
+                "attending_count": row["attending_count"],
+                "skipped_count": row["skipped_count"],
+                "headcounts_rebuilt_at": rebuilt_at
+            }}
+        ))
+        if len(operations) >= batch_size:
+            await db.meals.bulk_write(operations, ordered=False)
+            meals += len(operations)
+            operations = []
+    if operations:
+        await db.meals.bulk_write(operations, ordered=False)
+        meals += len(operations)
+
+    # Meals without any selection go back to zero
+    zeroed = await db.meals.update_many(
+        {"headcounts_rebuilt_at": {"$ne": rebuilt_at}},
+        {"$set": {"attending_count": 0, "skipped_count": 0, "headcounts_rebuilt_at": rebuilt_at}}
+    )
+    return {"meals_with_selections": meals, "meals_zeroed": zeroed.modified_count}
@@ -1,34 +1,83 @@
 import asyncio
+from pymongo import IndexModel
 from database import db
+from events import EVENTS_TTL_SECONDS
 
-async def create_indexes():
+# Declarative index spec: every query shape in routes/* must be served by one
+# of these (see audit_queries.py, which checks plans against exactly this set).
+INDEXES = {
+    "users": [
+        IndexModel([("email", 1)], unique=True),
+        IndexModel([("id", 1)], unique=True),
+    ],
+    "meals": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("is_active", 1)]),
+        # Headcount reads are covered by these (no document fetch)
+        IndexModel([("id", 1), ("date", 1), ("type", 1), ("attending_count", 1), ("skipped_count", 1)]),
+        IndexModel([("date", 1), ("type", 1), ("id", 1), ("attending_count", 1), ("skipped_count", 1)]),
+    ],
+    "meal_selections": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("user_id", 1), ("meal_id", 1)], unique=True),
+        IndexModel([("status", 1)]),
+        IndexModel([("meal_id", 1)]),
+    ],
+    "transactions": [
+        IndexModel([("id", 1)], unique=True),
+        # Wallet history: one branch per side, newest first (keyset on timestamp, id)
+        IndexModel([("sender_id", 1), ("timestamp", -1), ("id", -1)]),
+        IndexModel([("receiver_id", 1), ("timestamp", -1), ("id", -1)]),
+        # Reconciliation streams the ledger in (timestamp, id) order
+        IndexModel([("timestamp", 1), ("id", 1)]),
+        # Settlement $group over a period's vendor payments, covered by the index
+        IndexModel(
+            [("type", 1), ("timestamp", 1), ("receiver_id", 1), ("amount", 1)],
+            partialFilterExpression={"type": "vendor_payment"}
+        ),
+    ],
+    "complaints": [
+        IndexModel([("id", 1)], unique=True),
+        # Listing: every combination of the optional user/status/category
+        # equality filters, each followed by the (created_at, id) keyset
+        IndexModel([("created_at", -1), ("id", -1)]),
+        IndexModel([("status", 1), ("created_at", -1), ("id", -1)]),
+        IndexModel([("category", 1), ("created_at", -1), ("id", -1)]),
+        IndexModel([("status", 1), ("category", 1), ("created_at", -1), ("id", -1)]),
+        IndexModel([("user_id", 1), ("created_at", -1), ("id", -1)]),
+        IndexModel([("user_id", 1), ("status", 1), ("created_at", -1), ("id", -1)]),
+        IndexModel([("user_id", 1), ("category", 1), ("created_at", -1), ("id", -1)]),
+        IndexModel([("user_id", 1), ("status", 1), ("category", 1), ("created_at", -1), ("id", -1)]),
+        IndexModel([("description", "text")]),
+    ],
+    "idempotency_keys": [
+        # TTL: finished keys after IDEMPOTENCY_TTL_SECONDS, abandoned claims sooner
+        IndexModel([("expires_at", 1)], expireAfterSeconds=0),
+    ],
+    "events": [
+        # Only a bus between workers (change streams); nothing reads old events
+        IndexModel([("created_at", 1)], expireAfterSeconds=EVENTS_TTL_SECONDS),
+    ],
+    "settlements": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("vendor_id", 1), ("period", -1)], unique=True),
+        IndexModel([("period", -1)]),
+        IndexModel([("status", 1), ("period", 1)]),
+        # check_period: settlements ending on or after the new period's start
+        IndexModel([("end", -1), ("start", 1)]),
+    ],
+    "monthly_rollups": [
+        IndexModel([("month", 1), ("metric", 1)], unique=True),
+    ],
+}
+
+async def create_indexes(database=db):
     print("Creating indexes...")
-    
-    # Users
-    await db.users.create_index("email", unique=True)
-    await db.users.create_index("id", unique=True)
-    
-    # Meals
-    await db.meals.create_index("id", unique=True)
-    await db.meals.create_index("date")
-    await db.meals.create_index("is_active")
-    
-    # Meal Selections
-    await db.meal_selections.create_index("id", unique=True)
-    await db.meal_selections.create_index([("user_id", 1), ("meal_id", 1)], unique=True)
-    await db.meal_selections.create_index("status")
-    
-    # Transactions
-    await db.transactions.create_index("id", unique=True)
-    await db.transactions.create_index("sender_id")
-    await db.transactions.create_index("receiver_id")
-    await db.transactions.create_index("timestamp")
-    
-    # Complaints
-    await db.complaints.create_index("id", unique=True)
-    await db.complaints.create_index("user_id")
-    await db.complaints.create_index("created_at")
-    
+
+    for collection, indexes in INDEXES.items():
+        names = await database[collection].create_indexes(indexes)
+        print(f"  {collection}: {', '.join(names)}")
+
     print("Indexes created successfully.")
 
 if __name__ == "__main__":
@@ -1,11 +1,86 @@
+import asyncio
+import logging
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 from pathlib import Path
+from datetime import datetime, timezone
+from metrics import command_listener
+
+logger = logging.getLogger(__name__)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+
+# Configuration: connection pool (per worker process) and timeouts
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", "0")) or None
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", "0")) or None
+MONGO_WARMUP_CONNECTIONS = int(os.environ.get("MONGO_WARMUP_CONNECTIONS", "4"))
+MONGO_WARMUP_RETRY_SECONDS = 1.0
+
+# tz_aware: stored BSON dates come back as UTC-aware datetimes.
+# Construction does not connect; warm_up_pool() does, off the startup path.
+client = AsyncIOMotorClient(
+    mongo_url,
+    tz_aware=True,
+    event_listeners=[command_listener],
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+)
 db = client[os.environ['DB_NAME']]
+
+pool_status = {"ready": False, "attempts": 0, "warm_connections": 0, "connected_at": None, "last_error": None}
+
+async def warm_up_pool():
+    """Ping until the deployment answers, then open MONGO_WARMUP_CONNECTIONS
+    connections at once so the first requests do not pay for handshakes."""
+    while True:
+        pool_status["attempts"] += 1
+        try:
+            await client.admin.command("ping")
+            break
+        except Exception as e:
+            pool_status["last_error"] = str(e)
+            await asyncio.sleep(MONGO_WARMUP_RETRY_SECONDS)
+
+    warmups = max(0, min(MONGO_WARMUP_CONNECTIONS, MONGO_MAX_POOL_SIZE) - 1)
+    results = await asyncio.gather(*(client.admin.command("ping") for _ in range(warmups)), return_exceptions=True)
+    pool_status.update(
+        ready=True,
+        warm_connections=1 + sum(not isinstance(result, Exception) for result in results),
+        connected_at=datetime.now(timezone.utc).isoformat(),
+        last_error=None
+    )
+
+async def ping_database(timeout: float) -> bool:
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), timeout)
+        return True
+    except Exception as e:
+        pool_status["last_error"] = str(e)
+        return False
+
+_transactions_supported = None
+
+async def supports_transactions():
+    # Multi-document transactions need a replica set (or mongos); probe once per
+    # process, but only cache an answer: a failed probe is retried on the next call
+    global _transactions_supported
+    if _transactions_supported is None:
+        try:
+            hello = await client.admin.command("hello")
+        except Exception as e:
+            logger.warning("Could not probe for transaction support, assuming none for now: %s", e)
+            return False
+        _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return _transactions_supported
@@ -1,40 +1,87 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from database import db
 from auth_utils import SECRET_KEY, ALGORITHM
 from models import UserResponse, TokenData
+from principal_cache import principal_cache
+from typing import Optional
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token(token: Optional[str]) -> TokenData:
+    if not token:
+        raise _credentials_exception()
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
     except JWTError:
-        raise credentials_exception
-        
-    user = await db.users.find_one({"email": token_data.email})
+        raise _credentials_exception()
+    email: str = payload.get("sub")
+    if email is None:
+        raise _credentials_exception()
+    return TokenData(email=email, user_id=payload.get("uid"), role=payload.get("role"), version=payload.get("ver", 0))
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    return await user_from_token(token)
+
+async def get_stream_user(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    access_token: Optional[str] = Query(None, description="For EventSource, which cannot send headers")
+):
+    return await user_from_token(token or access_token)
+
+async def user_from_token(token: Optional[str]):
+    return await user_from_claims(decode_token(token))
+
+async def user_from_claims(token_data: TokenData):
+    # Tokens carry the user id; the email lookup only serves tokens minted before that
+    subject = token_data.user_id or token_data.email
+    cached_user = principal_cache.get(subject, token_data.version)
+    if cached_user is not None:
+        return cached_user
+
+    query = {"id": token_data.user_id} if token_data.user_id else {"email": token_data.email}
+    user = await db.users.find_one(query, {"_id": 0, "hashed_password": 0})
     if user is None:
-        raise credentials_exception
-        
-    # Remove _id if present, as we use 'id' (UUID)
-    if '_id' in user:
-        del user['_id']
-    return UserResponse(**user)
+        raise _credentials_exception()
+    token_version = user.get("token_version", 0)
+    if token_data.version != token_version:
+        # Revoked by a logout or role change
+        raise _credentials_exception()
 
-async def get_current_active_user(current_user: UserResponse = Depends(get_current_user)):
+    current_user = UserResponse(**user)
+    principal_cache.set(subject, current_user, token_version)
     return current_user
 
-async def get_admin_user(current_user: UserResponse = Depends(get_current_user)):
-    if current_user.role != "admin":
+async def revoke_tokens(user_id: str):
+    """Invalidate every token issued to the user so far (logout, role change)."""
+    await db.users.update_one({"id": user_id}, {"$inc": {"token_version": 1}})
+    principal_cache.invalidate_user_id(user_id)
+
+async def _user_with_role(token: str, roles):
+    token_data = decode_token(token)
+    # The role claim turns other users away without a database read
+    if token_data.role is not None and token_data.role not in roles:
         raise HTTPException(status_code=403, detail="Not authorized")
+    current_user = await user_from_claims(token_data)
+    if current_user.role not in roles:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return current_user
+
+async def get_current_active_user(current_user: UserResponse = Depends(get_current_user)):
     return current_user
+
+async def get_admin_user(token: str = Depends(oauth2_scheme)):
+    return await _user_with_role(token, ("admin",))
+
+async def get_kitchen_user(token: str = Depends(oauth2_scheme)):
+    # Mess admins and the vendors running the kitchen
+    return await _user_with_role(token, ("admin", "vendor"))
@@ -0,0 +1,153 @@
+from collections import deque
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import OperationFailure
+from database import db, supports_transactions
+from models import utc_now
+import asyncio
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", "256"))
+EVENTS_TTL_SECONDS = int(os.environ.get("EVENTS_TTL_SECONDS", "3600"))
+EVENT_BUS_RETRY_SECONDS = 1.0
+
+
+class Subscription:
+    """One connected client: a bounded buffer that drops its oldest event when full.
+
+    A slow reader therefore loses history instead of holding memory or
+    blocking publishers; `dropped` tells it that happened.
+    """
+
+    def __init__(self, user_id: str, role: str, max_events: int):
+        self.user_id = user_id
+        self.role = role
+        self.dropped = 0
+        self._events = deque(maxlen=max_events)
+        self._ready = asyncio.Event()
+
+    def wants(self, event: dict) -> bool:
+        audience = event["audience"]
+        return self.role in audience.get("roles", ()) or self.user_id in audience.get("user_ids", ())
+
+    def push(self, event: dict) -> bool:
+        """Buffer `event`; True if that pushed out an older one."""
+        dropped = len(self._events) == self._events.maxlen
+        if dropped:
+            self.dropped += 1
+        self._events.append(event)
+        self._ready.set()
+        return dropped
+
+    async def next(self, timeout: float):
+        """The oldest buffered event, or None after `timeout` seconds without one."""
+        if not self._events:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._events.popleft()
+
+
+class EventHub:
+    """In-process fan-out to the SSE subscribers of this worker.
+
+    On a replica set every event is inserted into the `events` collection and
+    each worker's change stream feeds its own hub, so a payment handled by
+    one worker reaches dashboards connected to any other. Without one
+    (single worker, local dev) events are fanned out directly.
+    """
+
+    def __init__(self, max_events: int):
+        self.max_events = max_events
+        self._subscriptions = set()
+        self._watcher = None
+        self._use_bus = False
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id: str, role: str) -> Subscription:
+        subscription = Subscription(user_id, role, self.max_events)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    def fan_out(self, event: dict):
+        for subscription in self._subscriptions:
+            if subscription.wants(event):
+                self.dropped += subscription.push(event)
+                self.delivered += 1
+
+    async def publish(self, type: str, data: dict, roles=(), user_ids=()):
+        """Announce an event; never raises, a lost notification must not fail the write it describes."""
+        event = {
+            "_id": str(uuid.uuid4()),
+            "type": type,
+            "data": jsonable_encoder(data),
+            "audience": {"roles": list(roles), "user_ids": [user_id for user_id in user_ids if user_id]},
+            "created_at": utc_now()
+        }
+        self.published += 1
+        if not self._use_bus:
+            self.fan_out(event)
+            return
+        try:
+            await db.events.insert_one(event)
+        except Exception:
+            logger.exception("Failed to publish %s event", type)
+
+    async def start(self):
+        self._use_bus = await supports_transactions()
+        if self._use_bus:
+            self._watcher = asyncio.create_task(self._watch())
+        else:
+            logger.info("No replica set: events are delivered within this worker only")
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    async def _watch(self):
+        resume_token = None
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            try:
+                async with db.events.watch(pipeline, resume_after=resume_token) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        self.fan_out(change["fullDocument"])
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure:
+                # e.g. the resume point fell off the oplog: continue from now
+                logger.exception("Event change stream failed; restarting from the current position")
+                resume_token = None
+                await asyncio.sleep(EVENT_BUS_RETRY_SECONDS)
+            except Exception:
+                logger.exception("Event change stream failed; reconnecting")
+                await asyncio.sleep(EVENT_BUS_RETRY_SECONDS)
+
+    def stats(self) -> dict:
+        return {
+            "bus": "change_stream" if self._use_bus else "local",
+            "subscribers": len(self._subscriptions),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+event_hub = EventHub(EVENT_QUEUE_SIZE)
@@ -0,0 +1,28 @@
+from fastapi import Response
+from pydantic import TypeAdapter
+import os
+
+# Opt-in: list endpoints fetch only their response fields and write the body
+# once with a compiled pydantic-core serializer, instead of response_model
+# validation -> jsonable_encoder -> json.dumps. Every endpoint using it declares
+# the same type as its response_model, so both paths produce the same body
+# (datetimes in pydantic's ISO form, e.g. ...Z).
+FAST_JSON_RESPONSES = os.environ.get("FAST_JSON_RESPONSES", "0") == "1"
+
+
+def projection(model) -> dict:
+    """Mongo projection fetching exactly the fields `model` serializes."""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+
+class JSONSerializer:
+    """Validate-and-dump for one response type, compiled once at import."""
+
+    def __init__(self, type_):
+        self.adapter = TypeAdapter(type_)
+
+    def dump(self, content) -> bytes:
+        return self.adapter.dump_json(self.adapter.validate_python(content))
+
+    def response(self, content, headers=None) -> Response:
+        return Response(content=self.dump(content), media_type="application/json", headers=headers)
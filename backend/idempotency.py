@@ -0,0 +1,193 @@
+from collections import OrderedDict
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pymongo.errors import DuplicateKeyError
+from database import db
+from datetime import datetime, timedelta, timezone
+import asyncio
+import hashlib
+import json
+import os
+
+# Configuration
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_PENDING_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_PENDING_TTL_SECONDS", "120"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_POLL_SECONDS = 0.1
+IDEMPOTENCY_CACHE_MAX_ENTRIES = int(os.environ.get("IDEMPOTENCY_CACHE_MAX_ENTRIES", "10000"))
+MAX_KEY_LENGTH = 255
+
+# idempotency_keys holds one document per (user, route, key): "pending" while
+# the first request runs, then the stored response. A TTL index on
+# expires_at removes finished keys after IDEMPOTENCY_TTL_SECONDS and claims
+# abandoned by a crashed worker after IDEMPOTENCY_PENDING_TTL_SECONDS.
+# Finished responses never change, so they are also kept in a process-local
+# LRU until the same expiry; duplicates racing inside one process wait on the
+# first one's future.
+_responses = OrderedDict()  # document id -> (expires_at, stored response)
+_in_flight = {}  # document id -> asyncio.Future of the stored response
+idempotency_stats = {"executed": 0, "replayed": 0, "waited": 0, "conflicts": 0}
+
+
+def request_fingerprint(payload) -> str:
+    canonical = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def idempotency_cache_stats():
+    return {**idempotency_stats, "cached_responses": len(_responses), "in_flight": len(_in_flight)}
+
+
+def _remember(doc_id: str, stored: dict, expires_at: datetime):
+    _responses[doc_id] = (expires_at, stored)
+    _responses.move_to_end(doc_id)
+    while len(_responses) > IDEMPOTENCY_CACHE_MAX_ENTRIES:
+        _responses.popitem(last=False)
+
+
+def _recall(doc_id: str):
+    entry = _responses.get(doc_id)
+    if entry is None:
+        return None
+    expires_at, stored = entry
+    if expires_at <= datetime.now(timezone.utc):
+        del _responses[doc_id]
+        return None
+    _responses.move_to_end(doc_id)
+    return stored
+
+
+def _replay(stored: dict, fingerprint: str):
+    if stored["fingerprint"] != fingerprint:
+        idempotency_stats["conflicts"] += 1
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    idempotency_stats["replayed"] += 1
+    return JSONResponse(
+        status_code=stored["status_code"],
+        content=stored["body"],
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+
+async def _wait_for_other_worker(doc_id: str):
+    deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_SECONDS
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+        doc = await db.idempotency_keys.find_one({"_id": doc_id})
+        if doc is None:
+            # The first attempt failed without a replayable response
+            return None
+        if doc["status"] == "done":
+            return doc
+    raise HTTPException(
+        status_code=409,
+        detail="A request with this Idempotency-Key is still in progress",
+        headers={"Retry-After": "1"}
+    )
+
+
+async def _claim(doc_id: str, fingerprint: str):
+    """Insert the pending claim; returns the stored response instead if the key is already answered."""
+    while True:
+        now = datetime.now(timezone.utc)
+        try:
+            await db.idempotency_keys.insert_one({
+                "_id": doc_id,
+                "fingerprint": fingerprint,
+                "status": "pending",
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=IDEMPOTENCY_PENDING_TTL_SECONDS)
+            })
+            return None
+        except DuplicateKeyError:
+            doc = await db.idempotency_keys.find_one({"_id": doc_id})
+            if doc is not None and doc["status"] == "pending":
+                idempotency_stats["waited"] += 1
+                doc = await _wait_for_other_worker(doc_id)
+            if doc is not None:
+                return {field: doc[field] for field in ("fingerprint", "status_code", "body", "expires_at")}
+            # Released (or expired) in the meantime: claim it ourselves
+
+
+async def idempotent(user_id: str, route: str, key, payload, handler):
+    """Run `handler()` at most once per (user, route, Idempotency-Key).
+
+    Without a key the handler simply runs. A repeated key replays the stored
+    status and body without calling the handler; a key reused with a
+    different payload is rejected with 422. Duplicates arriving while the
+    first request is still running wait for its outcome. Responses and
+    HTTP errors below 500 are stored; 5xx and unexpected errors release the
+    key so the client can retry.
+    """
+    if key is None:
+        return await handler()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+
+    doc_id = f"{user_id}:{route}:{key}"
+    fingerprint = request_fingerprint(payload)
+
+    stored = _recall(doc_id)
+    if stored is not None:
+        return _replay(stored, fingerprint)
+
+    while doc_id in _in_flight:
+        future = _in_flight[doc_id]
+        if future.cancelled():
+            # The first attempt failed without a replayable response; retry it
+            _in_flight.pop(doc_id, None)
+            break
+        idempotency_stats["waited"] += 1
+        await asyncio.wait([future])
+        if not future.cancelled():
+            return _replay(future.result(), fingerprint)
+
+    # Registered before the first await so local duplicates always find it
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[doc_id] = future
+    claimed = False
+    try:
+        stored = await _claim(doc_id, fingerprint)
+        if stored is not None:
+            # Another worker already answered this key
+            expires_at = stored.pop("expires_at")
+            _remember(doc_id, stored, expires_at)
+            future.set_result(stored)
+            return _replay(stored, fingerprint)
+        claimed = True
+
+        try:
+            result = await handler()
+            status_code, body = 200, jsonable_encoder(result)
+        except HTTPException as exc:
+            if exc.status_code >= 500:
+                raise
+            status_code, body, result = exc.status_code, {"detail": exc.detail}, exc
+
+        stored = {"fingerprint": fingerprint, "status_code": status_code, "body": body}
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+        await db.idempotency_keys.update_one(
+            {"_id": doc_id},
+            {"$set": {**stored, "status": "done", "expires_at": expires_at}}
+        )
+        _remember(doc_id, stored, expires_at)
+        future.set_result(stored)
+        idempotency_stats["executed"] += 1
+    except BaseException:
+        # Release the local slot before awaiting anything, so waiters retry
+        # against a fresh future instead of spinning on this cancelled one
+        if not future.done():
+            future.cancel()
+        if _in_flight.get(doc_id) is future:
+            del _in_flight[doc_id]
+        if claimed:
+            await db.idempotency_keys.delete_one({"_id": doc_id, "status": "pending"})
+        raise
+    finally:
+        if _in_flight.get(doc_id) is future:
+            del _in_flight[doc_id]
+
+    if isinstance(result, HTTPException):
+        raise result
+    return result
@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from pymongo import ReturnDocument
+from typing import List
+from database import db
+from models import MealResponse
+from fast_json import JSONSerializer, projection
+import hashlib
+import os
+import time
+
+# Configuration
+MEAL_CACHE_MAX_ENTRIES = int(os.environ.get("MEAL_CACHE_MAX_ENTRIES", "5000"))
+MEALS_VERSION_RECHECK_SECONDS = float(os.environ.get("MEALS_VERSION_RECHECK_SECONDS", "5"))
+
+# Only the fields selection/credit logic needs; a meal's price and slot never
+# change after creation so entries do not expire.
+MEAL_LOOKUP_PROJECTION = {"_id": 0, "id": 1, "date": 1, "type": 1, "price": 1, "is_active": 1}
+
+_meals = OrderedDict()  # meal id -> projected meal document
+
+
+def remember_meal(meal: dict):
+    _meals[meal["id"]] = {field: meal[field] for field in MEAL_LOOKUP_PROJECTION if field in meal}
+    _meals.move_to_end(meal["id"])
+    while len(_meals) > MEAL_CACHE_MAX_ENTRIES:
+        _meals.popitem(last=False)
+
+
+def forget_meal(meal_id: str):
+    _meals.pop(meal_id, None)
+
+
+async def get_meal(meal_id: str):
+    meal = _meals.get(meal_id)
+    if meal is not None:
+        _meals.move_to_end(meal_id)
+        return meal
+
+    meal = await db.meals.find_one({"id": meal_id}, MEAL_LOOKUP_PROJECTION)
+    if meal is not None:
+        remember_meal(meal)
+    return meal
+
+
+async def get_meals(meal_ids):
+    """Resolve several meals, fetching all cache misses with one `$in` query."""
+    found = {}
+    missing = []
+    for meal_id in meal_ids:
+        meal = _meals.get(meal_id)
+        if meal is not None:
+            found[meal_id] = meal
+        else:
+            missing.append(meal_id)
+
+    if missing:
+        async for meal in db.meals.find({"id": {"$in": missing}}, MEAL_LOOKUP_PROJECTION):
+            remember_meal(meal)
+            found[meal["id"]] = meal
+    return found
+
+
+# Active meal list: serialized once per meals version. The version lives in
+# cache_versions so a bump in one worker reaches the others within
+# MEALS_VERSION_RECHECK_SECONDS; the bumping worker sees it immediately.
+meal_list_json = JSONSerializer(List[MealResponse])
+MEAL_LIST_PROJECTION = projection(MealResponse)
+_active_meals = {"version": None, "body": None, "etag": None}
+_version = {"value": 0, "checked_at": float("-inf")}
+meal_list_stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+
+async def meals_version() -> int:
+    if time.monotonic() - _version["checked_at"] >= MEALS_VERSION_RECHECK_SECONDS:
+        doc = await db.cache_versions.find_one({"_id": "meals"})
+        _version["value"] = doc["version"] if doc else 0
+        _version["checked_at"] = time.monotonic()
+    return _version["value"]
+
+
+async def bump_meals_version():
+    """Call after any write that changes the active meal list."""
+    doc = await db.cache_versions.find_one_and_update(
+        {"_id": "meals"},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    _version["value"] = doc["version"]
+    _version["checked_at"] = time.monotonic()
+
+
+async def active_meals_body():
+    """(JSON bytes, ETag) for the active meal list, rebuilt only when the version moves."""
+    version = await meals_version()
+    if _active_meals["version"] == version and _active_meals["body"] is not None:
+        meal_list_stats["hits"] += 1
+        return _active_meals["body"], _active_meals["etag"]
+
+    meal_list_stats["misses"] += 1
+    meals = await db.meals.find({"is_active": True}, MEAL_LIST_PROJECTION).to_list(100)
+    body = meal_list_json.dump(meals)
+    etag = f'"meals-{version}-{hashlib.sha256(body).hexdigest()[:16]}"'
+    _active_meals.update(version=version, body=body, etag=etag)
+    return body, etag
@@ -0,0 +1,235 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from pymongo import monitoring
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0"))  # 0 disables the slow-request log
+# /api/metrics takes "Bearer <METRICS_TOKEN>" or an admin's token; METRICS_PUBLIC=1
+# serves it without auth, for deployments where only the scraper can reach it
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+METRICS_PUBLIC = os.environ.get("METRICS_PUBLIC", "0") == "1"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+def _label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.label_names = name, help, labels
+        self.values = {}
+
+    def inc(self, label_values=(), amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self, lines):
+        lines += [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, label_values)} {value}")
+
+
+class Histogram:
+    """Prometheus histogram; buckets are kept non-cumulative and summed on render."""
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, labels
+        self.buckets = buckets
+        self.series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, label_values, value: float):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self, lines):
+        lines += [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, label_values, le)} {cumulative}")
+            labels = _labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+
+
+http_requests = Counter("credeat_http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+http_latency = Histogram(
+    "credeat_http_request_duration_seconds", "Time to the last response byte (event streams excluded)", ("method", "route")
+)
+request_mongo_commands = Histogram(
+    "credeat_http_request_mongo_commands", "Mongo commands issued per request", ("method", "route"), COMMAND_COUNT_BUCKETS
+)
+request_mongo_seconds = Histogram(
+    "credeat_http_request_mongo_seconds", "Summed Mongo command time per request", ("method", "route")
+)
+mongo_commands = Counter("credeat_mongo_commands_total", "Mongo commands by name", ("command",))
+mongo_failures = Counter("credeat_mongo_command_failures_total", "Failed Mongo commands by name", ("command",))
+mongo_latency = Histogram("credeat_mongo_command_duration_seconds", "Mongo command round trips", ("command",))
+
+# Command events arrive on Motor's executor threads; the request-level
+# histograms are only touched from the event loop.
+_mongo_lock = threading.Lock()
+
+
+class RequestStats:
+    """Mongo commands attributed to one request, keyed by "command collection"."""
+
+    def __init__(self):
+        self.commands = 0
+        self.seconds = 0.0
+        self.breakdown = {}  # "find users" -> [count, seconds]
+        self._pending = {}  # driver request id -> "command collection"
+        self._lock = threading.Lock()
+
+    def started(self, request_id: int, label: str):
+        with self._lock:
+            self._pending[request_id] = label
+
+    def finished(self, request_id: int, command_name: str, seconds: float):
+        with self._lock:
+            label = self._pending.pop(request_id, command_name)
+            self.commands += 1
+            self.seconds += seconds
+            entry = self.breakdown.setdefault(label, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+
+_current_request: ContextVar = ContextVar("current_request_stats", default=None)
+
+
+class CommandAccounting(monitoring.CommandListener):
+    """Counts every Mongo command and charges it to the request that issued it.
+
+    Motor copies the caller's context into its executor, so the contextvar
+    set by MetricsMiddleware is visible here; commands outside a request
+    (startup, the event watcher) only reach the global counters.
+    """
+
+    def started(self, event):
+        stats = _current_request.get()
+        if stats is not None:
+            collection = event.command.get(event.command_name)
+            label = f"{event.command_name} {collection}" if isinstance(collection, str) else event.command_name
+            stats.started(event.request_id, label)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        with _mongo_lock:
+            mongo_failures.inc((event.command_name,))
+        self._finished(event)
+
+    def _finished(self, event):
+        seconds = event.duration_micros / 1_000_000
+        with _mongo_lock:
+            mongo_commands.inc((event.command_name,))
+            mongo_latency.observe((event.command_name,), seconds)
+        stats = _current_request.get()
+        if stats is not None:
+            stats.finished(event.request_id, event.command_name, seconds)
+
+
+command_listener = CommandAccounting()
+
+
+def route_label(scope) -> str:
+    # Templates, not raw paths, keep the label set bounded
+    route = scope.get("route")
+    if route is not None:
+        return route.path_format
+    if "endpoint" in scope:
+        return scope.get("root_path", "") + "/{path}"  # mounted apps, e.g. /uploads
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each request and recording its Mongo usage."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        response = {"status": 500, "streaming": False}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["streaming"] = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_request.reset(token)
+            self._record(scope, response, time.perf_counter() - started, stats)
+
+    def _record(self, scope, response, seconds: float, stats: RequestStats):
+        labels = (scope["method"], route_label(scope))
+        http_requests.inc(labels + (response["status"],))
+        if response["streaming"]:
+            return
+        http_latency.observe(labels, seconds)
+        request_mongo_commands.observe(labels, stats.commands)
+        request_mongo_seconds.observe(labels, stats.seconds)
+
+        if SLOW_REQUEST_MS and seconds * 1000 >= SLOW_REQUEST_MS:
+            breakdown = ", ".join(
+                f"{label} x{count} {command_seconds * 1000:.1f} ms"
+                for label, (count, command_seconds) in sorted(stats.breakdown.items(), key=lambda item: -item[1][1])
+            )
+            logger.warning(
+                "Slow request %s %s -> %s: %.1f ms, %d Mongo commands (%.1f ms)%s",
+                scope["method"], scope["path"], response["status"], seconds * 1000,
+                stats.commands, stats.seconds * 1000, f": {breakdown}" if breakdown else ""
+            )
+
+
+def render_metrics(gauges: dict = None) -> str:
+    """Everything above in Prometheus text format, plus `gauges` as
+    credeat_cache_stat{cache=..., stat=...} (numeric values only)."""
+    lines = []
+    for metric in (http_requests, http_latency, request_mongo_commands, request_mongo_seconds):
+        metric.render(lines)
+    with _mongo_lock:
+        for metric in (mongo_commands, mongo_failures, mongo_latency):
+            metric.render(lines)
+
+    if gauges:
+        lines += ["# HELP credeat_cache_stat In-process cache counters", "# TYPE credeat_cache_stat gauge"]
+        for cache, values in gauges.items():
+            for stat, value in values.items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"credeat_cache_stat{_labels(('cache', 'stat'), (cache, stat))} {float(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,126 @@
+"""Convert legacy ISO-string timestamps to native BSON dates, in place.
+
+Online and resumable: documents are walked in _id order in small batches, each
+update is conditional on the old string still being there (so a concurrent
+write always wins), and the last _id of every batch is checkpointed in the
+`migrations` collection. Re-running picks up where the previous run stopped.
+
+    python migrate_timestamps.py [--batch-size 1000] [--pause-ms 0] [--restart]
+
+Once every collection reports done, set LEGACY_STRING_TIMESTAMPS=0 so the
+read paths stop carrying the string branch (see pagination.py).
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from database import db
+
+MIGRATION_ID = "timestamps_to_dates"
+
+# (collection, field) pairs written with .isoformat() before the switch.
+# meals.date stays a YYYY-MM-DD string: it is a calendar day, not an instant.
+FIELDS = [
+    ("users", "created_at"),
+    ("meals", "created_at"),
+    ("meal_selections", "timestamp"),
+    ("transactions", "timestamp"),
+    ("complaints", "created_at"),
+]
+
+
+def parse_timestamp(value: str):
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+async def migrate_field(collection: str, field: str, progress: dict, batch_size: int, pause: float):
+    # Progress is saved under fields.<collection>.<field>, which $set nests
+    key = f"{collection}.{field}"
+    state = progress.get(collection, {}).get(field, {})
+    if state.get("done"):
+        print(f"  {key}: already done")
+        return 0
+
+    last_id = state.get("last_id")
+    converted = state.get("converted", 0)
+    unparseable = state.get("unparseable", 0)
+    started = time.perf_counter()
+    migrated_now = 0
+
+    while True:
+        query = {field: {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db[collection].find(query, {field: 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+
+        operations = []
+        for doc in batch:
+            parsed = parse_timestamp(doc[field])
+            if parsed is None:
+                unparseable += 1
+                continue
+            operations.append(UpdateOne({"_id": doc["_id"], field: doc[field]}, {"$set": {field: parsed}}))
+
+        if operations:
+            result = await db[collection].bulk_write(operations, ordered=False)
+            converted += result.modified_count
+            migrated_now += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        await db.migrations.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {f"fields.{key}": {"last_id": last_id, "converted": converted, "unparseable": unparseable}}},
+            upsert=True
+        )
+
+        elapsed = time.perf_counter() - started
+        print(f"  {key}: {converted} converted, {migrated_now / elapsed:.0f} docs/s", end="\r")
+        if pause:
+            await asyncio.sleep(pause)
+
+    await db.migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {f"fields.{key}.done": True, f"fields.{key}.finished_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    elapsed = time.perf_counter() - started
+    rate = migrated_now / elapsed if elapsed else 0
+    print(f"  {key}: {converted} converted, {unparseable} unparseable, {migrated_now} this run "
+          f"in {elapsed:.1f}s ({rate:.0f} docs/s)")
+    return migrated_now
+
+
+async def migrate_timestamps(batch_size: int = 1000, pause_ms: int = 0, restart: bool = False):
+    print("Migrating timestamps to native dates...")
+
+    if restart:
+        await db.migrations.delete_one({"_id": MIGRATION_ID})
+    doc = await db.migrations.find_one({"_id": MIGRATION_ID}) or {}
+    progress = doc.get("fields", {})
+
+    started = time.perf_counter()
+    total = 0
+    for collection, field in FIELDS:
+        total += await migrate_field(collection, field, progress, batch_size, pause_ms / 1000)
+
+    elapsed = time.perf_counter() - started
+    rate = total / elapsed if elapsed else 0
+    print(f"Timestamp migration complete: {total} documents in {elapsed:.1f}s ({rate:.0f} docs/s).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert ISO-string timestamps to BSON dates")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause-ms", type=int, default=0, help="sleep between batches to limit load")
+    parser.add_argument("--restart", action="store_true", help="discard saved progress and rescan")
+    args = parser.parse_args()
+    asyncio.run(migrate_timestamps(args.batch_size, args.pause_ms, args.restart))
@@ -3,6 +3,11 @@ from typing import List, Optional, Literal
 from datetime import datetime, timezone
 import uuid
 
+def utc_now() -> datetime:
+    # BSON dates hold milliseconds; truncate so the value we keep equals the one stored
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
 class UserBase(BaseModel):
     email: EmailStr
     full_name: str
@@ -15,7 +20,9 @@ class UserInDB(UserBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     hashed_password: str
     wallet_balance: float = 0.0
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utc_now)
+    # Bumped on logout / role change; tokens carrying an older value are rejected
+    token_version: int = 0
     
     model_config = ConfigDict(populate_by_name=True)
 
@@ -30,6 +37,10 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    # Absent from tokens issued before they carried the user id
+    user_id: Optional[str] = None
+    role: Optional[str] = None
+    version: int = 0
 
 # Meal Models
 class MealBase(BaseModel):
@@ -44,7 +55,17 @@ class MealCreate(MealBase):
 
 class MealResponse(MealBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utc_now)
+
+class MealWithSelection(MealResponse):
+    selection_status: Optional[Literal["attending", "skipped"]] = None
+
+class MealHeadcount(BaseModel):
+    id: str
+    date: str
+    type: Literal["breakfast", "lunch", "dinner"]
+    attending_count: int = 0
+    skipped_count: int = 0
 
 # Meal Selection
 class MealSelection(BaseModel):
@@ -52,7 +73,7 @@ class MealSelection(BaseModel):
     user_id: str
     meal_id: str
     status: Literal["attending", "skipped"]
-    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    timestamp: datetime = Field(default_factory=utc_now)
 
 # Transaction
 class Transaction(BaseModel):
@@ -62,7 +83,12 @@ class Transaction(BaseModel):
     amount: float
     type: Literal["skip_credit", "vendor_payment", "admin_adjustment", "withdrawal"] # Added withdrawal
     description: str
-    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    timestamp: datetime = Field(default_factory=utc_now)
+
+class WalletResponse(BaseModel):
+    balance: float
+    transactions: List[Transaction]
+    next_cursor: Optional[str] = None
 
 # Complaint
 class ComplaintBase(BaseModel):
@@ -77,4 +103,4 @@ class ComplaintResponse(ComplaintBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
     status: Literal["pending", "resolved"] = "pending"
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utc_now)
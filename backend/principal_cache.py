@@ -0,0 +1,99 @@
+from collections import OrderedDict
+import os
+import time
+
+# Configuration
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.environ.get("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+
+class PrincipalCache:
+    """Bounded TTL + LRU cache of authenticated users, keyed by token subject
+    (the user id; the email for tokens issued before they carried one).
+
+    Each entry remembers the user's token_version, and only tokens with that
+    version hit. Entries are process-local, so every write that changes a
+    user must call `invalidate` / `invalidate_user_id`; the TTL bounds
+    staleness across workers, including for revoked tokens.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # subject -> (expires_at, token_version, user)
+        self._subjects_by_id = {}  # user id -> subjects (id, and email for older tokens)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, subject: str, token_version: int = 0):
+        entry = self._entries.get(subject)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, cached_version, user = entry
+        if cached_version != token_version:
+            # Revoked token, or one issued after this entry; the caller checks the database
+            self.misses += 1
+            return None
+        if expires_at <= time.monotonic():
+            self._drop(subject)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(subject)
+        self.hits += 1
+        return user
+
+    def set(self, subject: str, user, token_version: int = 0):
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+
+        if subject in self._entries:
+            self._drop(subject)
+        self._entries[subject] = (time.monotonic() + self.ttl_seconds, token_version, user)
+        self._subjects_by_id.setdefault(user.id, set()).add(subject)
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def invalidate(self, subject: str):
+        if subject in self._entries:
+            self._drop(subject)
+            self.invalidations += 1
+
+    def invalidate_user_id(self, user_id: str):
+        for subject in list(self._subjects_by_id.get(user_id, ())):
+            self.invalidate(subject)
+
+    def clear(self):
+        self._entries.clear()
+        self._subjects_by_id.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _drop(self, subject: str):
+        _, _, user = self._entries.pop(subject)
+        subjects = self._subjects_by_id.get(user.id)
+        if subjects is not None:
+            subjects.discard(subject)
+            if not subjects:
+                del self._subjects_by_id[user.id]
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_MAX_ENTRIES)
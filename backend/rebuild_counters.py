@@ -0,0 +1,14 @@
+import asyncio
+from counters import rebuild_wastage_counters, rebuild_headcounts
+
+async def rebuild_counters():
+    print("Rebuilding wastage counters...")
+    result = await rebuild_wastage_counters()
+    print(f"Wastage counters rebuilt: {result}")
+
+    print("Rebuilding meal headcounts...")
+    result = await rebuild_headcounts()
+    print(f"Meal headcounts rebuilt: {result}")
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_counters())
@@ -0,0 +1,23 @@
+import argparse
+import asyncio
+from reconciliation import reconcile
+
+async def reconcile_balances(full: bool):
+    print("Reconciling wallet balances against the ledger...")
+    result = await reconcile(full=full)
+    print(f"Processed {result['transactions_processed']} transactions up to {result['watermark']} "
+          f"in {result['seconds']}s; checked {result['accounts_checked']} accounts.")
+    if result["accounts_drifted"]:
+        print(f"{result['accounts_drifted']} accounts disagree with the ledger:")
+        for row in result["drifted"]:
+            print(f"  {row['account']}: wallet {row['wallet_balance']} ledger {row['ledger_balance']} drift {row['drift']}")
+    else:
+        print("No drift.")
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally reconcile wallet balances with transactions")
+    parser.add_argument("--full", action="store_true", help="drop checkpoints and replay the whole ledger")
+    args = parser.parse_args()
+    result = asyncio.run(reconcile_balances(args.full))
+    raise SystemExit(1 if result["accounts_drifted"] else 0)
@@ -0,0 +1,199 @@
+from pymongo import UpdateOne
+from database import db
+from transfers import SYSTEM_ACCOUNT
+from datetime import datetime, timedelta, timezone
+import os
+import time
+
+# Ledger-derived balances. balance_checkpoints holds one document per account
+# with the balance implied by every transaction up to that account's
+# (last_timestamp, last_id), plus a POSITION_ID document with how far the
+# engine has read. Each run continues from the position, streaming the
+# ledger in (timestamp, id) order and flushing deltas every batch.
+POSITION_ID = "_position"
+RECONCILE_LAG_SECONDS = float(os.environ.get("RECONCILE_LAG_SECONDS", "60"))
+RECONCILE_BATCH_SIZE = int(os.environ.get("RECONCILE_BATCH_SIZE", "5000"))
+DRIFT_TOLERANCE = 0.005
+DRIFT_REPORT_LIMIT = 100
+
+LEDGER_PROJECTION = {"_id": 0, "id": 1, "sender_id": 1, "receiver_id": 1, "amount": 1, "type": 1, "description": 1, "timestamp": 1}
+LEDGER_SORT = [("timestamp", 1), ("id", 1)]
+
+
+def ledger_effects(tx: dict):
+    """(account id, signed amount) pairs a transaction applies to wallets.
+
+    Money moves sender -> receiver; SYSTEM is outside the system and has no
+    wallet. Re-join debits used to be written SYSTEM -> user with a "Spent"
+    description even though they debited the user; those are read as debits.
+    """
+    amount = tx["amount"]
+    sender, receiver = tx["sender_id"], tx.get("receiver_id")
+    if tx["type"] == "admin_adjustment" and sender == SYSTEM_ACCOUNT and tx["description"].startswith("Spent"):
+        return [(receiver, -amount)]
+
+    effects = []
+    if sender != SYSTEM_ACCOUNT:
+        effects.append((sender, -amount))
+    if receiver and receiver != SYSTEM_ACCOUNT:
+        effects.append((receiver, amount))
+    return effects
+
+
+def ledger_query(position: dict = None, watermark: datetime = None) -> dict:
+    """Transactions after `position` in ascending (timestamp, id), optionally up to the watermark."""
+    query = {"timestamp": {"$lte": watermark}} if watermark else {"timestamp": {"$type": "date"}}
+    if position and position.get("last_id"):
+        # One range on timestamp; ties on the position's timestamp resolved by id
+        query["timestamp"]["$gte"] = position["last_timestamp"]
+        query["$nor"] = [{"timestamp": position["last_timestamp"], "id": {"$lte": position["last_id"]}}]
+    return query
+
+
+async def _flush(batch):
+    """Fold a batch of transactions into the checkpoints of the accounts it touches.
+
+    Each account only takes transactions past its own (last_timestamp,
+    last_id), so re-applying a batch after a crash between writes is a no-op.
+    """
+    accounts = {account for tx in batch for account, _ in ledger_effects(tx)}
+    checkpoints = {
+        doc["_id"]: doc async for doc in db.balance_checkpoints.find({"_id": {"$in": list(accounts)}})
+    }
+
+    updates = {}
+    for tx in batch:
+        position = (tx["timestamp"], tx["id"])
+        for account, delta in ledger_effects(tx):
+            # A checkpoint may only carry drift flags if no transaction reached it yet
+            checkpoint = checkpoints.get(account) or {}
+            if "last_id" in checkpoint and position <= (checkpoint["last_timestamp"], checkpoint["last_id"]):
+                continue
+            update = updates.setdefault(account, {
+                "balance": checkpoint.get("balance", 0.0),
+                "transactions": checkpoint.get("transactions", 0),
+            })
+            update["balance"] += delta
+            update["transactions"] += 1
+            update["last_timestamp"], update["last_id"] = position
+
+    operations = [
+        UpdateOne({"_id": account}, {"$set": {**update, "balance": round(update["balance"], 2)}}, upsert=True)
+        for account, update in updates.items()
+    ]
+    last = batch[-1]
+    operations.append(UpdateOne(
+        {"_id": POSITION_ID},
+        {"$set": {"last_timestamp": last["timestamp"], "last_id": last["id"]}, "$inc": {"processed": len(batch)}},
+        upsert=True
+    ))
+    await db.balance_checkpoints.bulk_write(operations, ordered=True)
+
+
+async def advance_checkpoints(watermark: datetime, batch_size: int = RECONCILE_BATCH_SIZE):
+    """Stream transactions from the saved position up to `watermark` into the checkpoints."""
+    position = await db.balance_checkpoints.find_one({"_id": POSITION_ID})
+    query = ledger_query(position, watermark)
+
+    processed = 0
+    batch = []
+    cursor = db.transactions.find(query, LEDGER_PROJECTION).sort(LEDGER_SORT).batch_size(min(batch_size, 10000))
+    async for tx in cursor:
+        batch.append(tx)
+        if len(batch) >= batch_size:
+            await _flush(batch)
+            processed += len(batch)
+            batch = []
+    if batch:
+        await _flush(batch)
+        processed += len(batch)
+
+    await db.balance_checkpoints.update_one({"_id": POSITION_ID}, {"$set": {"watermark": watermark}}, upsert=True)
+    return processed
+
+
+async def _tail_deltas():
+    # Transactions past the position are not checkpointed yet but are already
+    # in wallet_balance. The lag window keeps this small.
+    position = await db.balance_checkpoints.find_one({"_id": POSITION_ID})
+    deltas = {}
+    async for tx in db.transactions.find(ledger_query(position), LEDGER_PROJECTION):
+        for account, delta in ledger_effects(tx):
+            deltas[account] = deltas.get(account, 0.0) + delta
+    return deltas
+
+
+async def check_drift(batch_size: int = RECONCILE_BATCH_SIZE):
+    """Compare every wallet with checkpoint + tail, recording drift on the checkpoint.
+
+    Users and checkpoints are merge-joined in id order so memory stays
+    bounded. A write that has moved the balance but not yet inserted its
+    ledger row shows up as drift for one run, so drift is only `confirmed`
+    when the same account drifts on two consecutive runs.
+    """
+    tail = await _tail_deltas()
+    checkpoints = db.balance_checkpoints.find(
+        {"_id": {"$ne": POSITION_ID}}, {"balance": 1, "drift": 1}
+    ).sort("_id", 1)
+    checkpoint = await anext(checkpoints, None)
+
+    checked = 0
+    confirmed_count = 0
+    drifted = []
+    operations = []
+    now = datetime.now(timezone.utc)
+    async for user in db.users.find({}, {"_id": 0, "id": 1, "wallet_balance": 1}).sort("id", 1):
+        while checkpoint is not None and checkpoint["_id"] < user["id"]:
+            checkpoint = await anext(checkpoints, None)
+        matched = checkpoint if checkpoint is not None and checkpoint["_id"] == user["id"] else None
+
+        expected = (matched.get("balance", 0.0) if matched else 0.0) + tail.get(user["id"], 0.0)
+        drift = round(user.get("wallet_balance", 0.0) - expected, 2)
+        previous = matched.get("drift") if matched else None
+        checked += 1
+
+        if abs(drift) > DRIFT_TOLERANCE:
+            confirmed = previous is not None
+            operations.append(UpdateOne(
+                {"_id": user["id"]},
+                {"$set": {"drift": drift, "drift_confirmed": confirmed, "drift_checked_at": now}},
+                upsert=True
+            ))
+            confirmed_count += confirmed
+            if confirmed and len(drifted) < DRIFT_REPORT_LIMIT:
+                drifted.append({"account": user["id"], "wallet_balance": user.get("wallet_balance", 0.0),
+                                "ledger_balance": round(expected, 2), "drift": drift})
+        elif previous is not None:
+            operations.append(UpdateOne(
+                {"_id": user["id"]}, {"$unset": {"drift": "", "drift_confirmed": "", "drift_checked_at": ""}}
+            ))
+
+        if len(operations) >= batch_size:
+            await db.balance_checkpoints.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        await db.balance_checkpoints.bulk_write(operations, ordered=False)
+
+    return {"accounts_checked": checked, "accounts_drifted": confirmed_count, "drifted": drifted}
+
+
+async def reconcile(full: bool = False, lag_seconds: float = RECONCILE_LAG_SECONDS, batch_size: int = RECONCILE_BATCH_SIZE):
+    """Advance checkpoints to now - lag, then flag wallets that disagree with the ledger.
+
+    `full` drops every checkpoint and replays the whole ledger.
+    """
+    if await db.transactions.find_one({"timestamp": {"$type": "string"}}, {"_id": 1}):
+        raise RuntimeError("Ledger still has string timestamps; run migrate_timestamps.py first")
+    if full:
+        await db.balance_checkpoints.delete_many({})
+
+    started = time.perf_counter()
+    watermark = datetime.now(timezone.utc) - timedelta(seconds=lag_seconds)
+    processed = await advance_checkpoints(watermark, batch_size)
+    drift = await check_drift(batch_size)
+    return {
+        "watermark": watermark.isoformat(),
+        "transactions_processed": processed,
+        "seconds": round(time.perf_counter() - started, 2),
+        **drift
+    }
@@ -0,0 +1,138 @@
+from pymongo import UpdateOne
+from database import db
+from datetime import datetime, timezone
+
+# monthly_rollups holds one document per (month, metric):
+#   {"month": "2026-10", "metric": "complaints", "value": 12}
+METRICS = (
+    "complaints",
+    "hygiene_complaints",
+    "skips",
+    "transactions",
+    "transaction_volume",
+)
+
+
+def month_of(value) -> str:
+    """Return the YYYY-MM month of an ISO date/datetime string or a datetime."""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m")
+    return value[:7]
+
+
+async def bump(deltas: dict):
+    """Apply {(month, metric): delta} with one bulk_write."""
+    operations = [
+        UpdateOne({"month": month, "metric": metric}, {"$inc": {"value": delta}}, upsert=True)
+        for (month, metric), delta in deltas.items() if delta
+    ]
+    if operations:
+        await db.monthly_rollups.bulk_write(operations, ordered=False)
+
+
+def _add(deltas, month, metric, value):
+    deltas[(month, metric)] = deltas.get((month, metric), 0) + value
+
+
+def _transaction_deltas(deltas, transactions):
+    for tx in transactions:
+        month = month_of(tx["timestamp"])
+        _add(deltas, month, "transactions", 1)
+        _add(deltas, month, "transaction_volume", tx["amount"])
+
+
+async def record_selection_transitions(transitions, transactions=()):
+    """Skips, plus the ledger rows the same toggle wrote, in a single bulk_write."""
+    # Skips are attributed to the month the meal is served in
+    deltas = {}
+    for meal, previous_status, new_status in transitions:
+        if new_status == "skipped" and previous_status != "skipped":
+            _add(deltas, month_of(meal["date"]), "skips", 1)
+        elif previous_status == "skipped" and new_status != "skipped":
+            _add(deltas, month_of(meal["date"]), "skips", -1)
+    _transaction_deltas(deltas, transactions)
+    await bump(deltas)
+
+
+async def record_complaint(complaint: dict):
+    deltas = {}
+    month = month_of(complaint["created_at"])
+    _add(deltas, month, "complaints", 1)
+    if complaint.get("category") == "hygiene":
+        _add(deltas, month, "hygiene_complaints", 1)
+    await bump(deltas)
+
+
+async def record_transactions(transactions):
+    deltas = {}
+    _transaction_deltas(deltas, transactions)
+    await bump(deltas)
+
+
+async def read_months(months: list) -> dict:
+    """{month: {metric: value}} for the requested months, zero-filled."""
+    values = {month: {metric: 0 for metric in METRICS} for month in months}
+    async for row in db.monthly_rollups.find({"month": {"$in": months}}, {"_id": 0}):
+        if row["metric"] in values[row["month"]]:
+            values[row["month"]][row["metric"]] = row["value"]
+    return values
+
+
+def _month_expr(field: str):
+    # Native dates and legacy ISO strings (and YYYY-MM-DD meal dates) side by side
+    return {"$cond": [
+        {"$eq": [{"$type": field}, "date"]},
+        {"$dateToString": {"format": "%Y-%m", "date": field}},
+        {"$substrBytes": [field, 0, 7]}
+    ]}
+
+
+async def backfill_rollups():
+    """Rebuild monthly_rollups from history with one $group pipeline per source."""
+    totals = {}
+
+    complaints = db.complaints.aggregate([
+        {"$group": {
+            "_id": _month_expr("$created_at"),
+            "complaints": {"$sum": 1},
+            "hygiene_complaints": {"$sum": {"$cond": [{"$eq": ["$category", "hygiene"]}, 1, 0]}}
+        }}
+    ])
+    async for row in complaints:
+        totals[(row["_id"], "complaints")] = row["complaints"]
+        totals[(row["_id"], "hygiene_complaints")] = row["hygiene_complaints"]
+
+    skips = db.meal_selections.aggregate([
+        {"$match": {"status": "skipped"}},
+        {"$lookup": {"from": "meals", "localField": "meal_id", "foreignField": "id", "as": "meal"}},
+        {"$unwind": "$meal"},
+        {"$group": {"_id": _month_expr("$meal.date"), "skips": {"$sum": 1}}}
+    ])
+    async for row in skips:
+        totals[(row["_id"], "skips")] = row["skips"]
+
+    transactions = db.transactions.aggregate([
+        {"$group": {
+            "_id": _month_expr("$timestamp"),
+            "transactions": {"$sum": 1},
+            "transaction_volume": {"$sum": "$amount"}
+        }}
+    ])
+    async for row in transactions:
+        totals[(row["_id"], "transactions")] = row["transactions"]
+        totals[(row["_id"], "transaction_volume")] = row["transaction_volume"]
+
+    rebuilt_at = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne(
+            {"month": month, "metric": metric},
+            {"$set": {"value": value, "rebuilt_at": rebuilt_at}},
+            upsert=True
+        )
+        for (month, metric), value in totals.items()
+    ]
+    if operations:
+        await db.monthly_rollups.bulk_write(operations, ordered=False)
+    # Anything not seen in history goes back to zero
+    await db.monthly_rollups.update_many({"rebuilt_at": {"$ne": rebuilt_at}}, {"$set": {"value": 0}})
+    return {"rows": len(operations), "months": len({month for month, _ in totals})}
@@ -1,19 +1,38 @@
-from fastapi import APIRouter, Depends
-from database import db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
 from dependencies import get_admin_user, UserResponse
-from datetime import datetime, timedelta
+from principal_cache import principal_cache
+from auth_utils import password_hasher_stats
+from counters import read_wastage_counters, compute_wastage, WASTAGE_KG_PER_MEAL
+from rollups import read_months
+from uploads import upload_serving_stats
+from meal_cache import meal_list_stats
+from idempotency import idempotency_cache_stats
+from events import event_hub
+from datetime import date, datetime, timezone
+import calendar
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 @router.get("/wastage")
-async def get_wastage_stats(admin: UserResponse = Depends(get_admin_user)):
-    # Simple aggregation: Count skipped meals vs total meals
-    total_meals = await db.meals.count_documents({})
-    total_selections = await db.meal_selections.count_documents({})
-    skipped_count = await db.meal_selections.count_documents({"status": "skipped"})
+async def get_wastage_stats(
+    from_date: Optional[date] = Query(None, alias="from", description="YYYY-MM-DD, inclusive"),
+    to_date: Optional[date] = Query(None, alias="to", description="YYYY-MM-DD, inclusive"),
+    admin: UserResponse = Depends(get_admin_user)
+):
+    if from_date and to_date and to_date < from_date:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    # Counters and meals key days as YYYY-MM-DD strings
+    from_day = from_date.isoformat() if from_date else None
+    to_day = to_date.isoformat() if to_date else None
+
+    # Maintained counters first; one $facet aggregation until they are built
+    stats = await read_wastage_counters(from_day, to_day)
+    if stats is None:
+        stats = await compute_wastage(from_day, to_day)
     
     # Mock data for the graph if empty
-    if total_selections == 0:
+    if stats["total_meals_served"] == 0 and from_date is None and to_date is None:
         return {
             "total_meals_served": 1200,
             "meals_skipped": 150,
@@ -21,28 +40,48 @@ async def get_wastage_stats(admin: UserResponse = Depends(get_admin_user)):
             "participation_rate": 88
         }
         
-    return {
-        "total_meals_served": total_selections,
-        "meals_skipped": skipped_count,
-        "wastage_saved_kg": skipped_count * 0.3, # Assuming 0.3kg per meal
-        "participation_rate": ((total_selections - skipped_count) / total_selections) * 100 if total_selections > 0 else 0
-    }
+    return stats
 
 @router.get("/monthly")
-async def get_monthly_stats(admin: UserResponse = Depends(get_admin_user)):
-    # In a real app, we would aggregate by month using MongoDB aggregation pipeline
-    # For MVP/Hackathon, we'll return mock data structure that Recharts can consume
-    
-    # Mock Data Structure
-    data = [
-        {"name": "Jan", "complaints": 4, "food_saved_kg": 20, "hygiene_rating": 4.2},
-        {"name": "Feb", "complaints": 3, "food_saved_kg": 25, "hygiene_rating": 4.5},
-        {"name": "Mar", "complaints": 6, "food_saved_kg": 30, "hygiene_rating": 3.8},
-        {"name": "Apr", "complaints": 2, "food_saved_kg": 28, "hygiene_rating": 4.7},
-        {"name": "May", "complaints": 5, "food_saved_kg": 35, "hygiene_rating": 4.0},
-        {"name": "Jun", "complaints": 1, "food_saved_kg": 40, "hygiene_rating": 4.9},
+async def get_monthly_stats(
+    months: int = Query(6, ge=1, le=36),
+    admin: UserResponse = Depends(get_admin_user)
+):
+    # Reads only the incrementally maintained monthly_rollups documents
+    today = datetime.now(timezone.utc)
+    window = []
+    year, month = today.year, today.month
+    for _ in range(months):
+        window.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    window.reverse()
+
+    values = await read_months(window)
+    return [
+        {
+            "name": calendar.month_abbr[int(key[5:7])],
+            "month": key,
+            "complaints": values[key]["complaints"],
+            "hygiene_complaints": values[key]["hygiene_complaints"],
+            "skips": values[key]["skips"],
+            "food_saved_kg": values[key]["skips"] * WASTAGE_KG_PER_MEAL,
+            "transactions": values[key]["transactions"],
+            "transaction_volume": values[key]["transaction_volume"],
+        }
+        for key in window
     ]
-    
-    # Try to get some real data if available to mix in?
-    # For now, static mock is safer for the graph demo
-    return data
+
+def cache_stats() -> dict:
+    # Hit/miss counters for the in-process caches in front of Mongo
+    return {
+        "principal_cache": principal_cache.stats(),
+        "password_hasher": password_hasher_stats(),
+        "uploads": upload_serving_stats,
+        "meal_list": meal_list_stats,
+        "idempotency": idempotency_cache_stats(),
+        "events": event_hub.stats()
+    }
+
+@router.get("/cache")
+async def get_cache_stats(admin: UserResponse = Depends(get_admin_user)):
+    return cache_stats()
@@ -3,26 +3,35 @@ from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 from database import db
 from models import UserCreate, UserResponse, UserInDB, Token
-from auth_utils import get_password_hash, verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
-from dependencies import get_current_user
+from auth_utils import get_password_hash_async, verify_password_async, create_user_token, ACCESS_TOKEN_EXPIRE_MINUTES, PasswordHasherBusy
+from dependencies import get_current_user, revoke_tokens
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+def _hasher_busy_exception():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication service is busy, please retry",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/register", response_model=UserResponse)
 async def register(user: UserCreate):
     existing_user = await db.users.find_one({"email": user.email})
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = await get_password_hash_async(user.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy_exception()
+
     user_in_db = UserInDB(
         **user.model_dump(),
         hashed_password=hashed_password
     )
     
     user_dict = user_in_db.model_dump()
-    # Store datetime as ISO format
-    user_dict['created_at'] = user_dict['created_at'].isoformat()
     
     result = await db.users.insert_one(user_dict)
     
@@ -39,7 +48,12 @@ async def register(user: UserCreate):
 @router.post("/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     user = await db.users.find_one({"email": form_data.username})
-    if not user or not verify_password(form_data.password, user['hashed_password']):
+    try:
+        password_ok = user is not None and await verify_password_async(form_data.password, user['hashed_password'])
+    except PasswordHasherBusy:
+        raise _hasher_busy_exception()
+
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -47,12 +61,15 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         )
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user['email'], "role": user['role']},
-        expires_delta=access_token_expires
-    )
+    access_token = create_user_token(user, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer"}
 
+@router.post("/logout")
+async def logout(current_user: UserResponse = Depends(get_current_user)):
+    # Revokes every token of this user, on all devices
+    await revoke_tokens(current_user.id)
+    return {"status": "logged out"}
+
 @router.get("/me", response_model=UserResponse)
 async def read_users_me(current_user: UserResponse = Depends(get_current_user)):
     return current_user
@@ -1,17 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Query, Response
+from typing import List, Literal, Optional
 from database import db
 from models import ComplaintCreate, ComplaintResponse, UserResponse
 from dependencies import get_current_user
-from datetime import datetime, timezone
-import shutil
-import os
-import uuid
+from rollups import record_complaint
+from uploads import store_image
+from pagination import keyset_filter, keyset_sort, next_cursor
+from fast_json import FAST_JSON_RESPONSES, JSONSerializer, projection
+from events import event_hub
+from datetime import date, datetime, time, timedelta, timezone
+import asyncio
 
 router = APIRouter(prefix="/complaints", tags=["complaints"])
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+COMPLAINT_PROJECTION = projection(ComplaintResponse)
+complaint_list_json = JSONSerializer(List[ComplaintResponse])
 
 @router.post("/", response_model=ComplaintResponse)
 async def create_complaint(
@@ -21,14 +24,8 @@ async def create_complaint(
     current_user: UserResponse = Depends(get_current_user)
 ):
     image_url = None
-    if file:
-        file_ext = file.filename.split(".")[-1]
-        filename = f"{uuid.uuid4()}.{file_ext}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
+    if file and file.filename:
+        filename = await store_image(file)
         image_url = f"/uploads/{filename}"
         
     complaint = ComplaintResponse(
@@ -39,17 +36,68 @@ async def create_complaint(
     )
     
     comp_dict = complaint.model_dump()
-    comp_dict['created_at'] = comp_dict['created_at'].isoformat()
     
     await db.complaints.insert_one(comp_dict)
+    await asyncio.gather(
+        record_complaint(comp_dict),
+        event_hub.publish(
+            "complaint",
+            {field: comp_dict[field] for field in ("id", "user_id", "category", "description", "image_url", "created_at")},
+            roles=("admin",)
+        )
+    )
     return complaint
 
+def complaints_query(
+    user_id: Optional[str] = None,
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    q: Optional[str] = None,
+    cursor: Optional[str] = None,
+):
+    # Equality filters first, then created_at range + keyset: every combination
+    # matches one of the compound indexes declared in create_indexes.py
+    query = {}
+    if user_id:
+        query["user_id"] = user_id
+    if status:
+        query["status"] = status
+    if category:
+        query["category"] = category
+    if q:
+        query["$text"] = {"$search": q}
+
+    since = datetime.combine(from_date, time.min, timezone.utc) if from_date else None
+    before = datetime.combine(to_date + timedelta(days=1), time.min, timezone.utc) if to_date else None
+    query.update(keyset_filter("created_at", cursor, since=since, before=before))
+    return query
+
 @router.get("/", response_model=List[ComplaintResponse])
-async def get_complaints(current_user: UserResponse = Depends(get_current_user)):
+async def get_complaints(
+    response: Response,
+    status: Optional[Literal["pending", "resolved"]] = None,
+    category: Optional[Literal["hygiene", "quality", "other"]] = None,
+    from_date: Optional[date] = Query(None, alias="from", description="YYYY-MM-DD, inclusive"),
+    to_date: Optional[date] = Query(None, alias="to", description="YYYY-MM-DD, inclusive"),
+    q: Optional[str] = Query(None, min_length=2, max_length=100, description="Full-text search over description"),
+    limit: int = Query(100, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_user)
+):
     # Admin sees all, Student sees own
-    filter_query = {}
-    if current_user.role == "student":
-        filter_query["user_id"] = current_user.id
+    user_id = current_user.id if current_user.role == "student" else None
+    filter_query = complaints_query(user_id, status, category, from_date, to_date, q, cursor)
         
-    complaints = await db.complaints.find(filter_query, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return complaints
+    complaints = await db.complaints.find(filter_query, COMPLAINT_PROJECTION).sort(
+        keyset_sort("created_at")
+    ).limit(limit + 1).to_list(limit + 1)
+
+    # The body stays a plain list; the next page is announced in a header
+    cursor = next_cursor(complaints, "created_at", limit)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    if FAST_JSON_RESPONSES:
+        return complaint_list_json.response(complaints[:limit], headers=dict(response.headers))
+    return complaints[:limit]
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from models import UserResponse
+from dependencies import get_stream_user
+from events import event_hub
+import json
+import os
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+EVENT_HEARTBEAT_SECONDS = float(os.environ.get("EVENT_HEARTBEAT_SECONDS", "15"))
+
+
+def _sse(event: dict) -> str:
+    data = json.dumps({"type": event["type"], **event["data"]}, separators=(",", ":"))
+    return f"id: {event['_id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+@router.get("/stream")
+async def stream_events(request: Request, current_user: UserResponse = Depends(get_stream_user)):
+    """Server-sent events for dashboards: vendors get their payments, admins
+    and vendors get selection changes, admins get new complaints."""
+    subscription = event_hub.subscribe(current_user.id, current_user.role)
+
+    async def body():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                event = await subscription.next(EVENT_HEARTBEAT_SECONDS)
+                if event is None:
+                    # Keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                if subscription.dropped:
+                    yield f"event: dropped\ndata: {json.dumps({'dropped': subscription.dropped})}\n\n"
+                    subscription.dropped = 0
+                yield _sse(event)
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,114 +1,437 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response
+from typing import List, Literal, Optional
 from database import db
-from models import MealCreate, MealResponse, MealSelection, Transaction, UserResponse
-from dependencies import get_current_user, get_admin_user
-from datetime import datetime, timezone
+from models import MealCreate, MealHeadcount, MealResponse, MealSelection, MealWithSelection, Transaction, UserResponse, utc_now
+from dependencies import get_current_user, get_admin_user, get_kitchen_user
+from principal_cache import principal_cache
+from meal_cache import get_meal, get_meals as lookup_meals, remember_meal, active_meals_body, bump_meals_version, meal_list_stats
+from counters import record_meal_created, record_selection_transitions, headcount_deltas
+from fast_json import FAST_JSON_RESPONSES, JSONSerializer, projection
+from idempotency import idempotent
+from events import event_hub
+import rollups
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pydantic import BaseModel
+import asyncio
+from datetime import date, datetime, timedelta, timezone
 import uuid
 
 router = APIRouter(prefix="/meals", tags=["meals"])
 
+SELECTION_PROJECTION = projection(MealSelection)
+selection_list_json = JSONSerializer(List[MealSelection])
+
 @router.get("/", response_model=List[MealResponse])
-async def get_meals():
-    meals = await db.meals.find({"is_active": True}, {"_id": 0}).to_list(100)
-    return meals
+async def get_meals(request: Request):
+    # Pre-serialized per meals version; steady state is a dict lookup
+    body, etag = await active_meals_body()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        meal_list_stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+MAX_UPCOMING_DAYS = 31
+
+def upcoming_meals_pipeline(user_id: str, from_date: str, to_date: str):
+    return [
+        {"$match": {"date": {"$gte": from_date, "$lte": to_date}, "is_active": True}},
+        {"$sort": {"date": 1}},
+        {"$limit": MAX_UPCOMING_DAYS * 3},
+        {"$lookup": {
+            "from": "meal_selections",
+            "let": {"meal_id": "$id"},
+            "pipeline": [
+                {"$match": {"user_id": user_id, "$expr": {"$eq": ["$meal_id", "$$meal_id"]}}},
+                {"$project": {"_id": 0, "status": 1}}
+            ],
+            "as": "selection"
+        }},
+        {"$addFields": {"selection_status": {"$arrayElemAt": ["$selection.status", 0]}}},
+        {"$project": {"_id": 0, "selection": 0}}
+    ]
+
+@router.get("/upcoming", response_model=List[MealWithSelection])
+async def get_upcoming_meals(
+    from_date: Optional[date] = Query(None, alias="from", description="YYYY-MM-DD, defaults to today"),
+    to_date: Optional[date] = Query(None, alias="to", description="YYYY-MM-DD, defaults to a week from 'from'"),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    # Meals in the window joined with the caller's selection, in one round trip
+    from_date = from_date or datetime.now(timezone.utc).date()
+    to_date = to_date or from_date + timedelta(days=6)
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (to_date - from_date).days >= MAX_UPCOMING_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date window is limited to {MAX_UPCOMING_DAYS} days")
+
+    pipeline = upcoming_meals_pipeline(current_user.id, from_date.isoformat(), to_date.isoformat())
+    return await db.meals.aggregate(pipeline).to_list(None)
+
+# Headcounts are kept on the meal documents by counters.record_selection_transitions;
+# both reads are covered by the headcount indexes in create_indexes.py
+HEADCOUNT_PROJECTION = {"_id": 0, "id": 1, "date": 1, "type": 1, "attending_count": 1, "skipped_count": 1}
+MEAL_SLOTS = {"breakfast": 0, "lunch": 1, "dinner": 2}
+
+def _headcount(meal):
+    # Meals never counted (before rebuild_counters.py) read back without the fields
+    return {**meal, "attending_count": meal.get("attending_count") or 0, "skipped_count": meal.get("skipped_count") or 0}
+
+@router.get("/headcount", response_model=List[MealHeadcount])
+async def get_headcounts(
+    from_date: Optional[date] = Query(None, alias="from", description="YYYY-MM-DD, defaults to today"),
+    to_date: Optional[date] = Query(None, alias="to", description="YYYY-MM-DD, defaults to 'from'"),
+    kitchen: UserResponse = Depends(get_kitchen_user)
+):
+    from_date = from_date or datetime.now(timezone.utc).date()
+    to_date = to_date or from_date
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (to_date - from_date).days >= MAX_UPCOMING_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date window is limited to {MAX_UPCOMING_DAYS} days")
+
+    meals = await db.meals.find(
+        {"date": {"$gte": from_date.isoformat(), "$lte": to_date.isoformat()}},
+        HEADCOUNT_PROJECTION
+    ).sort([("date", 1), ("type", 1)]).to_list(None)
+    return sorted((_headcount(meal) for meal in meals), key=lambda meal: (meal["date"], MEAL_SLOTS[meal["type"]]))
+
+@router.get("/{meal_id}/headcount", response_model=MealHeadcount)
+async def get_headcount(meal_id: str, kitchen: UserResponse = Depends(get_kitchen_user)):
+    meal = await db.meals.find_one({"id": meal_id}, HEADCOUNT_PROJECTION)
+    if not meal:
+        raise HTTPException(status_code=404, detail="Meal not found")
+    return _headcount(meal)
 
 @router.post("/", response_model=MealResponse)
 async def create_meal(meal: MealCreate, admin: UserResponse = Depends(get_admin_user)):
     meal_obj = MealResponse(**meal.model_dump())
-    meal_dict = meal_obj.model_dump()
-    meal_dict['created_at'] = meal_dict['created_at'].isoformat()
+    meal_dict = {**meal_obj.model_dump(), "attending_count": 0, "skipped_count": 0}
     
     await db.meals.insert_one(meal_dict)
+    remember_meal(meal_dict)
+    await asyncio.gather(bump_meals_version(), record_meal_created(meal_dict))
     return meal_obj
 
+def _credit_change(previous_status, new_status, price):
+    # Skipping earns the meal price back; re-joining a skipped meal pays it again
+    if new_status == "skipped" and previous_status != "skipped":
+        return price
+    if new_status == "attending" and previous_status == "skipped":
+        return -price
+    return 0
+
+def _publish_selections(user_id, transitions):
+    # Kitchen dashboards apply headcount_delta to the counts they loaded
+    changes = [
+        {"meal_id": meal["id"], "date": meal["date"], "type": meal["type"],
+         "previous_status": previous_status, "status": new_status,
+         "headcount_delta": headcount_deltas(previous_status, new_status)}
+        for meal, previous_status, new_status in transitions if previous_status != new_status
+    ]
+    return event_hub.publish("selection", {"user_id": user_id, "changes": changes}, roles=("admin", "vendor"))
+
+def _selection_ledger_entry(user_id, credit_change, meal):
+    # Money flows sender -> receiver: skip credits come from SYSTEM, re-joins pay it back
+    tx = Transaction(
+        sender_id="SYSTEM" if credit_change > 0 else user_id,
+        receiver_id=user_id if credit_change > 0 else "SYSTEM",
+        amount=abs(credit_change),
+        type="skip_credit" if credit_change > 0 else "admin_adjustment",
+        description=f"{'Earned' if credit_change > 0 else 'Spent'} credits for meal {meal['date']} {meal['type']}"
+    )
+    return tx.model_dump()
+
 @router.post("/{meal_id}/select")
 async def select_meal(
     meal_id: str, 
     status: str, 
+    idempotency_key: Optional[str] = Header(None),
     current_user: UserResponse = Depends(get_current_user)
 ):
     if status not in ["attending", "skipped"]:
         raise HTTPException(status_code=400, detail="Invalid status")
-        
-    meal = await db.meals.find_one({"id": meal_id})
+
+    return await idempotent(
+        current_user.id, "meals.select", idempotency_key, {"meal_id": meal_id, "status": status},
+        lambda: _select_meal(current_user, meal_id, status)
+    )
+
+async def _select_meal(current_user: UserResponse, meal_id: str, status: str):
+    meal = await get_meal(meal_id)
     if not meal:
         raise HTTPException(status_code=404, detail="Meal not found")
         
-    # Check existing selection
-    existing = await db.meal_selections.find_one(
-        {
-            "user_id": current_user.id,
-            "meal_id": meal_id,
+    timestamp = utc_now()
+    selection_filter = {"user_id": current_user.id, "meal_id": meal_id}
+    if status == "attending":
+        previous_status = await _attend(current_user.id, meal, selection_filter, timestamp)
+        credit_change = _credit_change(previous_status, status, meal["price"])
+    else:
+        # Atomically upsert the selection and get back what it replaced, so the
+        # credit is computed from the status we actually overwrote
+        selection_update = {
+            "$set": {"status": status, "timestamp": timestamp},
+            "$setOnInsert": {"id": str(uuid.uuid4())}
         }
-    )
+        try:
+            previous = await db.meal_selections.find_one_and_update(
+                selection_filter, selection_update,
+                projection={"_id": 0, "status": 1}, upsert=True, return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            # Lost an upsert race on the (user_id, meal_id) index; the row exists now
+            previous = await db.meal_selections.find_one_and_update(
+                selection_filter, selection_update,
+                projection={"_id": 0, "status": 1}, return_document=ReturnDocument.BEFORE
+            )
+        previous_status = previous["status"] if previous else None
 
-    # Logic for credits
-    credit_change = 0
-    if existing:
-        # If currently attending and user skips -> earn credits
-        if existing["status"] == "attending" and status == "skipped":
-            credit_change = meal["price"]
-
-        # If currently skipped and user wants to attend -> need to "pay back" credits
-        elif existing["status"] == "skipped" and status == "attending":
-            # Fetch fresh balance from DB to avoid stale token data
-            user = await db.users.find_one({"email": current_user.email})
-            if not user:
-                raise HTTPException(status_code=400, detail="User not found")
-
-            if user.get("wallet_balance", 0) < meal["price"]:
-                # Do NOT update the selection if they can't afford to re-join
-                raise HTTPException(
-                    status_code=400,
-                    detail="Insufficient credits to re-join meal",
-                )
+        credit_change = _credit_change(previous_status, status, meal["price"])
+        if credit_change > 0:
+            await db.users.update_one(
+                {"id": current_user.id},
+                {"$inc": {"wallet_balance": credit_change}}
+            )
 
-            credit_change = -meal["price"]
-
-        # Only update the selection if we're not blocking for insufficient funds
-        await db.meal_selections.update_one(
-            {"id": existing["id"]},
-            {"$set": {"status": status, "timestamp": datetime.now(timezone.utc).isoformat()}}
-        )
-    else:
-        selection = MealSelection(
-            user_id=current_user.id,
-            meal_id=meal_id,
-            status=status
-        )
-        sel_dict = selection.model_dump()
-        sel_dict['timestamp'] = sel_dict['timestamp'].isoformat()
-        await db.meal_selections.insert_one(sel_dict)
-        
-        if status == "skipped":
-            credit_change = meal['price']
-            
-    # Update wallet if needed
+    writes = []
+    transitions = [(meal, previous_status, status)] if previous_status != status else []
+    ledger_entries = []
+    if transitions:
+        writes.append(record_selection_transitions(transitions))
+        writes.append(_publish_selections(current_user.id, transitions))
     if credit_change != 0:
-        await db.users.update_one(
-            {"email": current_user.email},
-            {"$inc": {"wallet_balance": credit_change}}
-        )
+        principal_cache.invalidate_user_id(current_user.id)
         
         # Log transaction
-        tx = Transaction(
-            sender_id="SYSTEM",
-            receiver_id=current_user.id,
-            amount=abs(credit_change),
-            type="skip_credit" if credit_change > 0 else "admin_adjustment", # Re-joining is like paying back
-            description=f"{'Earned' if credit_change > 0 else 'Spent'} credits for meal {meal['date']} {meal['type']}"
-        )
-        tx_dict = tx.model_dump()
-        tx_dict['timestamp'] = tx_dict['timestamp'].isoformat()
-        await db.transactions.insert_one(tx_dict)
+        tx_dict = _selection_ledger_entry(current_user.id, credit_change, meal)
+        ledger_entries.append(tx_dict)
+        writes.append(db.transactions.insert_one(tx_dict))
+    if transitions or ledger_entries:
+        # Skips and ledger rows share one monthly_rollups round trip
+        writes.append(rollups.record_selection_transitions(transitions, ledger_entries))
+    await asyncio.gather(*writes)
         
     return {"status": "success", "new_status": status}
 
-@router.get("/my-selections")
+SELECTION_WRITE_ATTEMPTS = 3
+
+async def _attend(user_id: str, meal: dict, selection_filter: dict, timestamp):
+    """Mark a meal attending and return the status it replaced.
+
+    A re-join pays before the selection flips back: were the debit to follow
+    the write, a concurrent skip could credit the meal again while a failed
+    debit was still being undone. Each write is conditional on the status the
+    debit was decided from; one that loses a race is refunded and replanned.
+    """
+    for _ in range(SELECTION_WRITE_ATTEMPTS):
+        current = await db.meal_selections.find_one(selection_filter, {"_id": 0, "status": 1})
+        previous_status = current["status"] if current else None
+        if previous_status == "attending":
+            return previous_status
+
+        if previous_status is None:
+            try:
+                outcome = await db.meal_selections.update_one(
+                    selection_filter,
+                    {"$setOnInsert": {"id": str(uuid.uuid4()), "status": "attending", "timestamp": timestamp}},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                continue
+            if outcome.upserted_id is not None:
+                return previous_status
+            continue
+
+        price = meal["price"]
+        debited = await db.users.find_one_and_update(
+            {"id": user_id, "wallet_balance": {"$gte": price}},
+            {"$inc": {"wallet_balance": -price}},
+            projection={"_id": 0, "id": 1}
+        )
+        if debited is None:
+            raise HTTPException(status_code=400, detail="Insufficient credits to re-join meal")
+        outcome = await db.meal_selections.update_one(
+            {**selection_filter, "status": previous_status},
+            {"$set": {"status": "attending", "timestamp": timestamp}}
+        )
+        if outcome.modified_count:
+            return previous_status
+        await db.users.update_one({"id": user_id}, {"$inc": {"wallet_balance": price}})
+
+    raise HTTPException(status_code=409, detail="Selection changed concurrently, please retry")
+
+MAX_BULK_SELECTIONS = 100
+
+class BulkSelectionItem(BaseModel):
+    meal_id: str
+    status: Literal["attending", "skipped"]
+
+@router.post("/selections/bulk")
+async def select_meals_bulk(
+    items: List[BulkSelectionItem],
+    idempotency_key: Optional[str] = Header(None),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    if len(items) > MAX_BULK_SELECTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_SELECTIONS} selections per request")
+
+    return await idempotent(
+        current_user.id, "meals.select_bulk", idempotency_key, [item.model_dump() for item in items],
+        lambda: _select_meals_bulk(current_user, items)
+    )
+
+async def _select_meals_bulk(current_user: UserResponse, items: List[BulkSelectionItem]):
+    results = [{"meal_id": item.meal_id, "status": item.status, "ok": False} for item in items]
+
+    # One $in for the meals, then the caller's current selections and balance together
+    meals = await lookup_meals({item.meal_id for item in items})
+    existing_cursor = db.meal_selections.find(
+        {"user_id": current_user.id, "meal_id": {"$in": list(meals)}},
+        {"_id": 0, "meal_id": 1, "status": 1}
+    )
+    existing_selections, user = await asyncio.gather(
+        existing_cursor.to_list(None),
+        db.users.find_one({"id": current_user.id}, {"_id": 0, "wallet_balance": 1})
+    )
+    previous_by_meal = {sel["meal_id"]: sel["status"] for sel in existing_selections}
+    balance = user.get("wallet_balance", 0) if user else 0
+
+    # Plan every transition against the snapshot, rejecting what cannot apply
+    timestamp = utc_now()
+    planned = []  # (result index, previous status, credit change)
+    operations = []
+    seen = set()
+    for index, item in enumerate(items):
+        result = results[index]
+        meal = meals.get(item.meal_id)
+        if meal is None:
+            result["error"] = "Meal not found"
+            continue
+        if item.meal_id in seen:
+            result["error"] = "Duplicate meal in request"
+            continue
+        seen.add(item.meal_id)
+
+        previous_status = previous_by_meal.get(item.meal_id)
+        if previous_status == item.status:
+            result.update(ok=True, credit_change=0)
+            continue
+
+        credit_change = _credit_change(previous_status, item.status, meal["price"])
+        if balance + credit_change < 0:
+            result["error"] = "Insufficient credits to re-join meal"
+            continue
+        balance += credit_change
+
+        selection_filter = {"user_id": current_user.id, "meal_id": item.meal_id}
+        if previous_status is None:
+            operations.append(UpdateOne(
+                selection_filter,
+                {"$setOnInsert": {"id": str(uuid.uuid4()), "status": item.status, "timestamp": timestamp}},
+                upsert=True
+            ))
+        else:
+            operations.append(UpdateOne(
+                {**selection_filter, "status": previous_status},
+                {"$set": {"status": item.status, "timestamp": timestamp}}
+            ))
+        planned.append((index, previous_status, credit_change))
+
+    applied = await _apply_bulk_selections(current_user.id, planned, operations, items, timestamp)
+
+    # Net every wallet movement into a single $inc
+    rejoins = [entry for entry in planned if entry[0] in applied and entry[2] < 0]
+    net_change = sum(entry[2] for entry in planned if entry[0] in applied)
+    if net_change < 0:
+        debited = await db.users.find_one_and_update(
+            {"id": current_user.id, "wallet_balance": {"$gte": -net_change}},
+            {"$inc": {"wallet_balance": net_change}},
+            projection={"_id": 0, "id": 1}
+        )
+        if debited is None:
+            # Balance moved since the snapshot; undo the re-joins and keep the skips
+            await db.meal_selections.bulk_write([
+                UpdateOne(
+                    {"user_id": current_user.id, "meal_id": items[index].meal_id,
+                     "status": items[index].status, "timestamp": timestamp},
+                    {"$set": {"status": previous_status}}
+                )
+                for index, previous_status, _ in rejoins
+            ], ordered=False)
+            for index, _, _ in rejoins:
+                applied.discard(index)
+                results[index]["error"] = "Insufficient credits to re-join meal"
+            net_change = sum(entry[2] for entry in planned if entry[0] in applied)
+            if net_change > 0:
+                await db.users.update_one({"id": current_user.id}, {"$inc": {"wallet_balance": net_change}})
+    elif net_change > 0:
+        await db.users.update_one({"id": current_user.id}, {"$inc": {"wallet_balance": net_change}})
+
+    ledger_entries = []
+    for index, _, credit_change in planned:
+        if index not in applied:
+            results[index].setdefault("error", "Selection changed concurrently, please retry")
+            continue
+        results[index].update(ok=True, credit_change=credit_change)
+        if credit_change != 0:
+            ledger_entries.append(_selection_ledger_entry(current_user.id, credit_change, meals[items[index].meal_id]))
+    transitions = [
+        (meals[items[index].meal_id], previous_status, items[index].status)
+        for index, previous_status, _ in planned if index in applied
+    ]
+    writes = [
+        record_selection_transitions(transitions),
+        # Skips and ledger rows share one monthly_rollups round trip
+        rollups.record_selection_transitions(transitions, ledger_entries)
+    ]
+    if any(previous_status != new_status for _, previous_status, new_status in transitions):
+        writes.append(_publish_selections(current_user.id, transitions))
+    if ledger_entries:
+        writes.append(db.transactions.insert_many(ledger_entries, ordered=False))
+        principal_cache.invalidate_user_id(current_user.id)
+    await asyncio.gather(*writes)
+
+    failed = sum(1 for result in results if not result["ok"])
+    return {
+        "status": "success" if failed == 0 else "partial",
+        "credit_change": net_change,
+        "applied": len(results) - failed,
+        "failed": failed,
+        "results": results
+    }
+
+async def _apply_bulk_selections(user_id, planned, operations, items, timestamp):
+    """Run the planned selection writes in one bulk_write; return the indexes that landed."""
+    if not operations:
+        return set()
+
+    try:
+        outcome = await db.meal_selections.bulk_write(operations, ordered=False)
+        landed = outcome.upserted_count + outcome.modified_count
+    except BulkWriteError as e:
+        landed = e.details.get("nUpserted", 0) + e.details.get("nModified", 0)
+
+    if landed == len(operations):
+        return {index for index, _, _ in planned}
+
+    # Some conditional writes lost a race; our timestamp marks the rows we wrote
+    planned_meal_ids = [items[index].meal_id for index, _, _ in planned]
+    ours = await db.meal_selections.find(
+        {"user_id": user_id, "meal_id": {"$in": planned_meal_ids}, "timestamp": timestamp},
+        {"_id": 0, "meal_id": 1}
+    ).to_list(None)
+    ours = {sel["meal_id"] for sel in ours}
+    return {index for index, _, _ in planned if items[index].meal_id in ours}
+
+@router.get("/my-selections", response_model=List[MealSelection])
 async def get_my_selections(current_user: UserResponse = Depends(get_current_user)):
     selections = await db.meal_selections.find(
         {"user_id": current_user.id}, 
-        {"_id": 0}
+        SELECTION_PROJECTION
     ).to_list(100)
+    if FAST_JSON_RESPONSES:
+        return selection_list_json.response(selections)
     return selections
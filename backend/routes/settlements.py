@@ -0,0 +1,94 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import date
+from database import db
+from models import UserResponse
+from dependencies import get_admin_user, get_kitchen_user
+from settlement import SETTLEMENT_PROJECTION, check_period, period_id, settle_vendors, statement_rows
+import csv
+import io
+import json
+
+router = APIRouter(prefix="/settlements", tags=["settlements"])
+
+
+def _vendor_scope(current_user: UserResponse, vendor_id: Optional[str]) -> Optional[str]:
+    # Vendors only ever see their own settlements; admins may pick one
+    return current_user.id if current_user.role == "vendor" else vendor_id
+
+
+@router.post("/run")
+async def run_settlement(
+    from_date: date = Query(..., alias="from", description="YYYY-MM-DD, inclusive"),
+    to_date: date = Query(..., alias="to", description="YYYY-MM-DD, inclusive"),
+    admin: UserResponse = Depends(get_admin_user)
+):
+    """Settle every vendor for the period, streaming one NDJSON line per vendor as batches complete."""
+    try:
+        await check_period(from_date, to_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def lines():
+        async for record in settle_vendors(from_date, to_date):
+            yield json.dumps(jsonable_encoder(record), separators=(",", ":")) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/")
+async def list_settlements(
+    vendor_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: UserResponse = Depends(get_kitchen_user)
+):
+    query = {}
+    vendor_id = _vendor_scope(current_user, vendor_id)
+    if vendor_id:
+        query["vendor_id"] = vendor_id
+    return await db.settlements.find(query, SETTLEMENT_PROJECTION).sort("period", -1).limit(limit).to_list(limit)
+
+
+@router.get("/statement")
+async def get_statement(
+    from_date: date = Query(..., alias="from", description="YYYY-MM-DD, inclusive"),
+    to_date: date = Query(..., alias="to", description="YYYY-MM-DD, inclusive"),
+    vendor_id: Optional[str] = None,
+    current_user: UserResponse = Depends(get_kitchen_user)
+):
+    """CSV of the vendor's payments in the period, streamed row by row, with totals and the payout."""
+    vendor_id = _vendor_scope(current_user, vendor_id)
+    if not vendor_id:
+        raise HTTPException(status_code=400, detail="vendor_id is required")
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="Period ends before it starts")
+    period = period_id(from_date, to_date)
+
+    def row(*values):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(values)
+        return buffer.getvalue()
+
+    async def lines():
+        yield row("timestamp", "transaction_id", "student_id", "amount", "description")
+        count, gross = 0, 0.0
+        async for tx in statement_rows(vendor_id, from_date, to_date):
+            count += 1
+            gross += tx["amount"]
+            yield row(tx["timestamp"].isoformat(), tx["id"], tx["sender_id"], tx["amount"], tx["description"])
+        settlement = await db.settlements.find_one(
+            {"vendor_id": vendor_id, "period": period}, {"_id": 0, "status": 1, "payout": 1}
+        ) or {}
+        yield row()
+        yield row("payments", count)
+        yield row("gross", round(gross, 2))
+        yield row("settlement", settlement.get("status", "unsettled"))
+        yield row("payout", settlement.get("payout") or 0.0)
+
+    return StreamingResponse(
+        lines(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="statement-{vendor_id}-{period}.csv"'}
+    )
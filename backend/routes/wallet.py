@@ -1,105 +1,115 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
+from typing import Optional
 from database import db
-from models import Transaction, UserResponse
+from models import Transaction, UserResponse, WalletResponse
 from dependencies import get_current_user
-from datetime import datetime, timezone
+from transfers import transfer, SYSTEM_ACCOUNT
+from pagination import keyset_filter, keyset_key, keyset_sort, next_cursor
+from fast_json import FAST_JSON_RESPONSES, JSONSerializer, projection
+from idempotency import idempotent
+from events import event_hub
+import asyncio
+import heapq
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/wallet", tags=["wallet"])
 
-@router.get("/", response_model=dict)
-async def get_wallet(current_user: UserResponse = Depends(get_current_user)):
+TRANSACTION_PROJECTION = projection(Transaction)
+wallet_json = JSONSerializer(WalletResponse)
+
+@router.get("/", response_model=WalletResponse)
+async def get_wallet(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    # Two index-backed branches (sender_id+timestamp, receiver_id+timestamp)
+    # instead of an $or, merged newest first
+    after = keyset_filter("timestamp", cursor)
+    def history(field):
+        return db.transactions.find(
+            {field: current_user.id, **after},
+            TRANSACTION_PROJECTION
+        ).sort(keyset_sort("timestamp")).limit(limit + 1).to_list(limit + 1)
+
     # Get fresh balance
-    user = await db.users.find_one({"email": current_user.email})
-    
-    transactions = await db.transactions.find(
-        {"$or": [{"sender_id": current_user.id}, {"receiver_id": current_user.id}]},
-        {"_id": 0}
-    ).sort("timestamp", -1).to_list(50)
+    user, sent, received = await asyncio.gather(
+        db.users.find_one({"id": current_user.id}, {"_id": 0, "wallet_balance": 1}),
+        history("sender_id"),
+        history("receiver_id")
+    )
+
+    transactions = []
+    seen = set()
+    for tx in heapq.merge(sent, received, key=keyset_key("timestamp"), reverse=True):
+        if tx["id"] not in seen:
+            seen.add(tx["id"])
+            transactions.append(tx)
     
-    return {
+    page = {
         "balance": user['wallet_balance'],
-        "transactions": transactions
+        "transactions": transactions[:limit],
+        "next_cursor": next_cursor(transactions, "timestamp", limit)
     }
+    if FAST_JSON_RESPONSES:
+        return wallet_json.response(page)
+    return page
 
 class PayVendorRequest(BaseModel):
     vendor_id: str
     amount: float
 
 @router.post("/pay")
-async def pay_vendor(req: PayVendorRequest, current_user: UserResponse = Depends(get_current_user)):
+async def pay_vendor(
+    req: PayVendorRequest,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: UserResponse = Depends(get_current_user)
+):
     if req.amount <= 0:
         raise HTTPException(status_code=400, detail="Invalid amount")
-        
-    # Check balance
-    user = await db.users.find_one({"email": current_user.email})
-    if user['wallet_balance'] < req.amount:
-        raise HTTPException(status_code=400, detail="Insufficient funds")
-        
-    # Check vendor
-    vendor = await db.users.find_one({"id": req.vendor_id})
-    if not vendor:
-        raise HTTPException(status_code=404, detail="Vendor not found")
-        
-    # Execute Transfer
-    # 1. Deduct from student
-    await db.users.update_one(
-        {"email": current_user.email},
-        {"$inc": {"wallet_balance": -req.amount}}
-    )
-    
-    # 2. Add to vendor
-    await db.users.update_one(
-        {"id": req.vendor_id},
-        {"$inc": {"wallet_balance": req.amount}}
-    )
-    
-    # 3. Log Transaction
-    tx = Transaction(
-        sender_id=current_user.id,
-        receiver_id=req.vendor_id,
-        amount=req.amount,
-        type="vendor_payment",
-        description=f"Payment to {vendor['full_name']}"
-    )
-    tx_dict = tx.model_dump()
-    tx_dict['timestamp'] = tx_dict['timestamp'].isoformat()
-    await db.transactions.insert_one(tx_dict)
-    
-    return {"status": "success", "transaction_id": tx.id}
+
+    async def pay():
+        # Conditional debit, vendor credit and ledger entry in one engine call
+        tx = await transfer(
+            sender_id=current_user.id,
+            receiver_id=req.vendor_id,
+            amount=req.amount,
+            type="vendor_payment",
+            description=lambda vendor: f"Payment to {vendor['full_name']}"
+        )
+        await event_hub.publish(
+            "payment",
+            {"transaction_id": tx.id, "student_id": tx.sender_id, "vendor_id": tx.receiver_id,
+             "amount": tx.amount, "timestamp": tx.timestamp},
+            roles=("admin",), user_ids=(tx.receiver_id,)
+        )
+        return {"status": "success", "transaction_id": tx.id}
+
+    return await idempotent(current_user.id, "wallet.pay", idempotency_key, req.model_dump(), pay)
 
 class WithdrawRequest(BaseModel):
     amount: float
 
 @router.post("/withdraw")
-async def withdraw_funds(req: WithdrawRequest, current_user: UserResponse = Depends(get_current_user)):
+async def withdraw_funds(
+    req: WithdrawRequest,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: UserResponse = Depends(get_current_user)
+):
     if current_user.role != "vendor":
         raise HTTPException(status_code=403, detail="Only vendors can withdraw funds")
         
     if req.amount <= 0:
         raise HTTPException(status_code=400, detail="Invalid amount")
-        
-    # Check balance
-    user = await db.users.find_one({"email": current_user.email})
-    if user['wallet_balance'] < req.amount:
-        raise HTTPException(status_code=400, detail="Insufficient funds")
-        
-    # Deduct from vendor
-    await db.users.update_one(
-        {"email": current_user.email},
-        {"$inc": {"wallet_balance": -req.amount}}
-    )
-    
-    # Log Transaction
-    tx = Transaction(
-        sender_id=current_user.id,
-        receiver_id="SYSTEM", # Sending back to system/bank
-        amount=req.amount,
-        type="withdrawal", # New type
-        description=f"Weekly Withdrawal Request"
-    )
-    tx_dict = tx.model_dump()
-    tx_dict['timestamp'] = tx_dict['timestamp'].isoformat()
-    await db.transactions.insert_one(tx_dict)
-    
-    return {"status": "success", "transaction_id": tx.id, "message": "Withdrawal processed successfully"}
+
+    async def withdraw():
+        tx = await transfer(
+            sender_id=current_user.id,
+            receiver_id=SYSTEM_ACCOUNT, # Sending back to system/bank
+            amount=req.amount,
+            type="withdrawal",
+            description="Weekly Withdrawal Request"
+        )
+        return {"status": "success", "transaction_id": tx.id, "message": "Withdrawal processed successfully"}
+
+    return await idempotent(current_user.id, "wallet.withdraw", idempotency_key, req.model_dump(), withdraw)
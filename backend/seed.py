@@ -0,0 +1,101 @@
+"""Seed the default admin, vendor and today's meals into an empty database.
+
+One-shot command for deployments (`python seed.py`); the server also calls
+`seed_defaults` at startup unless SEED_ON_STARTUP=0. Either way a single
+upsert on the `migrations` marker decides which process seeds: every other
+worker boot costs one round trip and no bcrypt.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from database import db
+from auth_utils import get_password_hash_async
+from counters import rebuild_wastage_counters
+from meal_cache import bump_meals_version
+from models import utc_now
+
+logger = logging.getLogger(__name__)
+
+SEED_ID = "seed_defaults"
+
+DEFAULT_USERS = [
+    {"role": "admin", "email": "admin@credeat.com", "password": "admin123", "full_name": "Mess Admin"},
+    {"role": "vendor", "email": "vendor@credeat.com", "password": "vendor123", "full_name": "Campus Cafe"},
+]
+
+DEFAULT_MEALS = [
+    {"type": "breakfast", "menu_items": ["Idli", "Sambar", "Chutney", "Coffee"], "price": 40.0},
+    {"type": "lunch", "menu_items": ["Rice", "Dal", "Paneer Butter Masala", "Curd"], "price": 80.0},
+    {"type": "dinner", "menu_items": ["Roti", "Mix Veg", "Salad"], "price": 60.0},
+]
+
+
+async def _claim(force: bool) -> bool:
+    if force:
+        await db.migrations.delete_one({"_id": SEED_ID})
+    result = await db.migrations.update_one(
+        {"_id": SEED_ID}, {"$setOnInsert": {"started_at": utc_now()}}, upsert=True
+    )
+    return result.upserted_id is not None
+
+
+async def _seed_users():
+    existing = set(await db.users.distinct("role", {"role": {"$in": [user["role"] for user in DEFAULT_USERS]}}))
+    missing = [user for user in DEFAULT_USERS if user["role"] not in existing]
+    # Both bcrypt rounds run side by side on the hasher pool
+    hashes = await asyncio.gather(*(get_password_hash_async(user["password"]) for user in missing))
+    for user, hashed_password in zip(missing, hashes):
+        logger.info("Seeding %s user...", user["role"])
+        await db.users.insert_one({
+            "id": str(uuid.uuid4()),
+            "email": user["email"],
+            "hashed_password": hashed_password,
+            "full_name": user["full_name"],
+            "role": user["role"],
+            "wallet_balance": 0.0,
+            "created_at": utc_now()
+        })
+    return [user["role"] for user in missing]
+
+
+async def _seed_meals():
+    if await db.meals.find_one({}, {"_id": 1}):
+        return 0
+    logger.info("Seeding meals...")
+    today = datetime.now().strftime("%Y-%m-%d")
+    await db.meals.insert_many([
+        {"id": str(uuid.uuid4()), "date": today, **meal, "is_active": True, "created_at": utc_now()}
+        for meal in DEFAULT_MEALS
+    ])
+    await rebuild_wastage_counters()
+    await bump_meals_version()
+    return len(DEFAULT_MEALS)
+
+
+async def seed_defaults(force: bool = False):
+    """Seed once per database; returns what was done, or None if already seeded."""
+    if not await _claim(force):
+        return None
+    try:
+        users = await _seed_users()
+        meals = await _seed_meals()
+    except BaseException:
+        # Let the next boot (or a rerun) try again
+        await db.migrations.delete_one({"_id": SEED_ID})
+        raise
+    result = {"users": users, "meals": meals}
+    await db.migrations.update_one({"_id": SEED_ID}, {"$set": {"finished_at": utc_now(), **result}})
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Seed default users and meals")
+    parser.add_argument("--force", action="store_true", help="check again even if this database was seeded before")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    result = asyncio.run(seed_defaults(force=args.force))
+    print("Already seeded (use --force to check again)." if result is None else f"Seeded: {result}")
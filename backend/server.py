@@ -1,16 +1,22 @@
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi import Depends, FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from starlette.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import os
 import logging
-from database import db
-from auth_utils import get_password_hash
-from datetime import datetime, timezone
-import uuid
+from database import warm_up_pool, ping_database, pool_status
+from seed import seed_defaults
+from uploads import UPLOAD_DIR, UploadSizeLimit, UploadStaticFiles
+from events import event_hub
+from metrics import MetricsMiddleware, METRICS_PUBLIC, METRICS_TOKEN, render_metrics
+from dependencies import get_admin_user, optional_oauth2_scheme
+from typing import Optional
+import asyncio
+import secrets
 
 # Import Routes
-from routes import auth, meals, wallet, complaints, analytics
+from routes import auth, meals, wallet, complaints, analytics, events, settlements
+from routes.analytics import cache_stats
 
 # Configure logging
 logging.basicConfig(
@@ -19,82 +25,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Seeding is a single guarded upsert per boot; deployments that run
+# `python seed.py` once can switch it off entirely
+SEED_ON_STARTUP = os.environ.get("SEED_ON_STARTUP", "1") == "1"
+READINESS_PING_TIMEOUT_SECONDS = 1.0
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Seed Data
-    try:
-        # Check if admin exists
-        admin = await db.users.find_one({"role": "admin"})
-        if not admin:
-            logger.info("Seeding Admin User...")
-            admin_user = {
-                "id": str(uuid.uuid4()),
-                "email": "admin@credeat.com",
-                "hashed_password": get_password_hash("admin123"),
-                "full_name": "Mess Admin",
-                "role": "admin",
-                "wallet_balance": 0.0,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-            await db.users.insert_one(admin_user)
-            
-        # Check if vendor exists
-        vendor = await db.users.find_one({"role": "vendor"})
-        if not vendor:
-            logger.info("Seeding Vendor User...")
-            vendor_user = {
-                "id": str(uuid.uuid4()),
-                "email": "vendor@credeat.com",
-                "hashed_password": get_password_hash("vendor123"),
-                "full_name": "Campus Cafe",
-                "role": "vendor",
-                "wallet_balance": 0.0,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-            await db.users.insert_one(vendor_user)
+    # Connect in the background: the worker starts serving at once and
+    # /api/health/ready reports when the pool is up
+    warm_up = asyncio.create_task(warm_up_pool())
+    if SEED_ON_STARTUP:
+        try:
+            result = await seed_defaults()
+            if result is not None:
+                logger.info(f"Seeded defaults: {result}")
+        except Exception as e:
+            logger.error(f"Seeding error: {e}")
 
-        # Seed some meals
-        if await db.meals.count_documents({}) == 0:
-            logger.info("Seeding Meals...")
-            meals_data = [
-                {
-                    "id": str(uuid.uuid4()),
-                    "date": datetime.now().strftime("%Y-%m-%d"),
-                    "type": "breakfast",
-                    "menu_items": ["Idli", "Sambar", "Chutney", "Coffee"],
-                    "price": 40.0,
-                    "is_active": True,
-                    "created_at": datetime.now(timezone.utc).isoformat()
-                },
-                {
-                    "id": str(uuid.uuid4()),
-                    "date": datetime.now().strftime("%Y-%m-%d"),
-                    "type": "lunch",
-                    "menu_items": ["Rice", "Dal", "Paneer Butter Masala", "Curd"],
-                    "price": 80.0,
-                    "is_active": True,
-                    "created_at": datetime.now(timezone.utc).isoformat()
-                },
-                {
-                    "id": str(uuid.uuid4()),
-                    "date": datetime.now().strftime("%Y-%m-%d"),
-                    "type": "dinner",
-                    "menu_items": ["Roti", "Mix Veg", "Salad"],
-                    "price": 60.0,
-                    "is_active": True,
-                    "created_at": datetime.now(timezone.utc).isoformat()
-                }
-            ]
-            await db.meals.insert_many(meals_data)
-            
-    except Exception as e:
-        logger.error(f"Seeding error: {e}")
-        
+    await event_hub.start()
     yield
-    # Shutdown logic if needed
+    warm_up.cancel()
+    await event_hub.stop()
 
 app = FastAPI(lifespan=lifespan)
 
+# Innermost, so a refused upload still gets CORS headers
+app.add_middleware(UploadSizeLimit, paths={"/api/complaints/"})
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -102,11 +59,13 @@ app.add_middleware(
     allow_origins=["*"], # Allow all for hackathon/dev
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed"],
 )
+# Outermost, so timings include CORS and error handling
+app.add_middleware(MetricsMiddleware)
 
 # Mount Static Files
-os.makedirs("uploads", exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", UploadStaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 # Include Routers
 app.include_router(auth.router, prefix="/api")
@@ -114,7 +73,23 @@ app.include_router(meals.router, prefix="/api")
 app.include_router(wallet.router, prefix="/api")
 app.include_router(complaints.router, prefix="/api")
 app.include_router(analytics.router, prefix="/api")
+app.include_router(events.router, prefix="/api")
+app.include_router(settlements.router, prefix="/api")
 
 @app.get("/api/")
 async def root():
     return {"message": "CredEat API is running"}
+
+@app.get("/api/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics(token: Optional[str] = Depends(optional_oauth2_scheme)):
+    # Prometheus text format: per-route latency, Mongo commands per request, cache counters
+    scraper = METRICS_TOKEN and token and secrets.compare_digest(token, METRICS_TOKEN)
+    if not (METRICS_PUBLIC or scraper):
+        await get_admin_user(token)
+    return PlainTextResponse(render_metrics(cache_stats()), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/health/ready", include_in_schema=False)
+async def readiness():
+    # 503 until the pool has warmed up, and whenever Mongo stops answering
+    ready = pool_status["ready"] and await ping_database(READINESS_PING_TIMEOUT_SECONDS)
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "mongo": pool_status})
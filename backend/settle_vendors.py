@@ -0,0 +1,41 @@
+import argparse
+import asyncio
+import json
+from datetime import date
+from fastapi.encoders import jsonable_encoder
+from settlement import SETTLEMENT_BATCH_SIZE, settle_vendors
+
+async def settle(start: date, end: date, batch_size: int, output: str = None):
+    print(f"Settling vendors for {start} .. {end}...")
+    totals = {}
+    payout = 0.0
+    out = open(output, "w") if output else None
+    try:
+        async for record in settle_vendors(start, end, batch_size):
+            totals[record["status"]] = totals.get(record["status"], 0) + 1
+            payout += record.get("payout") or 0.0
+            if out:
+                out.write(json.dumps(jsonable_encoder(record), separators=(",", ":")) + "\n")
+    finally:
+        if out:
+            out.close()
+
+    print(f"Vendors: {sum(totals.values())} ({', '.join(f'{status}: {count}' for status, count in sorted(totals.items()))})")
+    print(f"Paid out: {round(payout, 2)}")
+    if totals.get("pending"):
+        print("Some settlements are still pending; run the same period again to finish them.")
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Settle vendor earnings for a closed period")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, required=True, help="YYYY-MM-DD, inclusive")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, required=True, help="YYYY-MM-DD, inclusive")
+    parser.add_argument("--batch-size", type=int, default=SETTLEMENT_BATCH_SIZE)
+    parser.add_argument("--output", help="write one NDJSON settlement record per vendor to this file")
+    args = parser.parse_args()
+    try:
+        totals = asyncio.run(settle(args.start, args.end, args.batch_size, args.output))
+    except ValueError as e:
+        print(f"Cannot settle: {e}")
+        raise SystemExit(2)
+    raise SystemExit(1 if totals.get("pending") else 0)
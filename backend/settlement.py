@@ -0,0 +1,266 @@
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database import db
+from models import Transaction, utc_now
+from principal_cache import principal_cache
+from rollups import record_transactions
+from transfers import SYSTEM_ACCOUNT
+from datetime import date, datetime, time, timedelta, timezone
+import os
+import uuid
+
+# Vendor settlement: for a closed period, pay out each vendor's vendor_payment
+# inflows as one withdrawal. One $group pipeline streams per-vendor totals;
+# every SETTLEMENT_BATCH_SIZE vendors the settlement records, conditional
+# debits and ledger rows are written in bulk. Each step is keyed on
+# (vendor, period), so an interrupted run is resumed by running it again.
+SETTLEMENT_BATCH_SIZE = int(os.environ.get("SETTLEMENT_BATCH_SIZE", "1000"))
+SETTLEMENT_NAMESPACE = uuid.UUID("6f1c5a52-8d1e-4e8f-9b43-3c1f0f6e2a91")
+
+# Outcomes where the vendor could not be settled at all; they never block an
+# overlapping period
+FAILED_STATUSES = ("unknown_vendor",)
+
+SETTLEMENT_PROJECTION = {"_id": 0}
+STATEMENT_PROJECTION = {"_id": 0, "id": 1, "sender_id": 1, "amount": 1, "description": 1, "timestamp": 1}
+
+
+def period_id(start: date, end: date) -> str:
+    return f"{start.isoformat()}..{end.isoformat()}"
+
+
+def period_bounds(start: date, end: date):
+    """[start, end + 1 day) as UTC datetimes; both dates inclusive."""
+    return (
+        datetime.combine(start, time.min, timezone.utc),
+        datetime.combine(end + timedelta(days=1), time.min, timezone.utc)
+    )
+
+
+def payments_query(start: date, end: date, vendor_id: str = None) -> dict:
+    since, before = period_bounds(start, end)
+    query = {"type": "vendor_payment", "timestamp": {"$gte": since, "$lt": before}}
+    if vendor_id:
+        query["receiver_id"] = vendor_id
+    return query
+
+
+def overlapping_query(start: date, end: date) -> dict:
+    """Settlements of another period sharing a day with [start, end]; days are YYYY-MM-DD strings."""
+    return {
+        "end": {"$gte": start.isoformat()},
+        "start": {"$lte": end.isoformat()},
+        "period": {"$ne": period_id(start, end)},
+        "status": {"$nin": list(FAILED_STATUSES)}
+    }
+
+
+def settlement_key(vendor_id: str, period: str) -> str:
+    return f"{period}:{vendor_id}"
+
+
+def inflows_pipeline(start: date, end: date) -> list:
+    return [
+        {"$match": payments_query(start, end)},
+        {"$group": {
+            "_id": "$receiver_id",
+            "gross": {"$sum": "$amount"},
+            "payments": {"$sum": 1},
+            "first_payment": {"$min": "$timestamp"},
+            "last_payment": {"$max": "$timestamp"}
+        }},
+        {"$sort": {"_id": 1}}
+    ]
+
+
+async def _claim(rows, start: date, end: date):
+    """Insert pending settlement records; returns the records to work on (new or resumed)."""
+    period = period_id(start, end)
+    keys = [settlement_key(row["_id"], period) for row in rows]
+    existing = {doc["id"]: doc async for doc in db.settlements.find({"id": {"$in": keys}}, SETTLEMENT_PROJECTION)}
+
+    now = utc_now()
+    new = [
+        {
+            "id": key,
+            "vendor_id": row["_id"],
+            "period": period,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "gross": round(row["gross"], 2),
+            "payments": row["payments"],
+            "first_payment": row["first_payment"],
+            "last_payment": row["last_payment"],
+            "status": "pending",
+            "created_at": now
+        }
+        for key, row in zip(keys, rows) if key not in existing
+    ]
+    if new:
+        try:
+            await db.settlements.insert_many(new, ordered=False)
+        except BulkWriteError as e:
+            # Another run claimed some of these vendors first; leave them to it
+            taken = {new[error["index"]]["id"] for error in e.details["writeErrors"]}
+            new = [doc for doc in new if doc["id"] not in taken]
+        for doc in new:
+            doc.pop("_id", None)
+    return [doc for doc in existing.values() if doc["status"] == "pending"] + new
+
+
+async def _settle_batch(records, period: str):
+    """Debit, record and finalize one batch of pending settlements."""
+    balances = {
+        user["id"]: user
+        async for user in db.users.find(
+            {"id": {"$in": [record["vendor_id"] for record in records]}},
+            {"_id": 0, "id": 1, "wallet_balance": 1, "last_settlement_id": 1}
+        )
+    }
+
+    # A vendor may already have withdrawn part of the period's earnings ad hoc
+    payouts = {}
+    for record in records:
+        user = balances.get(record["vendor_id"])
+        if user is None:
+            continue
+        if user.get("last_settlement_id") == record["id"]:
+            payouts[record["id"]] = record.get("payout")  # debited before an interruption
+        else:
+            payouts[record["id"]] = round(min(record["gross"], user.get("wallet_balance", 0.0)), 2)
+
+    debits = [
+        UpdateOne(
+            {"id": record["vendor_id"], "wallet_balance": {"$gte": payouts[record["id"]]},
+             "last_settlement_id": {"$ne": record["id"]}},
+            {"$inc": {"wallet_balance": -payouts[record["id"]]}, "$set": {"last_settlement_id": record["id"]}}
+        )
+        for record in records if payouts.get(record["id"]) and balances[record["vendor_id"]].get("last_settlement_id") != record["id"]
+    ]
+    # Record the intended payout first so a resumed run debits the same amount
+    intended = [
+        UpdateOne({"id": record_id, "status": "pending"}, {"$set": {"payout": payout}})
+        for record_id, payout in payouts.items() if payout is not None
+    ]
+    if intended:
+        await db.settlements.bulk_write(intended, ordered=False)
+    if debits:
+        await db.users.bulk_write(debits, ordered=False)
+
+    # The marker on the user document says which conditional debits applied
+    debited = {
+        user["last_settlement_id"]
+        async for user in db.users.find(
+            {"id": {"$in": list(balances)}, "last_settlement_id": {"$in": [record["id"] for record in records]}},
+            {"_id": 0, "last_settlement_id": 1}
+        )
+    }
+
+    entries = []
+    finals = []
+    now = utc_now()
+    for record in records:
+        payout = payouts.get(record["id"])
+        if record["id"] in debited:
+            tx = Transaction(
+                id=str(uuid.uuid5(SETTLEMENT_NAMESPACE, record["id"])),
+                sender_id=record["vendor_id"],
+                receiver_id=SYSTEM_ACCOUNT,
+                amount=payout,
+                type="withdrawal",
+                description=f"Settlement {period}"
+            )
+            entries.append(tx.model_dump())
+            update = {"status": "settled", "payout": payout, "transaction_id": tx.id, "settled_at": now}
+        elif record["vendor_id"] not in balances:
+            update = {"status": "unknown_vendor", "payout": 0.0, "settled_at": now}
+        elif not payout:
+            update = {"status": "nothing_to_pay", "payout": 0.0, "settled_at": now}
+        else:
+            # Balance dropped between the read and the conditional debit; run again to retry
+            update = {"status": "pending", "payout": None}
+        finals.append(UpdateOne({"id": record["id"]}, {"$set": update}))
+        record.update(update)
+
+    if entries:
+        written = await _insert_ledger_entries(entries)
+        await record_transactions(written)
+        for entry in entries:
+            principal_cache.invalidate_user_id(entry["sender_id"])
+    await db.settlements.bulk_write(finals, ordered=False)
+    return records
+
+
+async def _insert_ledger_entries(entries):
+    """Insert withdrawal rows; ids are derived from the settlement, so a resumed run skips existing ones."""
+    try:
+        await db.transactions.insert_many(entries, ordered=False)
+        return entries
+    except BulkWriteError as e:
+        duplicates = {entries[error["index"]]["id"] for error in e.details["writeErrors"] if error["code"] == 11000}
+        if len(duplicates) != len(e.details["writeErrors"]):
+            raise
+        return [entry for entry in entries if entry["id"] not in duplicates]
+
+
+async def check_period(start: date, end: date):
+    """Raise ValueError unless [start, end] can be settled now."""
+    if end < start:
+        raise ValueError("Period ends before it starts")
+    if end >= datetime.now(timezone.utc).date():
+        raise ValueError("Only periods that ended before today can be settled")
+    if await db.transactions.find_one({"timestamp": {"$type": "string"}}, {"_id": 1}):
+        raise ValueError("Ledger still has string timestamps; run migrate_timestamps.py first")
+    # The debit marker on a vendor only remembers its latest settlement, so
+    # an interrupted period has to be finished before another one starts
+    period = period_id(start, end)
+    unfinished = await db.settlements.find_one({"status": "pending", "period": {"$ne": period}}, {"_id": 0, "period": 1})
+    if unfinished:
+        raise ValueError(f"Settlement {unfinished['period']} is unfinished; run it again first")
+    # Payments in an overlap would be paid out twice; only a re-run of the same
+    # period, which resumes or reports it, may cover days already settled
+    overlapping = await db.settlements.find_one(
+        overlapping_query(start, end), {"_id": 0, "vendor_id": 1, "period": 1}
+    )
+    if overlapping:
+        raise ValueError(
+            f"Period overlaps settlement {overlapping['period']} of vendor {overlapping['vendor_id']}"
+        )
+
+
+async def settle_vendors(start: date, end: date, batch_size: int = SETTLEMENT_BATCH_SIZE):
+    """Settle every vendor paid in [start, end]; yields one settlement record per vendor.
+
+    Only closed periods (ending before today, UTC) can be settled. Vendors
+    already settled for the period are reported as they are.
+    """
+    await check_period(start, end)
+    period = period_id(start, end)
+    batch = []
+
+    async def flush():
+        claimed = await _claim(batch, start, end)
+        settled = await _settle_batch(claimed, period) if claimed else []
+        done = {record["id"] for record in settled}
+        keys = [settlement_key(row["_id"], period) for row in batch if settlement_key(row["_id"], period) not in done]
+        previous = [doc async for doc in db.settlements.find({"id": {"$in": keys}}, SETTLEMENT_PROJECTION)] if keys else []
+        return sorted(settled + previous, key=lambda record: record["vendor_id"])
+
+    async for row in db.transactions.aggregate(inflows_pipeline(start, end), allowDiskUse=True):
+        if row["_id"] in (None, SYSTEM_ACCOUNT):
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            for record in await flush():
+                yield record
+            batch = []
+    if batch:
+        for record in await flush():
+            yield record
+
+
+async def statement_rows(vendor_id: str, start: date, end: date):
+    """The vendor's payments in the period, oldest first, streamed from the ledger."""
+    cursor = db.transactions.find(payments_query(start, end, vendor_id), STATEMENT_PROJECTION)
+    async for tx in cursor.sort([("timestamp", 1), ("id", 1)]).batch_size(1000):
+        yield tx
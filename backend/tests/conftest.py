@@ -0,0 +1,111 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The server modules read their configuration at import time
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ["MONGO_URL"] = "mongodb://localhost:27017"  # never connected, see below
+os.environ["DB_NAME"] = "credeat_test"
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="credeat-uploads-")
+os.environ["SEED_ON_STARTUP"] = "0"
+
+# Swap in mongomock before any module binds database.db (requirements-dev.txt);
+# it has no transactions or change streams
+from mongomock_motor import AsyncMongoMockClient
+import database
+
+database.client = AsyncMongoMockClient(tz_aware=True)
+database.db = database.client[os.environ["DB_NAME"]]
+
+import httpx
+import server
+from auth_utils import create_user_token
+from models import MealResponse, UserInDB
+from principal_cache import principal_cache
+import meal_cache
+import idempotency
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db():
+    return database.db
+
+
+@pytest.fixture(autouse=True)
+async def clean_state(anyio_backend):
+    await database.client.drop_database(os.environ["DB_NAME"])
+    principal_cache.clear()
+    meal_cache._meals.clear()
+    meal_cache._active_meals.update(version=None, body=None, etag=None)
+    meal_cache._version.update(value=0, checked_at=float("-inf"))
+    idempotency._responses.clear()
+    idempotency._in_flight.clear()
+    yield
+
+
+@pytest.fixture
+async def client():
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def make_user(db):
+    async def make_user(role="student", wallet_balance=0.0, full_name=None):
+        user = UserInDB(
+            email=f"{role}-{await db.users.count_documents({})}@credeat.com",
+            full_name=full_name or role.title(),
+            role=role,
+            hashed_password="not-a-real-hash",
+            wallet_balance=wallet_balance,
+        ).model_dump()
+        await db.users.insert_one(dict(user))
+        return user
+    return make_user
+
+
+@pytest.fixture
+def make_meal(db):
+    async def make_meal(date, type="lunch", price=50.0):
+        meal = MealResponse(date=date, type=type, menu_items=["Rice", "Dal"], price=price).model_dump()
+        await db.meals.insert_one(dict(meal))
+        return meal
+    return make_meal
+
+
+@pytest.fixture
+def mongo_calls(db, monkeypatch):
+    """Record calls to collection methods as (collection name, method, args)."""
+    calls = []
+
+    def watch(*methods):
+        collection_type = type(db.users)
+        for method in methods:
+            original = getattr(collection_type, method)
+
+            def spy(self, *args, _method=method, _original=original, **kwargs):
+                calls.append((self.name, _method, args))
+                return _original(self, *args, **kwargs)
+
+            monkeypatch.setattr(collection_type, method, spy)
+        return calls
+    return watch
+
+
+def auth(user):
+    return {"Authorization": f"Bearer {create_user_token(user)}"}
+
+
+async def balance(db, user):
+    return (await db.users.find_one({"id": user["id"]}))["wallet_balance"]
@@ -0,0 +1,65 @@
+from argparse import Namespace
+
+import pytest
+
+import audit_queries
+from audit_queries import QUERY_SHAPES, audit_shape, find_shape
+
+pytestmark = pytest.mark.anyio
+
+SHAPE = find_shape("sent history", "wallet.get_wallet", "transactions", lambda s: {"sender_id": s["id"]}, limit=51)
+
+
+class ExplainOnly:
+    """Answers explain with a canned plan."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.commands = []
+
+    async def command(self, command):
+        self.commands.append(command)
+        return self.plan
+
+
+def plan(*stages, examined, returned):
+    node = {"executionStats": {"totalDocsExamined": examined, "nReturned": returned}}
+    for stage in reversed(stages):
+        node = {"stage": stage, "indexName": "sender_id_1_timestamp_-1_id_-1", "inputStage": node}
+    return {"queryPlanner": {"winningPlan": node}, **node}
+
+
+async def test_an_index_backed_plan_passes():
+    database = ExplainOnly(plan("LIMIT", "FETCH", "IXSCAN", examined=51, returned=51))
+
+    result = await audit_shape(database, SHAPE, {"id": "u1"}, max_ratio=2.0)
+
+    assert result["ok"] is True
+    assert result["indexes"] == ["sender_id_1_timestamp_-1_id_-1"]
+    assert database.commands == [{
+        "explain": {"find": "transactions", "filter": {"sender_id": "u1"}, "limit": 51},
+        "verbosity": "executionStats",
+    }]
+
+
+@pytest.mark.parametrize("stages, examined, problem", [
+    (("COLLSCAN",), 51, "COLLSCAN"),
+    (("SORT", "FETCH", "IXSCAN"), 51, "in-memory SORT"),
+    (("FETCH", "IXSCAN"), 510, "examined/returned 10.0 > 2.0"),
+])
+async def test_bad_plans_are_reported(stages, examined, problem):
+    database = ExplainOnly(plan(*stages, examined=examined, returned=51))
+
+    result = await audit_shape(database, SHAPE, {"id": "u1"}, max_ratio=2.0)
+
+    assert result["ok"] is False
+    assert result["problems"] == [problem]
+
+
+async def test_every_shape_builds_from_the_seeded_sample(db):
+    args = Namespace(students=20, vendors=2, meal_days=3, selections_per_student=2, payments=50, complaints=10, seed=1)
+
+    sample = await audit_queries.seed(db, args)
+
+    for shape in QUERY_SHAPES:
+        assert isinstance(shape["command"](sample), dict), shape["name"]
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+
+import pytest
+
+import auth_utils
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_login_answers_503_while_the_hasher_is_saturated(db, client, make_user, monkeypatch):
+    student = await make_user("student")
+    await db.users.update_one({"id": student["id"]}, {"$set": {"hashed_password": auth_utils.get_password_hash("secret")}})
+    monkeypatch.setattr(auth_utils, "PASSWORD_HASH_WORKERS", 1)
+    monkeypatch.setattr(auth_utils, "PASSWORD_HASH_MAX_QUEUE", 0)
+
+    started, release = threading.Event(), threading.Event()
+    verify_password = auth_utils.verify_password
+
+    def slow_verify(plain_password, hashed_password):
+        started.set()
+        release.wait(5)
+        return verify_password(plain_password, hashed_password)
+
+    monkeypatch.setattr(auth_utils, "verify_password", slow_verify)
+    credentials = {"username": student["email"], "password": "secret"}
+
+    first = asyncio.create_task(client.post("/api/auth/login", data=credentials))
+    await asyncio.to_thread(started.wait, 5)
+    busy = await client.post("/api/auth/login", data=credentials)
+    release.set()
+
+    assert busy.status_code == 503
+    assert busy.headers["Retry-After"] == "1"
+    assert (await first).status_code == 200
+    assert auth_utils.password_hasher_stats()["pending"] == 0
+
+
+async def test_wrong_password_is_still_401(db, client, make_user):
+    student = await make_user("student")
+    await db.users.update_one({"id": student["id"]}, {"$set": {"hashed_password": auth_utils.get_password_hash("secret")}})
+
+    response = await client.post("/api/auth/login", data={"username": student["email"], "password": "nope"})
+
+    assert response.status_code == 401
@@ -0,0 +1,70 @@
+import pytest
+
+from conftest import auth, balance
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_week_plan_moves_the_wallet_with_one_netted_inc(db, client, make_user, make_meal, mongo_calls):
+    student = await make_user("student", wallet_balance=5.0)
+    meals = [await make_meal(f"2026-11-0{day}", price=40.0) for day in range(2, 6)]
+    await db.meal_selections.insert_one(
+        {"id": "sel-1", "user_id": student["id"], "meal_id": meals[3]["id"], "status": "skipped"}
+    )
+
+    calls = mongo_calls("update_one", "find_one_and_update", "bulk_write")
+    response = await client.post("/api/meals/selections/bulk", headers=auth(student), json=[
+        {"meal_id": meals[0]["id"], "status": "skipped"},
+        {"meal_id": meals[1]["id"], "status": "skipped"},
+        {"meal_id": meals[2]["id"], "status": "skipped"},
+        {"meal_id": meals[3]["id"], "status": "attending"},
+    ])
+
+    body = response.json()
+    assert response.status_code == 200
+    assert (body["status"], body["applied"], body["failed"]) == ("success", 4, 0)
+    assert body["credit_change"] == pytest.approx(80.0)
+    assert await balance(db, student) == pytest.approx(85.0)
+    wallet_writes = [(method, args[1:]) for name, method, args in calls if name == "users"]
+    assert wallet_writes == [("update_one", ({"$inc": {"wallet_balance": 80.0}},))]
+    # The ledger keeps one row per meal
+    assert await db.transactions.count_documents({"type": "skip_credit"}) == 3
+    assert await db.transactions.count_documents({"type": "admin_adjustment"}) == 1
+
+
+async def test_unknown_and_duplicate_meals_fail_alone(db, client, make_user, make_meal):
+    student = await make_user("student")
+    meal = await make_meal("2026-11-02", price=40.0)
+
+    response = await client.post("/api/meals/selections/bulk", headers=auth(student), json=[
+        {"meal_id": meal["id"], "status": "skipped"},
+        {"meal_id": meal["id"], "status": "attending"},
+        {"meal_id": "no-such-meal", "status": "skipped"},
+    ])
+
+    body = response.json()
+    assert (body["status"], body["applied"], body["failed"]) == ("partial", 1, 2)
+    assert [result.get("error") for result in body["results"]] == [
+        None, "Duplicate meal in request", "Meal not found"
+    ]
+    assert await balance(db, student) == pytest.approx(40.0)
+
+
+async def test_rejoins_the_wallet_cannot_cover_are_refused(db, client, make_user, make_meal):
+    student = await make_user("student", wallet_balance=50.0)
+    meals = [await make_meal(f"2026-11-0{day}", price=40.0) for day in range(2, 4)]
+    await db.meal_selections.insert_many([
+        {"id": f"sel-{meal['id']}", "user_id": student["id"], "meal_id": meal["id"], "status": "skipped"}
+        for meal in meals
+    ])
+
+    response = await client.post("/api/meals/selections/bulk", headers=auth(student), json=[
+        {"meal_id": meal["id"], "status": "attending"} for meal in meals
+    ])
+
+    body = response.json()
+    assert (body["status"], body["applied"], body["failed"]) == ("partial", 1, 1)
+    assert body["results"][1]["error"] == "Insufficient credits to re-join meal"
+    assert await balance(db, student) == pytest.approx(10.0)
+    statuses = {sel["meal_id"]: sel["status"] async for sel in db.meal_selections.find({"user_id": student["id"]})}
+    assert statuses == {meals[0]["id"]: "attending", meals[1]["id"]: "skipped"}
@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from conftest import auth
+from models import ComplaintResponse
+
+pytestmark = pytest.mark.anyio
+
+
+def complaint_row(id, user, created_at, status="pending", category="hygiene"):
+    complaint = ComplaintResponse(id=id, user_id=user["id"], category=category, description="Cold food", status=status)
+    return {**complaint.model_dump(), "created_at": created_at}
+
+
+async def listing_pages(client, user, **params):
+    pages, cursor = [], None
+    while True:
+        response = await client.get(
+            "/api/complaints/", params={**params, **({"cursor": cursor} if cursor else {})}, headers=auth(user)
+        )
+        assert response.status_code == 200
+        pages.append([complaint["id"] for complaint in response.json()])
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return pages
+
+
+@pytest.fixture
+async def complaints(db, make_user):
+    student, other = await make_user("student"), await make_user("student")
+    await db.complaints.insert_many([
+        complaint_row("c-a", student, datetime(2026, 10, 1, 9, tzinfo=timezone.utc)),
+        complaint_row("c-b", student, datetime(2026, 10, 2, 9, tzinfo=timezone.utc), status="resolved"),
+        complaint_row("c-c", student, datetime(2026, 10, 2, 9, tzinfo=timezone.utc), category="quality"),
+        complaint_row("c-d", other, datetime(2026, 10, 2, 9, tzinfo=timezone.utc)),
+        complaint_row("c-e", student, datetime(2026, 10, 3, 9, tzinfo=timezone.utc)),
+    ])
+    return student
+
+
+async def test_listing_pages_newest_first_through_ties(client, make_user, complaints):
+    admin = await make_user("admin")
+
+    assert await listing_pages(client, admin, limit=2) == [["c-e", "c-d"], ["c-c", "c-b"], ["c-a"]]
+    assert await listing_pages(client, complaints, limit=2) == [["c-e", "c-c"], ["c-b", "c-a"]]
+
+
+async def test_listing_filters_combine(client, make_user, complaints):
+    admin = await make_user("admin")
+
+    assert await listing_pages(client, admin, status="pending", category="hygiene", limit=2) == [
+        ["c-e", "c-d"], ["c-a"]
+    ]
+    assert await listing_pages(client, complaints, **{"from": "2026-10-02", "to": "2026-10-02"}) == [["c-c", "c-b"]]
+
+
+async def test_listing_rejects_unknown_filter_values(client, complaints):
+    response = await client.get("/api/complaints/", params={"status": "open"}, headers=auth(complaints))
+
+    assert response.status_code == 422
@@ -0,0 +1,68 @@
+import pytest
+
+from conftest import auth
+from events import Subscription, event_hub
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def subscribe():
+    subscriptions = []
+
+    def subscribe(user):
+        subscription = event_hub.subscribe(user["id"], user["role"])
+        subscriptions.append(subscription)
+        return subscription
+    yield subscribe
+    for subscription in subscriptions:
+        event_hub.unsubscribe(subscription)
+
+
+async def drain(subscription):
+    events = []
+    while (event := await subscription.next(timeout=0)) is not None:
+        events.append((event["type"], event["data"]))
+    return events
+
+
+async def test_payments_reach_the_paid_vendor_and_admins_only(client, make_user, subscribe):
+    student = await make_user("student", wallet_balance=100.0)
+    vendor, other_vendor, admin = await make_user("vendor"), await make_user("vendor"), await make_user("admin")
+    feeds = [subscribe(user) for user in (vendor, other_vendor, admin, student)]
+
+    response = await client.post("/api/wallet/pay", json={"vendor_id": vendor["id"], "amount": 30.0}, headers=auth(student))
+
+    vendor_feed, other_vendor_feed, admin_feed, student_feed = [await drain(feed) for feed in feeds]
+    assert vendor_feed == admin_feed
+    assert other_vendor_feed == student_feed == []
+    [(event_type, data)] = vendor_feed
+    assert event_type == "payment"
+    assert data == {
+        "transaction_id": response.json()["transaction_id"], "student_id": student["id"],
+        "vendor_id": vendor["id"], "amount": 30.0, "timestamp": data["timestamp"],
+    }
+
+async def test_selection_changes_carry_headcount_deltas(client, make_user, make_meal, subscribe):
+    student, vendor = await make_user("student"), await make_user("vendor")
+    meal = await make_meal("2026-11-02")
+    kitchen = subscribe(vendor)
+
+    await client.post(f"/api/meals/{meal['id']}/select", params={"status": "skipped"}, headers=auth(student))
+    await client.post(f"/api/meals/{meal['id']}/select", params={"status": "skipped"}, headers=auth(student))
+
+    assert await drain(kitchen) == [("selection", {"user_id": student["id"], "changes": [{
+        "meal_id": meal["id"], "date": "2026-11-02", "type": "lunch", "previous_status": None, "status": "skipped",
+        "headcount_delta": {"attending_count": 0, "skipped_count": 1},
+    }]})]
+
+
+async def test_a_full_subscription_drops_its_oldest_events():
+    subscription = Subscription("user-1", "admin", max_events=2)
+    event = {"audience": {"roles": ["admin"]}}
+
+    assert [subscription.push({**event, "n": n}) for n in range(3)] == [False, False, True]
+
+    assert [(await subscription.next(timeout=0))["n"], (await subscription.next(timeout=0))["n"]] == [1, 2]
+    assert subscription.dropped == 1
+    assert await subscription.next(timeout=0.01) is None
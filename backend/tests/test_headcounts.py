@@ -0,0 +1,78 @@
+import pytest
+
+from conftest import auth
+from counters import rebuild_headcounts
+
+pytestmark = pytest.mark.anyio
+
+
+async def create_meal(client, admin, date, type="lunch"):
+    response = await client.post(
+        "/api/meals/", json={"date": date, "type": type, "menu_items": ["Rice"], "price": 40.0}, headers=auth(admin)
+    )
+    return response.json()
+
+
+async def select(client, user, meal, status):
+    return await client.post(f"/api/meals/{meal['id']}/select", params={"status": status}, headers=auth(user))
+
+
+async def counts(client, user, meal):
+    body = (await client.get(f"/api/meals/{meal['id']}/headcount", headers=auth(user))).json()
+    return body["attending_count"], body["skipped_count"]
+
+
+async def test_headcounts_follow_every_selection_path(client, make_user):
+    admin = await make_user("admin")
+    vendor = await make_user("vendor")
+    paying, broke = await make_user("student", wallet_balance=100.0), await make_user("student")
+    meal = await create_meal(client, admin, "2026-11-02")
+
+    await select(client, paying, meal, "attending")
+    await select(client, broke, meal, "attending")
+    assert await counts(client, vendor, meal) == (2, 0)
+
+    await client.post("/api/meals/selections/bulk", headers=auth(paying), json=[
+        {"meal_id": meal["id"], "status": "skipped"},
+    ])
+    await select(client, broke, meal, "skipped")
+    assert await counts(client, vendor, meal) == (0, 2)
+
+    # Broke spent the skip credit; a re-join it cannot pay for never counts
+    await client.post("/api/wallet/pay", json={"vendor_id": vendor["id"], "amount": 40.0}, headers=auth(broke))
+    assert (await select(client, broke, meal, "attending")).status_code == 400
+    assert (await select(client, paying, meal, "attending")).status_code == 200
+    assert await counts(client, vendor, meal) == (1, 1)
+
+
+async def test_the_day_view_lists_slots_in_serving_order(client, make_user):
+    admin = await make_user("admin")
+    student = await make_user("student")
+    dinner = await create_meal(client, admin, "2026-11-02", "dinner")
+    breakfast = await create_meal(client, admin, "2026-11-02", "breakfast")
+    await create_meal(client, admin, "2026-11-03", "lunch")
+    await select(client, student, dinner, "attending")
+
+    response = await client.get("/api/meals/headcount", params={"from": "2026-11-02"}, headers=auth(admin))
+
+    assert [(meal["id"], meal["attending_count"]) for meal in response.json()] == [(breakfast["id"], 0), (dinner["id"], 1)]
+    assert (await client.get("/api/meals/headcount", headers=auth(student))).status_code == 403
+    assert (await client.get(
+        "/api/meals/headcount", params={"from": "2026-11-03", "to": "2026-11-02"}, headers=auth(admin)
+    )).status_code == 400
+
+
+async def test_rebuild_repairs_drifted_and_missing_headcounts(db, client, make_user, make_meal):
+    admin = await make_user("admin")
+    students = [await make_user("student") for _ in range(3)]
+    counted = await create_meal(client, admin, "2026-11-02")
+    legacy = await make_meal("2026-11-03")
+    for student, status in zip(students, ["attending", "attending", "skipped"]):
+        await select(client, student, counted, status)
+    await select(client, students[0], legacy, "skipped")
+    await db.meals.update_one({"id": counted["id"]}, {"$set": {"attending_count": 7}})
+
+    await rebuild_headcounts()
+
+    assert await counts(client, admin, counted) == (2, 1)
+    assert await counts(client, admin, legacy) == (0, 1)
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import idempotency
+from conftest import auth, balance
+from idempotency import idempotent
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_same_key_pays_once(db, client, make_user):
+    student = await make_user("student", wallet_balance=100.0)
+    vendor = await make_user("vendor")
+    headers = {**auth(student), "Idempotency-Key": "lunch-1"}
+
+    responses = await asyncio.gather(*(
+        client.post("/api/wallet/pay", json={"vendor_id": vendor["id"], "amount": 30.0}, headers=headers)
+        for _ in range(4)
+    ))
+
+    assert [response.status_code for response in responses] == [200] * 4
+    assert len({response.json()["transaction_id"] for response in responses}) == 1
+    assert sum(response.headers.get("Idempotent-Replayed") == "true" for response in responses) == 3
+    assert await balance(db, student) == pytest.approx(70.0)
+    assert await db.transactions.count_documents({}) == 1
+
+
+async def test_key_reused_with_another_payload_is_rejected(db, client, make_user):
+    student = await make_user("student", wallet_balance=100.0)
+    vendor = await make_user("vendor")
+    headers = {**auth(student), "Idempotency-Key": "lunch-1"}
+
+    await client.post("/api/wallet/pay", json={"vendor_id": vendor["id"], "amount": 30.0}, headers=headers)
+    response = await client.post("/api/wallet/pay", json={"vendor_id": vendor["id"], "amount": 31.0}, headers=headers)
+
+    assert response.status_code == 422
+    assert await balance(db, student) == pytest.approx(70.0)
+
+
+async def test_failed_attempt_releases_the_key_for_waiters(db, monkeypatch):
+    collection_type = type(db.idempotency_keys)
+    delete_one = collection_type.delete_one
+
+    async def slow_delete_one(self, *args, **kwargs):
+        # Give waiters time to spin if the failed attempt still held its slot
+        await asyncio.sleep(0.05)
+        return await delete_one(self, *args, **kwargs)
+
+    monkeypatch.setattr(collection_type, "delete_one", slow_delete_one)
+    waited = idempotency.idempotency_stats["waited"]
+    calls = []
+
+    async def handler():
+        calls.append(None)
+        await asyncio.sleep(0.01)
+        if len(calls) == 1:
+            raise HTTPException(status_code=503, detail="try again")
+        return {"attempt": len(calls)}
+
+    results = await asyncio.wait_for(asyncio.gather(
+        *(idempotent("user-1", "test", "key-1", {}, handler) for _ in range(3)), return_exceptions=True
+    ), timeout=5)
+
+    assert isinstance(results[0], HTTPException)
+    assert results[1] == {"attempt": 2}
+    assert results[2].body == b'{"attempt":2}'
+    assert len(calls) == 2
+    # Both waiters wait on the failed attempt once; the retry waits for its
+    # pending claim to be deleted and the other waiter waits on the retry
+    assert idempotency.idempotency_stats["waited"] - waited == 4
+    assert idempotency._in_flight == {}
+
+
+async def test_cached_responses_expire_with_the_key(db, monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_TTL_SECONDS", 0)
+    calls = []
+
+    async def handler():
+        calls.append(None)
+        return {"attempt": len(calls)}
+
+    assert await idempotent("user-1", "test", "key-1", {}, handler) == {"attempt": 1}
+    # What Mongo's TTL monitor does once expires_at has passed
+    await db.idempotency_keys.delete_many({})
+
+    assert await idempotent("user-1", "test", "key-1", {}, handler) == {"attempt": 2}
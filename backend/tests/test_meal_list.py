@@ -0,0 +1,36 @@
+import pytest
+
+from conftest import auth
+from meal_cache import meal_list_stats
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_an_unchanged_meal_list_is_served_from_cache_and_revalidates(client, make_meal):
+    await make_meal("2026-11-02")
+    first = await client.get("/api/meals/")
+    misses, hits = meal_list_stats["misses"], meal_list_stats["hits"]
+
+    again = await client.get("/api/meals/")
+    revalidated = await client.get("/api/meals/", headers={"If-None-Match": first.headers["etag"]})
+
+    assert [meal["date"] for meal in first.json()] == ["2026-11-02"]
+    assert again.content == first.content
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == first.headers["etag"]
+    assert (meal_list_stats["misses"] - misses, meal_list_stats["hits"] - hits) == (0, 2)
+
+
+async def test_creating_a_meal_changes_the_list_and_its_etag(client, make_user):
+    admin = await make_user("admin")
+    before = await client.get("/api/meals/")
+
+    created = await client.post("/api/meals/", headers=auth(admin), json={
+        "date": "2026-11-03", "type": "dinner", "menu_items": ["Roti"], "price": 45.0,
+    })
+    after = await client.get("/api/meals/", headers={"If-None-Match": before.headers["etag"]})
+
+    assert created.status_code == 200
+    assert after.status_code == 200
+    assert after.headers["etag"] != before.headers["etag"]
+    assert [meal["id"] for meal in after.json()] == [created.json()["id"]]
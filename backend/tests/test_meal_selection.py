@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from conftest import auth, balance
+
+pytestmark = pytest.mark.anyio
+
+
+async def select(client, user, meal, status):
+    return await client.post(f"/api/meals/{meal['id']}/select", params={"status": status}, headers=auth(user))
+
+
+async def test_skip_credits_and_rejoin_debits_the_meal_price(db, client, make_user, make_meal):
+    student = await make_user("student", wallet_balance=10.0)
+    meal = await make_meal("2026-11-02", price=40.0)
+
+    assert (await select(client, student, meal, "skipped")).status_code == 200
+    assert await balance(db, student) == pytest.approx(50.0)
+    # Skipping again is a no-op, not a second credit
+    assert (await select(client, student, meal, "skipped")).status_code == 200
+    assert await balance(db, student) == pytest.approx(50.0)
+
+    assert (await select(client, student, meal, "attending")).status_code == 200
+    assert await balance(db, student) == pytest.approx(10.0)
+
+    ledger = await db.transactions.find({}, {"_id": 0}).to_list(None)
+    assert sorted((tx["type"], tx["sender_id"], tx["receiver_id"], tx["amount"]) for tx in ledger) == [
+        ("admin_adjustment", student["id"], "SYSTEM", 40.0),
+        ("skip_credit", "SYSTEM", student["id"], 40.0),
+    ]
+    skips = await db.monthly_rollups.find_one({"month": "2026-11", "metric": "skips"})
+    assert skips["value"] == 0
+
+
+async def test_concurrent_skips_credit_once(db, client, make_user, make_meal):
+    student = await make_user("student")
+    meal = await make_meal("2026-11-02", price=40.0)
+
+    responses = await asyncio.gather(*(select(client, student, meal, "skipped") for _ in range(5)))
+
+    assert all(response.status_code == 200 for response in responses)
+    assert await balance(db, student) == pytest.approx(40.0)
+    assert await db.transactions.count_documents({"type": "skip_credit"}) == 1
+    assert await db.meal_selections.count_documents({"user_id": student["id"]}) == 1
+
+
+async def test_rejoin_without_credits_keeps_the_skip(db, client, make_user, make_meal):
+    student = await make_user("student")
+    meal = await make_meal("2026-11-02", price=40.0)
+    await select(client, student, meal, "skipped")
+    await db.users.update_one({"id": student["id"]}, {"$set": {"wallet_balance": 15.0}})
+
+    response = await select(client, student, meal, "attending")
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Insufficient credits to re-join meal"}
+    assert await balance(db, student) == pytest.approx(15.0)
+    selection = await db.meal_selections.find_one({"user_id": student["id"], "meal_id": meal["id"]})
+    assert selection["status"] == "skipped"
+    assert await db.transactions.count_documents({"type": "admin_adjustment"}) == 0
+
+
+async def test_a_skip_during_a_failed_rejoin_is_not_credited_twice(db, client, make_user, make_meal, monkeypatch):
+    student = await make_user("student")
+    meal = await make_meal("2026-11-02", price=40.0)
+    await select(client, student, meal, "skipped")
+    await db.users.update_one({"id": student["id"]}, {"$set": {"wallet_balance": 15.0}})
+
+    collection_type = type(db.users)
+    find_one_and_update = collection_type.find_one_and_update
+    concurrent = []
+
+    async def skip_during_debit(self, *args, **kwargs):
+        if self.name == "users" and not concurrent:
+            # Another device skips again while the re-join's debit is in flight
+            concurrent.append(await select(client, student, meal, "skipped"))
+        return await find_one_and_update(self, *args, **kwargs)
+
+    monkeypatch.setattr(collection_type, "find_one_and_update", skip_during_debit)
+
+    response = await select(client, student, meal, "attending")
+
+    assert response.status_code == 400
+    assert concurrent[0].status_code == 200
+    assert await balance(db, student) == pytest.approx(15.0)
+    assert await db.transactions.count_documents({"type": "skip_credit"}) == 1
+    selection = await db.meal_selections.find_one({"user_id": student["id"], "meal_id": meal["id"]})
+    assert selection["status"] == "skipped"
+
+
+async def test_a_rejoin_that_loses_the_race_is_refunded(db, client, make_user, make_meal, monkeypatch):
+    student = await make_user("student")
+    meal = await make_meal("2026-11-02", price=40.0)
+    await select(client, student, meal, "skipped")
+
+    collection_type = type(db.users)
+    find_one_and_update = collection_type.find_one_and_update
+
+    async def rejoin_elsewhere(self, *args, **kwargs):
+        result = await find_one_and_update(self, *args, **kwargs)
+        if self.name == "users":
+            # Another device re-joined between our debit and our write
+            await db.meal_selections.update_one({"meal_id": meal["id"]}, {"$set": {"status": "attending"}})
+        return result
+
+    monkeypatch.setattr(collection_type, "find_one_and_update", rejoin_elsewhere)
+
+    response = await select(client, student, meal, "attending")
+
+    assert response.status_code == 200
+    assert await balance(db, student) == pytest.approx(40.0)
+    assert await db.transactions.count_documents({"type": "admin_adjustment"}) == 0
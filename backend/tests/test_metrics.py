@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import pytest
+
+import metrics
+import server
+from conftest import auth
+from metrics import Histogram, RequestStats
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_requests_are_labelled_by_route_template(client, make_user):
+    student, admin = await make_user("student"), await make_user("admin")
+    labels = ("GET", "/api/meals/{meal_id}/headcount", 403)
+    before = metrics.http_requests.values.get(labels, 0)
+
+    for meal_id in ("meal-1", "meal-2"):
+        await client.get(f"/api/meals/{meal_id}/headcount", headers=auth(student))
+    response = await client.get("/api/metrics", headers=auth(admin))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert metrics.http_requests.values[labels] - before == 2
+    assert 'credeat_http_requests_total{method="GET",route="/api/meals/{meal_id}/headcount",status="403"}' in response.text
+    assert not any("meal-1" in line for line in response.text.splitlines())
+
+
+async def test_metrics_need_the_scrape_token_or_an_admin(client, make_user, monkeypatch):
+    monkeypatch.setattr(server, "METRICS_TOKEN", "scrape-secret")
+    student, admin = await make_user("student"), await make_user("admin")
+
+    statuses = [
+        (await client.get("/api/metrics", headers=headers)).status_code
+        for headers in ({}, {"Authorization": "Bearer wrong"}, auth(student),
+                        {"Authorization": "Bearer scrape-secret"}, auth(admin))
+    ]
+
+    assert statuses == [401, 401, 403, 200, 200]
+
+
+def test_histograms_render_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(("/a",), seconds)
+
+    lines = []
+    histogram.render(lines)
+
+    assert lines[2:] == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 3.65',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_mongo_commands_are_charged_to_the_current_request():
+    stats = RequestStats()
+    token = metrics._current_request.set(stats)
+    try:
+        for request_id, command in enumerate([{"find": "users"}, {"find": "users"}, {"ping": 1}]):
+            name = next(iter(command))
+            metrics.command_listener.started(SimpleNamespace(command=command, command_name=name, request_id=request_id))
+            metrics.command_listener.succeeded(
+                SimpleNamespace(command_name=name, request_id=request_id, duration_micros=2000)
+            )
+    finally:
+        metrics._current_request.reset(token)
+
+    assert stats.commands == 3
+    assert stats.seconds == pytest.approx(0.006)
+    assert {label: count for label, (count, _) in stats.breakdown.items()} == {"find users": 2, "ping": 1}
@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from migrate_timestamps import MIGRATION_ID, migrate_timestamps
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_string_timestamps_become_dates_once(db, make_meal):
+    meal = await make_meal("2026-11-02")
+    await db.meals.update_one({"id": meal["id"]}, {"$set": {"created_at": "2026-10-01T08:30:00+00:00"}})
+    await db.transactions.insert_many([
+        {"id": "tx-legacy", "timestamp": "2026-10-01T12:00:00.123000+00:00"},
+        {"id": "tx-naive", "timestamp": "2026-10-01T12:00:00"},
+        {"id": "tx-garbled", "timestamp": "yesterday"},
+        {"id": "tx-native", "timestamp": datetime(2026, 10, 2, tzinfo=timezone.utc)},
+    ])
+
+    await migrate_timestamps(batch_size=2)
+
+    timestamps = {tx["id"]: tx["timestamp"] async for tx in db.transactions.find()}
+    assert timestamps == {
+        "tx-legacy": datetime(2026, 10, 1, 12, 0, 0, 123000, tzinfo=timezone.utc),
+        "tx-naive": datetime(2026, 10, 1, 12, tzinfo=timezone.utc),
+        "tx-garbled": "yesterday",
+        "tx-native": datetime(2026, 10, 2, tzinfo=timezone.utc),
+    }
+    stored_meal = await db.meals.find_one({"id": meal["id"]})
+    assert stored_meal["date"] == "2026-11-02"
+    assert stored_meal["created_at"] == datetime(2026, 10, 1, 8, 30, tzinfo=timezone.utc)
+
+    progress = (await db.migrations.find_one({"_id": MIGRATION_ID}))["fields"]["transactions"]["timestamp"]
+    assert (progress["converted"], progress["unparseable"], progress["done"]) == (2, 1, True)
+
+
+async def test_a_finished_field_is_not_rescanned(db, capsys):
+    await migrate_timestamps()
+    await db.transactions.insert_one({"id": "tx-late", "timestamp": "2026-10-01T12:00:00+00:00"})
+
+    await migrate_timestamps()
+    assert "transactions.timestamp: already done" in capsys.readouterr().out
+    assert (await db.transactions.find_one({"id": "tx-late"}))["timestamp"] == "2026-10-01T12:00:00+00:00"
+
+    await migrate_timestamps(restart=True)
+    assert (await db.transactions.find_one({"id": "tx-late"}))["timestamp"] == datetime(
+        2026, 10, 1, 12, tzinfo=timezone.utc
+    )
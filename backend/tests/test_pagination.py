@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from conftest import auth
+from models import Transaction
+
+pytestmark = pytest.mark.anyio
+
+
+def at(day, hour=12):
+    return datetime(2026, 10, day, hour, tzinfo=timezone.utc)
+
+
+def ledger_row(id, sender_id, receiver_id, timestamp):
+    tx = Transaction(id=id, sender_id=sender_id, receiver_id=receiver_id, amount=1.0, type="vendor_payment", description="Tea")
+    return {**tx.model_dump(), "timestamp": timestamp}
+
+
+async def pages(client, user, path, key, **params):
+    rows, cursor = [], None
+    while True:
+        response = await client.get(path, params={**params, **({"cursor": cursor} if cursor else {})}, headers=auth(user))
+        assert response.status_code == 200
+        body = response.json()
+        rows.append([row["id"] for row in body[key]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return rows
+
+
+async def test_wallet_history_pages_through_ties_once_each(db, client, make_user):
+    student = await make_user("student")
+    vendor = await make_user("vendor")
+    # Three rows share a timestamp; sent and received rows interleave
+    await db.transactions.insert_many([
+        ledger_row("tx-a", student["id"], vendor["id"], at(1)),
+        ledger_row("tx-b", "SYSTEM", student["id"], at(2)),
+        ledger_row("tx-c", student["id"], vendor["id"], at(2)),
+        ledger_row("tx-d", student["id"], "SYSTEM", at(2)),
+        ledger_row("tx-e", "SYSTEM", student["id"], at(3)),
+        ledger_row("tx-x", "SYSTEM", vendor["id"], at(4)),
+    ])
+
+    assert await pages(client, student, "/api/wallet/", "transactions", limit=2) == [
+        ["tx-e", "tx-d"], ["tx-c", "tx-b"], ["tx-a"]
+    ]
+
+
+async def test_legacy_string_rows_page_after_native_dates(db, client, make_user):
+    student = await make_user("student")
+    vendor = await make_user("vendor")
+    # Rows written before the migration still carry ISO strings
+    await db.transactions.insert_many([
+        ledger_row("tx-old-a", student["id"], vendor["id"], "2026-09-01T12:00:00+00:00"),
+        ledger_row("tx-old-b", student["id"], vendor["id"], "2026-09-02T12:00:00+00:00"),
+        ledger_row("tx-new-a", student["id"], vendor["id"], at(1)),
+        ledger_row("tx-new-b", student["id"], vendor["id"], at(2)),
+    ])
+
+    assert await pages(client, student, "/api/wallet/", "transactions", limit=3) == [
+        ["tx-new-b", "tx-new-a", "tx-old-b"], ["tx-old-a"]
+    ]
+
+
+async def test_a_malformed_cursor_is_rejected(client, make_user):
+    student = await make_user("student")
+
+    response = await client.get("/api/wallet/", params={"cursor": "not-a-cursor"}, headers=auth(student))
+
+    assert response.status_code == 400
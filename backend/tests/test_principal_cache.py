@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+import pytest
+
+from auth_utils import create_access_token, create_user_token
+from conftest import auth
+from principal_cache import PrincipalCache, principal_cache
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_repeat_requests_reuse_the_cached_principal(client, make_user, mongo_calls):
+    student = await make_user("student")
+    calls = mongo_calls("find_one")
+    hits, misses = principal_cache.hits, principal_cache.misses
+
+    for _ in range(3):
+        response = await client.get("/api/auth/me", headers=auth(student))
+        assert response.json()["id"] == student["id"]
+
+    assert [call for call in calls if call[0] == "users"] == [
+        ("users", "find_one", ({"id": student["id"]}, {"_id": 0, "hashed_password": 0}))
+    ]
+    assert (principal_cache.hits - hits, principal_cache.misses - misses) == (2, 1)
+
+
+async def test_payment_invalidates_both_principals(client, make_user):
+    student = await make_user("student", wallet_balance=100.0)
+    vendor = await make_user("vendor")
+    for user in (student, vendor):
+        await client.get("/api/auth/me", headers=auth(user))
+
+    response = await client.post("/api/wallet/pay", json={"vendor_id": vendor["id"], "amount": 30.0}, headers=auth(student))
+    assert response.status_code == 200
+
+    assert (await client.get("/api/auth/me", headers=auth(student))).json()["wallet_balance"] == 70.0
+    assert (await client.get("/api/auth/me", headers=auth(vendor))).json()["wallet_balance"] == 30.0
+
+
+async def test_logout_revokes_cached_tokens(client, make_user):
+    student = await make_user("student")
+    assert (await client.get("/api/auth/me", headers=auth(student))).status_code == 200
+
+    assert (await client.post("/api/auth/logout", headers=auth(student))).status_code == 200
+
+    assert (await client.get("/api/auth/me", headers=auth(student))).status_code == 401
+    fresh = {"Authorization": f"Bearer {create_user_token({**student, 'token_version': 1})}"}
+    assert (await client.get("/api/auth/me", headers=fresh)).status_code == 200
+
+
+async def test_tokens_without_a_user_id_still_resolve_by_email(client, make_user):
+    student = await make_user("student")
+    legacy = create_access_token({"sub": student["email"], "role": "student"}, timedelta(minutes=5))
+
+    response = await client.get("/api/auth/me", headers={"Authorization": f"Bearer {legacy}"})
+
+    assert response.json()["id"] == student["id"]
+
+
+async def test_a_wrong_role_claim_is_refused_without_a_lookup(client, make_user, mongo_calls):
+    student = await make_user("student")
+    calls = mongo_calls("find_one")
+
+    response = await client.get("/api/meals/headcount", headers=auth(student))
+
+    assert response.status_code == 403
+    assert [call for call in calls if call[0] == "users"] == []
+
+
+def test_entries_expire_and_the_oldest_is_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("principal_cache.time.monotonic", lambda: now[0])
+    cache = PrincipalCache(ttl_seconds=30, max_entries=2)
+
+    class User:
+        def __init__(self, id):
+            self.id = id
+
+    for subject in ("a", "b", "c"):
+        cache.set(subject, User(subject))
+    assert (cache.get("a"), cache.evictions) == (None, 1)
+    assert cache.get("b").id == "b"
+
+    now[0] += 31
+    assert cache.get("c") is None
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from reconciliation import POSITION_ID, reconcile
+
+pytestmark = pytest.mark.anyio
+
+
+def ledger_row(id, sender_id, receiver_id, amount, type="vendor_payment", description="Lunch", minutes_ago=60):
+    return {
+        "id": id, "sender_id": sender_id, "receiver_id": receiver_id, "amount": amount, "type": type,
+        "description": description, "timestamp": datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)
+    }
+
+
+async def test_drift_is_confirmed_on_the_second_run(db, make_user):
+    student = await make_user("student", wallet_balance=45.0)
+    await db.transactions.insert_one(ledger_row("tx-1", "SYSTEM", student["id"], 40.0, type="skip_credit"))
+
+    first = await reconcile(lag_seconds=0)
+    assert (first["accounts_checked"], first["accounts_drifted"], first["drifted"]) == (1, 0, [])
+    checkpoint = await db.balance_checkpoints.find_one({"_id": student["id"]})
+    assert (checkpoint["drift"], checkpoint["drift_confirmed"]) == (5.0, False)
+
+    second = await reconcile(lag_seconds=0)
+    assert second["accounts_drifted"] == 1
+    assert second["drifted"] == [
+        {"account": student["id"], "wallet_balance": 45.0, "ledger_balance": 40.0, "drift": 5.0}
+    ]
+    checkpoint = await db.balance_checkpoints.find_one({"_id": student["id"]})
+    assert checkpoint["drift_confirmed"] is True
+
+
+async def test_drift_that_catches_up_is_cleared(db, make_user):
+    # The wallet moved before the ledger row was written
+    student = await make_user("student", wallet_balance=40.0)
+    assert (await reconcile(lag_seconds=0))["accounts_drifted"] == 0
+
+    await db.transactions.insert_one(ledger_row("tx-1", "SYSTEM", student["id"], 40.0, type="skip_credit"))
+    result = await reconcile(lag_seconds=0)
+
+    assert result["accounts_drifted"] == 0
+    checkpoint = await db.balance_checkpoints.find_one({"_id": student["id"]})
+    assert "drift" not in checkpoint
+
+
+async def test_runs_continue_from_the_saved_position(db, make_user):
+    student = await make_user("student", wallet_balance=5.0)
+    vendor = await make_user("vendor", wallet_balance=35.0)
+    await db.transactions.insert_many([
+        ledger_row("tx-1", "SYSTEM", student["id"], 40.0, type="skip_credit", minutes_ago=90),
+        ledger_row("tx-2", student["id"], vendor["id"], 35.0, minutes_ago=80),
+    ])
+    assert (await reconcile(lag_seconds=0, batch_size=1))["transactions_processed"] == 2
+
+    # A re-join recorded the old way: SYSTEM -> user, but a debit
+    await db.transactions.insert_one(ledger_row(
+        "tx-3", "SYSTEM", student["id"], 5.0, type="admin_adjustment", description="Spent credits", minutes_ago=70
+    ))
+    await db.users.update_one({"id": student["id"]}, {"$set": {"wallet_balance": 0.0}})
+    result = await reconcile(lag_seconds=0, batch_size=1)
+
+    assert (result["transactions_processed"], result["accounts_drifted"]) == (1, 0)
+    checkpoints = {doc["_id"]: doc async for doc in db.balance_checkpoints.find({})}
+    assert checkpoints[student["id"]]["balance"] == pytest.approx(0.0)
+    assert checkpoints[student["id"]]["transactions"] == 3
+    assert checkpoints[vendor["id"]]["balance"] == pytest.approx(35.0)
+    assert checkpoints[POSITION_ID]["processed"] == 3
+    assert checkpoints[POSITION_ID]["last_id"] == "tx-3"
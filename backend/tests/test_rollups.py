@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from conftest import auth
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_monthly_stats_come_from_the_maintained_rollups(db, client, make_user, make_meal):
+    admin = await make_user("admin")
+    student = await make_user("student", wallet_balance=100.0)
+    vendor = await make_user("vendor")
+    month = datetime.now(timezone.utc).strftime("%Y-%m")
+    meal = await make_meal(f"{month}-01", price=40.0)
+
+    for category in ("hygiene", "quality"):
+        await client.post(
+            "/api/complaints/", data={"category": category, "description": "Cold food"}, headers=auth(student)
+        )
+    await client.post(f"/api/meals/{meal['id']}/select", params={"status": "skipped"}, headers=auth(student))
+    await client.post("/api/wallet/pay", json={"vendor_id": vendor["id"], "amount": 25.0}, headers=auth(student))
+
+    response = await client.get("/api/analytics/monthly", params={"months": 2}, headers=auth(admin))
+
+    previous, current = response.json()
+    assert current["month"] == month
+    assert {key: current[key] for key in (
+        "complaints", "hygiene_complaints", "skips", "food_saved_kg", "transactions", "transaction_volume"
+    )} == {
+        "complaints": 2,
+        "hygiene_complaints": 1,
+        "skips": 1,
+        "food_saved_kg": 0.3,
+        "transactions": 2,  # the skip credit and the payment
+        "transaction_volume": 65.0,
+    }
+    assert (previous["complaints"], previous["transactions"]) == (0, 0)
+
+
+async def test_rejoining_takes_the_skip_back_out(db, client, make_user, make_meal):
+    student = await make_user("student")
+    meal = await make_meal("2026-11-02", price=40.0)
+
+    for status in ("skipped", "attending"):
+        await client.post(f"/api/meals/{meal['id']}/select", params={"status": status}, headers=auth(student))
+
+    skips = await db.monthly_rollups.find_one({"month": "2026-11", "metric": "skips"})
+    assert skips["value"] == 0
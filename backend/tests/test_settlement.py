@@ -0,0 +1,110 @@
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+
+import settlement
+from conftest import balance
+from settlement import period_id, settle_vendors, settlement_key
+
+pytestmark = pytest.mark.anyio
+
+END = datetime.now(timezone.utc).date() - timedelta(days=2)
+START = END - timedelta(days=6)
+PERIOD = period_id(START, END)
+
+
+async def pay(db, student, vendor, amount, day=START):
+    await db.transactions.insert_one({
+        "id": f"pay-{await db.transactions.count_documents({})}", "sender_id": student["id"],
+        "receiver_id": vendor["id"], "amount": amount, "type": "vendor_payment", "description": "Lunch",
+        "timestamp": datetime.combine(day, time(12), timezone.utc)
+    })
+
+
+async def settle():
+    return [record async for record in settle_vendors(START, END, batch_size=1)]
+
+
+async def test_each_vendor_is_paid_out_once(db, make_user):
+    student = await make_user("student")
+    canteen = await make_user("vendor", wallet_balance=70.0)
+    juice_bar = await make_user("vendor", wallet_balance=10.0)  # withdrew part of it already
+    await pay(db, student, canteen, 50.0)
+    await pay(db, student, canteen, 20.0, day=END)
+    await pay(db, student, juice_bar, 25.0)
+    await pay(db, student, canteen, 99.0, day=END + timedelta(days=1))  # next period
+
+    records = {record["vendor_id"]: record for record in await settle()}
+
+    assert (records[canteen["id"]]["status"], records[canteen["id"]]["gross"], records[canteen["id"]]["payout"]) == (
+        "settled", 70.0, 70.0
+    )
+    assert (records[juice_bar["id"]]["gross"], records[juice_bar["id"]]["payout"]) == (25.0, 10.0)
+    assert await balance(db, canteen) == pytest.approx(0.0)
+    assert await balance(db, juice_bar) == pytest.approx(0.0)
+    withdrawals = await db.transactions.find({"type": "withdrawal"}, {"_id": 0}).to_list(None)
+    assert sorted(tx["amount"] for tx in withdrawals) == [10.0, 70.0]
+
+    # Running the period again reports the same settlements and pays nothing
+    await db.users.update_one({"id": canteen["id"]}, {"$set": {"wallet_balance": 99.0}})
+    again = {record["vendor_id"]: record for record in await settle()}
+    assert again[canteen["id"]]["transaction_id"] == records[canteen["id"]]["transaction_id"]
+    assert await balance(db, canteen) == pytest.approx(99.0)
+    assert await db.transactions.count_documents({"type": "withdrawal"}) == 2
+
+
+async def test_interrupted_run_resumes_without_debiting_twice(db, make_user, monkeypatch):
+    student = await make_user("student")
+    vendor = await make_user("vendor", wallet_balance=60.0)
+    await pay(db, student, vendor, 60.0)
+
+    async def crash(entries):
+        raise RuntimeError("worker killed")
+
+    monkeypatch.setattr(settlement, "_insert_ledger_entries", crash)
+    with pytest.raises(RuntimeError):
+        await settle()
+
+    # The debit landed and the marker on the vendor says so; nothing else did
+    key = settlement_key(vendor["id"], PERIOD)
+    user = await db.users.find_one({"id": vendor["id"]})
+    assert (user["wallet_balance"], user["last_settlement_id"]) == (0.0, key)
+    pending = await db.settlements.find_one({"id": key})
+    assert (pending["status"], pending["payout"]) == ("pending", 60.0)
+    assert await db.transactions.count_documents({"type": "withdrawal"}) == 0
+
+    monkeypatch.undo()
+    [record] = await settle()
+
+    assert (record["status"], record["payout"]) == ("settled", 60.0)
+    assert await balance(db, vendor) == pytest.approx(0.0)
+    assert await db.transactions.count_documents({"type": "withdrawal", "amount": 60.0}) == 1
+
+
+async def test_an_unfinished_period_blocks_the_next_one(db, make_user):
+    await db.settlements.insert_one({"id": "older", "vendor_id": "v", "period": "2026-01-01..2026-01-07", "status": "pending"})
+
+    with pytest.raises(ValueError, match="2026-01-01..2026-01-07 is unfinished"):
+        await settle()
+    with pytest.raises(ValueError, match="ended before today"):
+        await settlement.check_period(START, datetime.now(timezone.utc).date())
+
+
+async def test_an_overlapping_period_is_refused(db, make_user):
+    student = await make_user("student")
+    vendor = await make_user("vendor", wallet_balance=50.0)
+    await pay(db, student, vendor, 50.0, day=END)
+    await settle()
+    await db.settlements.insert_one({
+        "id": "gone", "vendor_id": "deleted-vendor", "period": "x", "status": "unknown_vendor",
+        "start": (END + timedelta(days=1)).isoformat(), "end": (END + timedelta(days=1)).isoformat(),
+    })
+
+    with pytest.raises(ValueError, match=f"overlaps settlement {PERIOD} of vendor {vendor['id']}"):
+        await settlement.check_period(START - timedelta(days=3), START)
+    with pytest.raises(ValueError, match="overlaps"):
+        await settlement.check_period(END, END + timedelta(days=1))
+    # The next period starts where this one ended; a failed record does not block
+    await settlement.check_period(END + timedelta(days=1), END + timedelta(days=1))
+    stored = await db.settlements.find_one({"vendor_id": vendor["id"]})
+    assert (stored["start"], stored["end"]) == (START.isoformat(), END.isoformat())
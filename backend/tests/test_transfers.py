@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import database
+import transfers
+from conftest import auth, balance
+from transfers import transfer
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_payments_never_overdraw(db, make_user):
+    student = await make_user("student", wallet_balance=100.0)
+    vendor = await make_user("vendor")
+
+    results = await asyncio.gather(
+        *(transfer(student["id"], vendor["id"], 30.0, "vendor_payment", "Lunch") for _ in range(10)),
+        return_exceptions=True
+    )
+
+    paid = [result for result in results if not isinstance(result, Exception)]
+    refused = [result for result in results if isinstance(result, HTTPException)]
+    assert len(paid) == 3
+    assert len(refused) == 7
+    assert all(error.status_code == 400 for error in refused)
+    assert await balance(db, student) == pytest.approx(10.0)
+    assert await balance(db, vendor) == pytest.approx(90.0)
+    assert await db.transactions.count_documents({"type": "vendor_payment"}) == 3
+
+
+async def test_missing_recipient_refunds_the_sender(db, client, make_user):
+    student = await make_user("student", wallet_balance=100.0)
+
+    response = await client.post(
+        "/api/wallet/pay", json={"vendor_id": "no-such-vendor", "amount": 40.0}, headers=auth(student)
+    )
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Recipient not found"}
+    assert await balance(db, student) == pytest.approx(100.0)
+    assert await db.transactions.count_documents({}) == 0
+    assert await db.monthly_rollups.count_documents({}) == 0
+
+
+async def test_rollups_are_written_after_the_commit(db, make_user, monkeypatch):
+    student = await make_user("student", wallet_balance=100.0)
+    vendor = await make_user("vendor", full_name="Canteen")
+    events = []
+
+    class Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def with_transaction(self, callback):
+            result = await callback(None)
+            events.append("commit")
+            return result
+
+    class Client:
+        async def start_session(self):
+            return Session()
+
+    async def supports_transactions():
+        return True
+
+    record_transactions = transfers.record_transactions
+
+    async def record_after(transactions):
+        events.append("rollup")
+        await record_transactions(transactions)
+
+    monkeypatch.setattr(transfers, "supports_transactions", supports_transactions)
+    monkeypatch.setattr(transfers, "client", Client())
+    monkeypatch.setattr(transfers, "record_transactions", record_after)
+
+    tx = await transfer(student["id"], vendor["id"], 25.0, "vendor_payment", lambda v: f"Payment to {v['full_name']}")
+
+    assert events == ["commit", "rollup"]
+    assert tx.description == "Payment to Canteen"
+    month = tx.timestamp.strftime("%Y-%m")
+    rollups = {doc["metric"]: doc["value"] async for doc in db.monthly_rollups.find({"month": month})}
+    assert rollups == {"transactions": 1, "transaction_volume": 25.0}
+
+
+async def test_a_failed_transaction_probe_is_retried(monkeypatch, caplog):
+    answers = [ConnectionError("no primary yet"), {"setName": "rs0"}]
+    probes = []
+
+    class Admin:
+        async def command(self, name):
+            probes.append(name)
+            answer = answers.pop(0)
+            if isinstance(answer, Exception):
+                raise answer
+            return answer
+
+    monkeypatch.setattr(database, "client", type("Client", (), {"admin": Admin()})())
+    monkeypatch.setattr(database, "_transactions_supported", None)
+
+    assert await database.supports_transactions() is False
+    assert "no primary yet" in caplog.text
+    assert await database.supports_transactions() is True
+    assert await database.supports_transactions() is True
+    assert probes == ["hello", "hello"]
@@ -0,0 +1,66 @@
+import pytest
+
+from conftest import auth
+from counters import compute_wastage, read_wastage_counters, rebuild_wastage_counters
+
+pytestmark = pytest.mark.anyio
+
+
+async def create_meal(client, admin, date):
+    response = await client.post(
+        "/api/meals/", json={"date": date, "type": "lunch", "menu_items": ["Rice"], "price": 40.0}, headers=auth(admin)
+    )
+    return response.json()
+
+
+async def select(client, user, meal, status):
+    await client.post(f"/api/meals/{meal['id']}/select", params={"status": status}, headers=auth(user))
+
+
+async def test_toggles_keep_the_counters_in_step_with_the_history(client, make_user):
+    admin = await make_user("admin")
+    students = [await make_user("student", wallet_balance=100.0) for _ in range(3)]
+    await rebuild_wastage_counters()
+
+    monday = await create_meal(client, admin, "2026-11-02")
+    tuesday = await create_meal(client, admin, "2026-11-03")
+    for student in students:
+        await select(client, student, monday, "attending")
+    await select(client, students[0], monday, "skipped")
+    await select(client, students[1], tuesday, "skipped")
+    await select(client, students[1], tuesday, "attending")
+    await select(client, students[2], tuesday, "skipped")
+
+    assert await read_wastage_counters() == await compute_wastage()
+    assert await read_wastage_counters("2026-11-02", "2026-11-02") == await compute_wastage("2026-11-02", "2026-11-02")
+
+    response = await client.get("/api/analytics/wastage", params={"from": "2026-11-03"}, headers=auth(admin))
+    assert response.json() == {
+        "total_meals": 1,
+        "total_meals_served": 2,
+        "meals_skipped": 1,
+        "wastage_saved_kg": 0.3,
+        "participation_rate": 50.0,
+    }
+
+
+async def test_counters_are_not_used_until_built(db, make_user, make_meal):
+    assert await read_wastage_counters() is None
+
+    await make_meal("2026-11-02")
+    result = await rebuild_wastage_counters()
+
+    assert result == {"days": 1, "meals": 1, "selections": 0, "skipped": 0}
+    assert (await read_wastage_counters())["total_meals"] == 1
+
+
+async def test_the_date_range_is_validated(client, make_user):
+    admin = await make_user("admin")
+
+    statuses = [
+        (await client.get("/api/analytics/wastage", params=params, headers=auth(admin))).status_code
+        for params in ({"from": "2026-11-31"}, {"to": "next week"},
+                       {"from": "2026-11-03", "to": "2026-11-02"}, {"from": "2026-11-02", "to": "2026-11-03"})
+    ]
+
+    assert statuses == [422, 422, 400, 200]
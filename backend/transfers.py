@@ -0,0 +1,108 @@
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from database import db, client, supports_transactions
+from models import Transaction
+from principal_cache import principal_cache
+from rollups import record_transactions
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ledger counterparty for money entering/leaving the system (skip credits, withdrawals)
+SYSTEM_ACCOUNT = "SYSTEM"
+
+
+async def transfer(sender_id: str, receiver_id: str, amount: float, type: str, description):
+    """Move `amount` from sender to receiver and record it in the ledger.
+
+    The debit is a single conditional `find_one_and_update`, so a wallet can
+    never go below zero. On a replica set debit, credit and ledger insert
+    commit together; otherwise a failed credit/insert is compensated.
+    `description` may be a string or a callable taking the receiver document.
+    Returns the recorded Transaction.
+    """
+    if amount <= 0:
+        raise HTTPException(status_code=400, detail="Invalid amount")
+
+    if await supports_transactions():
+        async with await client.start_session() as session:
+            async def apply(s):
+                return await _apply_transfer(sender_id, receiver_id, amount, type, description, s)
+            tx = await session.with_transaction(apply)
+    else:
+        tx = await _apply_transfer_compensating(sender_id, receiver_id, amount, type, description)
+
+    principal_cache.invalidate_user_id(sender_id)
+    principal_cache.invalidate_user_id(receiver_id)
+    # Outside the transaction: the month's rollup document is a hot spot
+    await record_transactions([tx.model_dump()])
+    return tx
+
+
+async def _debit(sender_id, amount, session=None):
+    if sender_id == SYSTEM_ACCOUNT:
+        return
+    debited = await db.users.find_one_and_update(
+        {"id": sender_id, "wallet_balance": {"$gte": amount}},
+        {"$inc": {"wallet_balance": -amount}},
+        projection={"_id": 0, "id": 1},
+        session=session,
+    )
+    if debited is None:
+        raise HTTPException(status_code=400, detail="Insufficient funds")
+
+
+async def _credit(receiver_id, amount, session=None):
+    if receiver_id in (None, SYSTEM_ACCOUNT):
+        return None
+    receiver = await db.users.find_one_and_update(
+        {"id": receiver_id},
+        {"$inc": {"wallet_balance": amount}},
+        projection={"_id": 0, "id": 1, "full_name": 1, "role": 1},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+    if receiver is None:
+        raise HTTPException(status_code=404, detail="Recipient not found")
+    return receiver
+
+
+async def _record(sender_id, receiver_id, amount, type, description, receiver, session=None):
+    tx = Transaction(
+        sender_id=sender_id,
+        receiver_id=receiver_id,
+        amount=amount,
+        type=type,
+        description=description(receiver) if callable(description) else description
+    )
+    tx_dict = tx.model_dump()
+    await db.transactions.insert_one(tx_dict, session=session)
+    return tx
+
+
+async def _apply_transfer(sender_id, receiver_id, amount, type, description, session):
+    await _debit(sender_id, amount, session=session)
+    receiver = await _credit(receiver_id, amount, session=session)
+    return await _record(sender_id, receiver_id, amount, type, description, receiver, session=session)
+
+
+async def _apply_transfer_compensating(sender_id, receiver_id, amount, type, description):
+    await _debit(sender_id, amount)
+
+    credited = False
+    try:
+        receiver = await _credit(receiver_id, amount)
+        credited = receiver is not None
+        return await _record(sender_id, receiver_id, amount, type, description, receiver)
+    except BaseException:
+        # Undo in reverse order; the debit already happened so always refund it
+        try:
+            if credited:
+                await db.users.update_one({"id": receiver_id}, {"$inc": {"wallet_balance": -amount}})
+            if sender_id != SYSTEM_ACCOUNT:
+                await db.users.update_one({"id": sender_id}, {"$inc": {"wallet_balance": amount}})
+        except Exception:
+            logger.exception(
+                "Transfer compensation failed: sender=%s receiver=%s amount=%s", sender_id, receiver_id, amount
+            )
+        raise
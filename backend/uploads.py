@@ -0,0 +1,244 @@
+from fastapi import HTTPException, UploadFile
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from email.utils import formatdate, parsedate_to_datetime
+import anyio
+import asyncio
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+
+# Configuration
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "uploads")
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 5 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = 64 * 1024
+UPLOAD_FILE_MODE = 0o644
+# Room for the multipart boundaries and the other form fields next to the image
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# Extension is decided by the file's magic bytes, never the client filename
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+
+def _sniff_extension(head: bytes):
+    for signature, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _too_large():
+    return HTTPException(status_code=413, detail=f"Image exceeds {MAX_UPLOAD_BYTES} bytes")
+
+
+class UploadSizeLimit:
+    """Pure ASGI middleware refusing upload requests whose Content-Length is over the limit.
+
+    Runs before the form is parsed, so an oversized body is never spooled.
+    Chunked requests carry no length and are checked by store_image instead.
+    """
+
+    def __init__(self, app, paths):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in self.paths:
+            length = Headers(scope=scope).get("content-length", "")
+            if length.isdigit() and int(length) > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES:
+                response = JSONResponse({"detail": _too_large().detail}, status_code=413)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+def _publish(tmp_path: str, final_path: str) -> bool:
+    """Move the finished upload into place; returns False if the content was already stored."""
+    if os.path.exists(final_path):
+        os.remove(tmp_path)
+        return False
+    # mkstemp creates 0600; stored images must stay readable by the web server and backups
+    os.chmod(tmp_path, UPLOAD_FILE_MODE)
+    os.replace(tmp_path, final_path)
+    return True
+
+
+async def store_image(upload: UploadFile) -> str:
+    """Stream an uploaded image to disk under its SHA-256 and return the stored filename.
+
+    By the time this runs the form parser has already spooled the body
+    (UploadSizeLimit turns away requests that declare a larger Content-Length
+    up front). Chunks are hashed as they are copied and written from a worker
+    thread, the copy stops as soon as it passes MAX_UPLOAD_BYTES, and
+    identical images resolve to the same content-addressed file.
+    """
+    if upload.size is not None and upload.size > MAX_UPLOAD_BYTES:
+        raise _too_large()
+
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-", suffix=".part")
+    digest = hashlib.sha256()
+    head = b""
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise _too_large()
+                if len(head) < 12:
+                    head += chunk[:12 - len(head)]
+                digest.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+
+        extension = _sniff_extension(head)
+        if extension is None:
+            raise HTTPException(status_code=415, detail="Only JPEG, PNG, GIF or WebP images are accepted")
+
+        filename = f"{digest.hexdigest()}.{extension}"
+        await asyncio.to_thread(_publish, tmp_path, os.path.join(UPLOAD_DIR, filename))
+        return filename
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Serving. Stored images never change once written: content-addressed names
+# are cacheable forever, everything else is revalidated with a strong ETag.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+_CONTENT_ADDRESSED = re.compile(r"^([0-9a-f]{64})\.(jpg|png|gif|webp)$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+upload_serving_stats = {
+    "full_responses": 0,
+    "not_modified": 0,
+    "partial_responses": 0,
+    "bytes_served": 0,
+    "bytes_saved": 0,
+}
+
+
+def _etag_matches(etag: str, if_none_match: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses weak comparison
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _not_modified_since(mtime: float, if_modified_since: str) -> bool:
+    try:
+        return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def _parse_range(value: str, size: int):
+    """(start, end) inclusive for a single byte range, None to ignore it, or "unsatisfiable"."""
+    match = _RANGE.match(value.strip())
+    if match is None:
+        # Malformed or multi-range: serving the whole file is always allowed
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+async def _file_slice(path, start: int, length: int):
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await f.read(min(UPLOAD_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class UploadStaticFiles(StaticFiles):
+    """StaticFiles with strong validators, 304s, immutable caching and byte ranges."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200) -> Response:
+        request_headers = Headers(scope=scope)
+        size = stat_result.st_size
+        content_addressed = _CONTENT_ADDRESSED.match(os.path.basename(full_path))
+
+        headers = {
+            "etag": f'"{content_addressed.group(1)}"' if content_addressed
+                    else f'"{stat_result.st_mtime_ns:x}-{size:x}"',
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "cache-control": IMMUTABLE_CACHE_CONTROL if content_addressed else REVALIDATE_CACHE_CONTROL,
+            "accept-ranges": "bytes",
+        }
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            not_modified = _etag_matches(headers["etag"], if_none_match)
+        else:
+            if_modified_since = request_headers.get("if-modified-since")
+            not_modified = if_modified_since is not None and _not_modified_since(stat_result.st_mtime, if_modified_since)
+        if not_modified:
+            upload_serving_stats["not_modified"] += 1
+            upload_serving_stats["bytes_saved"] += size
+            return Response(status_code=304, headers=headers)
+
+        byte_range = None
+        range_header = request_headers.get("range")
+        if range_header and scope["method"] == "GET" and self._if_range_holds(request_headers, headers):
+            byte_range = _parse_range(range_header, size)
+
+        if byte_range == "unsatisfiable":
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            upload_serving_stats["partial_responses"] += 1
+            upload_serving_stats["bytes_served"] += length
+            upload_serving_stats["bytes_saved"] += size - length
+            return StreamingResponse(
+                _file_slice(full_path, start, length),
+                status_code=206,
+                media_type=mimetypes.guess_type(full_path)[0] or "application/octet-stream",
+                headers={**headers, "content-range": f"bytes {start}-{end}/{size}", "content-length": str(length)},
+            )
+
+        upload_serving_stats["full_responses"] += 1
+        if scope["method"] == "GET":
+            upload_serving_stats["bytes_served"] += size
+        return FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+
+    @staticmethod
+    def _if_range_holds(request_headers, headers) -> bool:
+        if_range = request_headers.get("if-range")
+        if if_range is None:
+            return True
+        # If-Range uses strong comparison, or an exact Last-Modified date
+        return if_range.strip() == headers["etag"] or if_range.strip() == headers["last-modified"]
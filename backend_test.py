@@ -392,7 +392,8 @@ class CredEatAPITester:
 
 def main():
     print("🚀 Starting CredEat API Testing...")
-    tester = CredEatAPITester()
+    # Optional base URL, e.g. http://localhost:8001 for a local server
+    tester = CredEatAPITester(sys.argv[1]) if len(sys.argv) > 1 else CredEatAPITester()
 
     # Test sequence
     tests = [
@@ -70,21 +70,21 @@ const AdminStats = () => {
           </CardContent>
         </Card>
 
-        {/* Hygiene Rating Chart */}
+        {/* Hygiene Complaints Chart */}
         <Card className="md:col-span-2">
           <CardHeader>
-            <CardTitle>Hygiene Rating Trend</CardTitle>
-            <CardDescription>Average hygiene score (out of 5)</CardDescription>
+            <CardTitle>Hygiene Complaints</CardTitle>
+            <CardDescription>Monthly trend of complaints filed under hygiene</CardDescription>
           </CardHeader>
           <CardContent className="h-[300px]">
             <ResponsiveContainer width="100%" height="100%">
               <LineChart data={data}>
                 <CartesianGrid strokeDasharray="3 3" />
                 <XAxis dataKey="name" />
-                <YAxis domain={[0, 5]} />
+                <YAxis allowDecimals={false} />
                 <Tooltip />
                 <Legend />
-                <Line type="monotone" dataKey="hygiene_rating" stroke="#3b82f6" strokeWidth={2} name="Hygiene Rating" />
+                <Line type="monotone" dataKey="hygiene_complaints" stroke="#3b82f6" strokeWidth={2} name="Hygiene Complaints" />
               </LineChart>
             </ResponsiveContainer>
           </CardContent>